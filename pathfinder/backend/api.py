@@ -11,14 +11,17 @@
 import os
 import json
 from typing import Dict, Any, Optional, List, Union
-from flask import Flask, request, jsonify, Response, stream_with_context
+from flask import Flask, request, jsonify, Response, stream_with_context, has_request_context
 from flask_cors import CORS
 from queue import Queue, Empty
-import threading
 import time
 from werkzeug.utils import secure_filename
 
-from .interactor import Interactor
+from .interactor import Interactor, ToolNotification
+from .cancellation import Cancelled, CancelToken
+from . import token_registry
+from .tool_cache import ToolResultCache
+from .result_shaping import ResultShaper
 from .textextract import extract_text
 from .tools import (
         search_google,
@@ -26,22 +29,79 @@ from .tools import (
         get_website
     )
 from .transcripts import TranscriptManager
+from .sessions import SessionManager, DEFAULT_SESSION, transcript_messages
+from .session_store import SessionStore
+from .scheduler import GenerationScheduler, SchedulerFull
+from .events import (
+    STREAM_QUEUE_SIZE,
+    TOOL_PROGRESS_INTERVAL,
+    event_stream,
+    format_tool_results,
+    interaction_error,
+    output_event,
+    publish,
+    usage_event
+)
 
 app = Flask(__name__)
 
 # Configure CORS with more specific settings
+CORS_ORIGINS = ["http://localhost:8000", "http://127.0.0.1:8000"]
+CORS_HEADERS = ["Content-Type", "Authorization", "Accept", "X-Session-ID", "X-Client-ID"]
+CORS_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 CORS(app, 
-     resources={r"/api/*": {"origins": ["http://localhost:8000", "http://127.0.0.1:8000"]}},
+     resources={r"/api/*": {"origins": CORS_ORIGINS}},
      supports_credentials=True,
-     allow_headers=["Content-Type", "Authorization", "Accept"],
-     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+     allow_headers=CORS_HEADERS,
+     methods=CORS_METHODS)
 
-# Global interactor instance
-interactor = None
+# Interactors keyed by session, created on demand
+session_manager = None
+
+# Bounded worker pool that runs every generation request
+scheduler = None
 
 # Initialize transcript manager
 transcript_manager = None
 
+# Tool results shared by every interactor this server creates
+tool_cache = ToolResultCache(ttls={
+    "get_weather": 600,
+    "search_google": 300,
+    "get_website": 300
+})
+
+# Token budgets for tool results before they enter the conversation history
+result_shaper = ResultShaper(default_budget=4000, budgets={
+    "search_google": 3000,
+    "get_website": 3000
+})
+
+# Interactor class for new sessions; the ASGI server swaps in AsyncInteractor
+INTERACTOR_CLASS = Interactor
+
+# Model used when a session's interactor is first created
+DEFAULT_MODEL = "openai:gpt-4o-mini"
+
+# Interactors kept in memory, and seconds of inactivity before a session is spilled to the transcript DB
+MAX_SESSIONS = 32
+SESSION_IDLE_TIMEOUT = 30 * 60
+
+# Keep sessions in a store shared by every worker process, so any worker can serve
+# any session. Set by the multi-process server config (gunicorn_conf.py).
+SHARED_SESSIONS = os.getenv('PATHFINDER_SHARED_SESSIONS', '').lower() in ('1', 'true', 'yes')
+
+# Generation requests running at once, and how many may wait in total and per client
+GENERATION_WORKERS = 8
+GENERATION_QUEUE = 64
+GENERATION_QUEUE_PER_CLIENT = 8
+
+# Seconds between queue position updates sent to waiting streaming clients
+QUEUE_POSITION_INTERVAL = 0.5
+
+# Seconds of streamed tokens batched into each HTTP chunk
+STREAM_COALESCE_WINDOW = 0.03
+
 # Configure upload settings
 UPLOAD_FOLDER = os.path.join('frontend', 'user_data')
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx'}
@@ -52,19 +112,143 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_interactor() -> Interactor:
-    """Get or initialize the global interactor instance.
+def create_interactor() -> Interactor:
+    """Create an interactor for a new session.
+    
+    Every session shares the tool functions, the tool result cache and the result shaper.
+    Tokenizers and provider clients are shared process-wide.
+    
+    Returns:
+        Interactor: A new interactor with the default model and tools
+    """
+    ai = INTERACTOR_CLASS(
+        model=DEFAULT_MODEL,
+        stream=True,
+        tools=True,
+        tool_cache=tool_cache,
+        coalesce_window=STREAM_COALESCE_WINDOW,
+        result_shaper=result_shaper
+    )
+    ai.add_function(search_google, name="search_google", description="Search the web for information")  
+    ai.add_function(get_weather, name="get_weather", description="Get the weather for a specific location")
+    ai.add_function(get_website, name="get_website", description="Get the content of a specific website")
+    return ai
+
+def get_session_manager() -> SessionManager:
+    """Get or initialize the session manager.
+    
+    Returns:
+        SessionManager: The pool of per-session interactors
+    """
+    global session_manager
+    if session_manager is None:
+        if SHARED_SESSIONS:
+            store = SessionStore(transcripts=get_transcript_manager())
+            # A session's next turn may run in another worker, which must be able
+            # to resolve the refs of results truncated here.
+            result_shaper.store = store
+        else:
+            store = get_transcript_manager()
+        session_manager = SessionManager(
+            create_interactor,
+            store=store,
+            max_sessions=MAX_SESSIONS,
+            idle_timeout=SESSION_IDLE_TIMEOUT,
+            shared=SHARED_SESSIONS
+        )
+    return session_manager
+
+def get_scheduler() -> GenerationScheduler:
+    """Get or initialize the generation scheduler.
+    
+    Returns:
+        GenerationScheduler: The worker pool that runs generation requests
+    """
+    global scheduler
+    if scheduler is None:
+        scheduler = GenerationScheduler(
+            max_workers=GENERATION_WORKERS,
+            max_queue=GENERATION_QUEUE,
+            max_queue_per_client=GENERATION_QUEUE_PER_CLIENT
+        )
+    return scheduler
+
+def request_client_id() -> str:
+    """Get the client the current request comes from, for fair scheduling.
+    
+    Returns:
+        str: The X-Client-ID header, or the remote address
+    """
+    return request.headers.get('X-Client-ID') or request.remote_addr or "unknown"
+
+def overloaded_response(error: SchedulerFull):
+    """Build the response for a generation request rejected by the scheduler.
     
+    Args:
+        error: The rejection
+        
+    Returns:
+        A 503 response with a Retry-After header
+    """
+    response = jsonify({"error": str(error), "retry_after": error.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def request_session_id(transcript_id: Optional[str] = None) -> str:
+    """Get the session the current request belongs to.
+    
+    The session is named by the X-Session-ID header or a session_id parameter. Without
+    one, requests about a transcript share that transcript's session, and all others
+    share the default session.
+    
+    Args:
+        transcript_id: Transcript the request is about, if any
+        
     Returns:
-        Interactor: The global interactor instance
+        str: The session ID
     """
-    global interactor
-    if interactor is None:
-        interactor = Interactor(stream=True, tools=True)
-        interactor.add_function(search_google, name="search_google", description="Search the web for information")  
-        interactor.add_function(get_weather, name="get_weather", description="Get the weather for a specific location")
-        interactor.add_function(get_website, name="get_website", description="Get the content of a specific website")
-    return interactor
+    data = request.get_json(silent=True) or {}
+    return (
+        request.headers.get('X-Session-ID')
+        or request.args.get('session_id')
+        or data.get('session_id')
+        or transcript_id
+        or data.get('transcript_id')
+        or request.args.get('transcript_id')
+        or DEFAULT_SESSION
+    )
+
+def get_interactor(session_id: Optional[str] = None) -> Interactor:
+    """Get the interactor of a session, creating or restoring it if needed.
+    
+    Args:
+        session_id: Session ID. Defaults to the current request's session, or the
+            default session outside a request.
+    
+    Returns:
+        Interactor: The session's interactor
+    """
+    if session_id is None and has_request_context():
+        session_id = request_session_id()
+    return get_session_manager().get(session_id)
+
+def hold_interactor(session_id: Optional[str] = None):
+    """Hold the interactor of a session exclusively while changing it.
+    
+    With shared sessions, changes made while it is held are saved for the other
+    worker processes when it is released.
+    
+    Args:
+        session_id: Session ID. Defaults to the current request's session, or the
+            default session outside a request.
+    
+    Returns:
+        Context manager yielding the session's interactor
+    """
+    if session_id is None and has_request_context():
+        session_id = request_session_id()
+    return get_session_manager().acquire(session_id)
 
 def get_transcript_manager() -> TranscriptManager:
     """Get or initialize the global transcript manager instance.
@@ -77,6 +261,155 @@ def get_transcript_manager() -> TranscriptManager:
         transcript_manager = TranscriptManager()
     return transcript_manager
 
+def interaction_input(data: Dict[str, Any]) -> str:
+    """Combine an interact request's message with its attachments.
+    
+    Args:
+        data: The request JSON
+        
+    Returns:
+        str: The text sent to the model
+    """
+    user_input = data.get('message', '')
+    attachments = data.get('attachments', [])
+    if attachments:
+        return user_input + "\n\n" + "\n\n".join(attachments)
+    return user_input
+
+def completed_tool_result(token: str) -> Optional[Dict[str, Any]]:
+    """Get the result carried by a completed tool call notification.
+    
+    Args:
+        token: A token or notification string from the interactor's output callback
+        
+    Returns:
+        dict: The tool name and result, or None if the token is not a completed tool call
+    """
+    if isinstance(token, ToolNotification) and token.data["status"] == "completed":
+        return {
+            "tool_name": token.data["tool_name"],
+            "result": token.data.get("tool_result")
+        }
+    return None
+
+def extract_tool_data(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Extract tool calls and their results from a conversation history.
+    
+    Args:
+        messages: The interactor's messages
+        
+    Returns:
+        list: Tool name, arguments and parsed result of every answered tool call
+    """
+    print(f"Extracting tool calls from conversation history ({len(messages)} messages)")
+    
+    tool_data = []
+    for i, msg in enumerate(messages):
+        if msg["role"] == "assistant" and msg.get("tool_calls"):
+            print(f"Found assistant message with tool calls: {msg.get('tool_calls')}")
+            tool_call_ids = [tc["id"] for tc in msg["tool_calls"]]
+            
+            # Find corresponding tool results for these tool calls
+            message_results = []
+            for tc_id in tool_call_ids:
+                print(f"Looking for result of tool call {tc_id}")
+                for tool_msg in messages:
+                    if tool_msg["role"] == "tool" and tool_msg.get("tool_call_id") == tc_id:
+                        print(f"Found tool result for {tc_id}")
+                        # Find which tool call this result belongs to
+                        for tc in msg["tool_calls"]:
+                            if tc["id"] == tc_id:
+                                tool_name = tc["function"]["name"]
+                                tool_args = tc["function"]["arguments"]
+                                
+                                # Get the result content and sanitize it
+                                try:
+                                    result = json.loads(tool_msg["content"])
+                                    message_results.append({
+                                        "tool_name": tool_name,
+                                        "tool_arguments": tool_args,
+                                        "tool_result": result
+                                    })
+                                    print(f"Added result for tool {tool_name}")
+                                except:
+                                    # Fallback if parsing fails
+                                    print(f"Failed to parse tool result for {tool_name}")
+                                    message_results.append({
+                                        "tool_name": tool_name,
+                                        "tool_arguments": tool_args,
+                                        "tool_result": {"error": "Failed to parse tool result"}
+                                    })
+            
+            if message_results:
+                # Collect all results instead of replacing them
+                tool_data.extend(message_results)
+                print(f"Collected {len(message_results)} tool results, total: {len(tool_data)}")
+    return tool_data
+
+def save_interaction(
+    transcript_id: str,
+    user_input: str,
+    response: str,
+    tool_data: List[Dict[str, Any]],
+    response_timestamp: int
+):
+    """Append a user message and the assistant's response to a transcript.
+    
+    Args:
+        transcript_id: The transcript to update
+        user_input: The text sent to the model
+        response: The assistant's response, with tool results appended
+        tool_data: Tool calls from extract_tool_data()
+        response_timestamp: Milliseconds timestamp of the response
+    """
+    try:
+        manager = get_transcript_manager()
+        transcript = manager.get_transcript(transcript_id)
+        
+        if transcript:
+            # Add the new messages to the transcript
+            messages = transcript['messages']
+            
+            # Add user message
+            messages.append({
+                "role": "user",
+                "content": user_input,
+                "timestamp": int(time.time() * 1000)
+            })
+            
+            # Add assistant response with tool data if available
+            assistant_message = {
+                "role": "assistant",
+                "content": response,
+                "timestamp": response_timestamp
+            }
+            
+            # Add tool_data if we have any
+            if tool_data:
+                print(f"Adding {len(tool_data)} tool results to assistant message")
+                assistant_message["tool_data"] = tool_data
+                
+                # Also ensure the formatted tool results are in the content
+                # This ensures the transcript displays tool results consistently
+                if not response.endswith("\n\n") and tool_data:
+                    assistant_message["content"] += "\n\n"
+                    
+                for result in tool_data:
+                    tool_name = result.get("tool_name", "Unknown Tool")
+                    result_data = result.get("tool_result", {})
+                    if result_data:
+                        assistant_message["content"] += f"Tool Results from {tool_name}:\n"
+                        assistant_message["content"] += json.dumps(result_data, indent=2)
+                        assistant_message["content"] += "\n\n"
+            
+            messages.append(assistant_message)
+            print(f"Saving updated transcript with {len(messages)} messages")
+            
+            # Update the transcript with the new messages
+            manager.update_transcript(transcript_id, {"messages": messages})
+    except Exception as e:
+        print(f"Warning: Failed to save message to transcript {transcript_id}: {str(e)}")
+
 @app.route('/api/interact', methods=['POST'])
 def api_interact():
     """Interact with the AI model and get a response.
@@ -85,263 +418,173 @@ def api_interact():
         message (str): The user message to send to the AI
         attachments (list, optional): List of attachment strings to include with the message
         stream (bool, optional): Whether to stream the response
+        format (str, optional): Framing of a streamed response, "ndjson" or "sse". Also
+            chosen by an Accept header of application/x-ndjson or text/event-stream.
+            Without either the stream is plain text
         tools (bool, optional): Whether to allow tool usage
         transcript_id (str, optional): ID of the transcript to load
+        session_id (str, optional): Session to interact in, also accepted as the
+            X-Session-ID header. Defaults to the transcript's session, or the default session
         
     Returns:
-        Response containing the AI's response, either streamed or complete
+        Response containing the AI's response, either streamed or complete. Framed
+        streams carry sequence-numbered queue, token, tool_started, tool_progress,
+        tool_result, usage, error and done events (see events.EventStream). Plain text
+        streams start with {"type": "queue", "position": N} notices while the request
+        waits for a worker and end with the tool results as text. 503 with a
+        Retry-After header if the generation queue is full.
+        
+        A streaming client that disconnects cancels its interaction: the provider
+        stream is closed and running tools are stopped. Framed streams send a
+        heartbeat while idle, so this happens within about a second; plain text
+        streams notice it on their next write.
     """
-    ai = get_interactor()
-    
     data = request.json
-    user_input = data.get('message', '')
-    attachments = data.get('attachments', [])
     stream = data.get('stream', False)
     enable_tools = data.get('tools', True)
     transcript_id = data.get('transcript_id', None)
     
     # Combine message with any attachments
-    if attachments:
-        combined_input = user_input + "\n\n" + "\n\n".join(attachments)
-    else:
-        combined_input = user_input
+    combined_input = interaction_input(data)
     
-    # If a transcript ID is provided but not loaded in the interactor,
-    # try to load it now to ensure continuity
-    if transcript_id:
-        try:
-            # Check if the interactor already has a conversation history for this transcript
-            # If not, load it from the database
-            message_count = len(ai.messages_get())
-            if message_count <= 1:  # Only system message or empty
-                manager = get_transcript_manager()
-                transcript = manager.get_transcript(transcript_id)
-                
-                if transcript:
-                    # Don't call the endpoint directly to avoid cycling references
-                    # Instead, just update the interactor's message history
-                    ai.messages_flush()  # Clear existing messages but keep system prompt
-                    
-                    # Add each message from the transcript to the interactor
-                    for message in transcript['messages']:
-                        if message['role'] != 'system':  # Skip system messages
-                            # Handle different message formats
-                            if message.get('tool_calls'):
-                                # Assistant message with tool calls
-                                ai.history.append({
-                                    'role': message['role'],
-                                    'content': message.get('content'),
-                                    'tool_calls': message['tool_calls']
-                                })
-                            elif message.get('tool_call_id'):
-                                # Tool response message
-                                ai.history.append({
-                                    'role': 'tool',
-                                    'content': message['content'],
-                                    'tool_call_id': message['tool_call_id']
-                                })
-                            else:
-                                # Regular user or assistant message
-                                ai.messages_add(message['role'], message['content'])
-                    
-                    print(f"Loaded transcript {transcript_id} with {len(transcript['messages'])} messages")
-        except Exception as e:
-            print(f"Warning: Failed to load transcript {transcript_id}: {str(e)}")
+    # Each session has its own interactor. A new session tied to a transcript
+    # starts from the transcript's messages, or from its spilled state.
+    sessions = get_session_manager()
+    session_id = request_session_id(transcript_id)
     
     # Capture the response timestamp for storing with the message
     response_timestamp = int(time.time() * 1000)
     
     if stream:
-        def generate():
-            q = Queue()
-            tool_results = []  # Track tool results
-            
-            def stream_callback(token):
-                try:
-                    # Check if this is a tool call notification
-                    if token.startswith('{"type":"tool_call"') or token.startswith('{"type": "tool_call"'):
-                        notification = json.loads(token)
-                        # If it's a completed tool call with results, store the result
-                        if notification.get("status") == "completed" and "tool_result" in notification:
-                            tool_results.append({
-                                "tool_name": notification.get("tool_name"),
-                                "result": notification.get("tool_result")
-                            })
-                            # Don't send raw JSON notifications to the client
-                            return
-                except:
-                    pass  # If it's not valid JSON or doesn't have the expected structure, treat as normal token
-                
-                q.put(token)
-            
-            def generate_response():
-                try:
+        # Bounded, so a slow client holds the interaction back rather than buffering it
+        q = Queue(maxsize=STREAM_QUEUE_SIZE)
+        events = event_stream(data, request.headers.get('Accept'))
+        cancel = CancelToken()
+        
+        def stream_callback(token):
+            publish(q, output_event(token), cancel)
+        
+        def generate_response():
+            try:
+                with sessions.acquire(session_id, transcript_id) as ai:
                     ai.interact(
                         combined_input, 
                         output_callback=stream_callback, 
                         stream=True, 
                         tools=enable_tools,
+                        cancel=cancel
                     )
-                    
-                    # After interaction is complete, append tool results if any
-                    if tool_results:
-                        q.put("\n\n")  # Add spacing
-                        for result in tool_results:
-                            tool_name = result.get("tool_name", "Unknown Tool")
-                            result_data = result.get("result", {})
-                            q.put(f"Tool Results from {tool_name}:\n")
-                            q.put(json.dumps(result_data, indent=2))
-                            q.put("\n\n")
-                finally:
-                    q.put(None)  # Signal end of stream
-            
-            threading.Thread(target=generate_response, daemon=True).start()
-            
-            while True:
+                    stats = ai.last_stats
+                
+                error = interaction_error(stats)
+                if error and not cancel.cancelled:
+                    publish(q, {"type": "error", "message": error}, cancel)
+                if stats is not None:
+                    publish(q, usage_event(stats), cancel)
+                publish(q, None, cancel)  # Signal end of stream
+            except Exception as e:
+                if isinstance(e, Cancelled) and cancel.cancelled:
+                    return  # The client is gone; nobody reads the queue any more
+                # Anything else, including a Cancelled that is not ours, still ends the stream.
                 try:
-                    token = q.get(timeout=0.25)
-                    if token is None:
+                    publish(q, {"type": "error", "message": str(e)}, cancel)
+                    publish(q, None, cancel)
+                except Cancelled:
+                    pass
+                raise
+        
+        # Queue the generation before streaming starts, so an overloaded server can still answer 503
+        generation = get_scheduler()
+        try:
+            job = generation.submit(generate_response, request_client_id(), session_id)
+        except SchedulerFull as e:
+            return overloaded_response(e)
+        
+        def generate():
+            finished = False
+            try:
+                # Report the queue position while the request waits for a worker
+                position = None
+                while not job.started:
+                    current = generation.position(job)
+                    if current and current != position:
+                        position = current
+                        yield events.frame({"type": "queue", "position": position})
+                    job.wait_started(QUEUE_POSITION_INTERVAL)
+                if position is not None:
+                    yield events.frame({"type": "queue", "position": 0, "status": "started"})
+                
+                while True:
+                    try:
+                        event = q.get(timeout=TOOL_PROGRESS_INTERVAL)
+                    except Empty:
+                        # Nothing new; report the tools that are still running, or
+                        # write a heartbeat so a closed connection is noticed
+                        frames = events.progress() or [events.heartbeat()]
+                        for frame in frames:
+                            if frame:
+                                yield frame
+                        continue
+                    if event is None:
                         break
-                    yield token
-                except Empty:
-                    continue
+                    frame = events.frame(event)
+                    if frame:
+                        yield frame
+                
+                frame = events.frame({"type": "done"})
+                if frame:
+                    yield frame
+                finished = True
+            finally:
+                # A client that disconnects while queued gives up its place;
+                # one that disconnects later stops its interaction
+                generation.cancel(job)
+                if not finished:
+                    cancel.cancel("Client disconnected")
         
-        return Response(stream_with_context(generate()), content_type="text/plain")
+        return Response(
+            stream_with_context(generate()),
+            content_type=events.content_type,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
     else:
         try:
             # Track tool results
             collected_tool_results = []
             
             def collect_tool_results(token):
-                try:
-                    # Check if this is a tool call notification
-                    if token.startswith('{"type":"tool_call"') or token.startswith('{"type": "tool_call"'):
-                        notification = json.loads(token)
-                        # If it's a completed tool call with results, store the result
-                        if notification.get("status") == "completed" and "tool_result" in notification:
-                            collected_tool_results.append({
-                                "tool_name": notification.get("tool_name"),
-                                "result": notification.get("tool_result")
-                            })
-                except:
-                    pass  # If it's not valid JSON or doesn't have the expected structure, ignore
+                result = completed_tool_result(token)
+                if result is not None:
+                    collected_tool_results.append(result)
             
-            response = ai.interact(
-                combined_input, 
-                quiet=True,
-                tools=enable_tools,
-                stream=False,
-                output_callback=collect_tool_results  # Add callback to collect tool results
-            )
-            
-            # Append tool results to the response text
-            if collected_tool_results:
-                response += "\n\n"  # Add spacing
-                for result in collected_tool_results:
-                    tool_name = result.get("tool_name", "Unknown Tool")
-                    result_data = result.get("result", {})
-                    response += f"Tool Results from {tool_name}:\n"
-                    response += json.dumps(result_data, indent=2)
-                    response += "\n\n"
+            def generate_response():
+                with sessions.acquire(session_id, transcript_id) as ai:
+                    response = ai.interact(
+                        combined_input, 
+                        quiet=True,
+                        tools=enable_tools,
+                        stream=False,
+                        output_callback=collect_tool_results  # Add callback to collect tool results
+                    )
+                    return response, ai.messages_get()
             
-            # Add tool calls to history
-            ai = get_interactor()
-            messages = ai.messages_get()
+            try:
+                job = get_scheduler().submit(generate_response, request_client_id(), session_id)
+            except SchedulerFull as e:
+                return overloaded_response(e)
+            response, messages = job.wait()
             
-            print(f"Extracting tool calls from conversation history ({len(messages)} messages)")
+            # Append tool results to the response text
+            # interact() returns None for an empty or oversized prompt
+            if response is not None:
+                response += format_tool_results(collected_tool_results)
             
             # Extract tool calls and their results from the history
-            tool_data = []
-            for i, msg in enumerate(messages):
-                if msg["role"] == "assistant" and msg.get("tool_calls"):
-                    print(f"Found assistant message with tool calls: {msg.get('tool_calls')}")
-                    tool_call_ids = [tc["id"] for tc in msg["tool_calls"]]
-                    
-                    # Find corresponding tool results for these tool calls
-                    message_results = []
-                    for tc_id in tool_call_ids:
-                        print(f"Looking for result of tool call {tc_id}")
-                        for tool_msg in messages:
-                            if tool_msg["role"] == "tool" and tool_msg.get("tool_call_id") == tc_id:
-                                print(f"Found tool result for {tc_id}")
-                                # Find which tool call this result belongs to
-                                for tc in msg["tool_calls"]:
-                                    if tc["id"] == tc_id:
-                                        tool_name = tc["function"]["name"]
-                                        tool_args = tc["function"]["arguments"]
-                                        
-                                        # Get the result content and sanitize it
-                                        try:
-                                            result = json.loads(tool_msg["content"])
-                                            message_results.append({
-                                                "tool_name": tool_name,
-                                                "tool_arguments": tool_args,
-                                                "tool_result": result
-                                            })
-                                            print(f"Added result for tool {tool_name}")
-                                        except:
-                                            # Fallback if parsing fails
-                                            print(f"Failed to parse tool result for {tool_name}")
-                                            message_results.append({
-                                                "tool_name": tool_name,
-                                                "tool_arguments": tool_args,
-                                                "tool_result": {"error": "Failed to parse tool result"}
-                                            })
-                    
-                    if message_results:
-                        # Collect all results instead of replacing them
-                        tool_data.extend(message_results)
-                        print(f"Collected {len(message_results)} tool results, total: {len(tool_data)}")
+            tool_data = extract_tool_data(messages)
             
             # If transcript_id exists, save the response to the transcript
             if transcript_id:
-                try:
-                    manager = get_transcript_manager()
-                    transcript = manager.get_transcript(transcript_id)
-                    
-                    if transcript:
-                        # Add the new messages to the transcript
-                        messages = transcript['messages']
-                        
-                        # Add user message
-                        messages.append({
-                            "role": "user",
-                            "content": combined_input,
-                            "timestamp": int(time.time() * 1000)
-                        })
-                        
-                        # Add assistant response with tool data if available
-                        assistant_message = {
-                            "role": "assistant",
-                            "content": response,
-                            "timestamp": response_timestamp
-                        }
-                        
-                        # Add tool_data if we have any
-                        if tool_data:
-                            print(f"Adding {len(tool_data)} tool results to assistant message")
-                            assistant_message["tool_data"] = tool_data
-                            
-                            # Also ensure the formatted tool results are in the content
-                            # This ensures the transcript displays tool results consistently
-                            if not response.endswith("\n\n") and tool_data:
-                                assistant_message["content"] += "\n\n"
-                                
-                            for result in tool_data:
-                                tool_name = result.get("tool_name", "Unknown Tool")
-                                result_data = result.get("tool_result", {})
-                                if result_data:
-                                    assistant_message["content"] += f"Tool Results from {tool_name}:\n"
-                                    assistant_message["content"] += json.dumps(result_data, indent=2)
-                                    assistant_message["content"] += "\n\n"
-                        
-                        messages.append(assistant_message)
-                        print(f"Saving updated transcript with {len(messages)} messages")
-                        
-                        # Update the transcript with the new messages
-                        manager.update_transcript(transcript_id, {"messages": messages})
-                except Exception as e:
-                    print(f"Warning: Failed to save message to transcript {transcript_id}: {str(e)}")
+                save_interaction(transcript_id, combined_input, response, tool_data, response_timestamp)
             
             return jsonify({"response": response})
         except Exception as e:
@@ -355,15 +598,17 @@ def list_models():
     Query parameters:
         provider (str, optional): Filter models by provider
         filter (str, optional): Regex pattern to filter model names
+        refresh (bool, optional): Bypass the cached model lists (default: false)
     
     Returns:
         JSON response with list of available models
     """
     provider = request.args.get('provider')
     filter_pattern = request.args.get('filter')
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
     
     ai = get_interactor()
-    models = ai.list(providers=provider, filter=filter_pattern)
+    models = ai.list(providers=provider, filter=filter_pattern, refresh=refresh)
     
     return jsonify({"models": models})
 
@@ -391,18 +636,10 @@ def add_function():
         return jsonify({"error": "Module path and function name are required"}), 400
     
     try:
-        # Import the module dynamically
-        import importlib.util
-        spec = importlib.util.spec_from_file_location("module", module_path)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        
-        # Get the function from the module
-        func = getattr(module, function_name)
-        
-        # Register the function with the interactor
-        ai = get_interactor()
-        ai.add_function(func, name=custom_name, description=description)
+        # Import the function and register it with the interactor. The session keeps
+        # its source, so a restored session or another worker imports it again.
+        with hold_interactor() as ai:
+            ai.add_function_from_file(module_path, function_name, name=custom_name, description=description)
         
         return jsonify({"success": True, "message": f"Function {function_name} registered successfully"})
     except Exception as e:
@@ -422,6 +659,64 @@ def get_functions():
     return jsonify({"functions": functions})
 
 
+@app.route('/api/tool_cache', methods=['GET'])
+def get_tool_cache_stats():
+    """Get hit, miss and coalescing statistics for the shared tool result cache.
+    
+    Returns:
+        JSON response with the cache statistics
+    """
+    return jsonify({"stats": tool_cache.stats()})
+
+
+@app.route('/api/tool_cache', methods=['DELETE'])
+def clear_tool_cache():
+    """Clear cached tool results.
+    
+    Query parameters:
+        tool (str, optional): Only clear results of this tool
+    
+    Returns:
+        JSON response with the number of entries removed
+    """
+    removed = tool_cache.invalidate(request.args.get('tool'))
+    
+    return jsonify({"success": True, "removed": removed})
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_interaction_stats():
+    """Get timing and token statistics of the most recent interaction.
+    
+    Returns:
+        JSON response with the statistics, or null if nothing has run yet
+    """
+    ai = get_interactor()
+    stats = ai.last_stats
+    
+    return jsonify({"stats": stats.to_dict() if stats else None})
+
+
+@app.route('/api/sessions', methods=['GET'])
+def get_session_stats():
+    """Get statistics of the per-session interactor pool.
+    
+    Returns:
+        JSON response with sessions in memory, limits and created, rehydrated and spilled counts
+    """
+    return jsonify({"stats": get_session_manager().stats()})
+
+
+@app.route('/api/scheduler', methods=['GET'])
+def get_scheduler_stats():
+    """Get statistics of the generation scheduler.
+    
+    Returns:
+        JSON response with running and queued requests, rejections and average durations
+    """
+    return jsonify({"stats": get_scheduler().stats()})
+
+
 @app.route('/api/system_prompt', methods=['POST'])
 def set_system_prompt():
     """Set the system prompt for the conversation.
@@ -438,8 +733,8 @@ def set_system_prompt():
     if not prompt:
         return jsonify({"error": "No prompt provided"}), 400
     
-    ai = get_interactor()
-    system_prompt = ai.messages_system(prompt)
+    with hold_interactor() as ai:
+        system_prompt = ai.messages_system(prompt)
     
     return jsonify({"system_prompt": system_prompt})
 
@@ -464,8 +759,8 @@ def clear_messages():
     Returns:
         JSON response indicating success
     """
-    ai = get_interactor()
-    ai.messages_flush()
+    with hold_interactor() as ai:
+        ai.messages_flush()
     
     return jsonify({"success": True, "message": "Conversation history cleared"})
 
@@ -492,8 +787,8 @@ def add_message():
     timestamp = data.get('timestamp') or int(time.time() * 1000)  # Use provided timestamp or current time in milliseconds
     
     # Add the message to the interactor without timestamp
-    ai = get_interactor()
-    messages = ai.messages_add(role, content)  # The interactor doesn't store our timestamp
+    with hold_interactor() as ai:
+        messages = ai.messages_add(role, content)  # The interactor doesn't store our timestamp
     
     # Return the messages with timestamps added
     messages_with_timestamps = []
@@ -583,9 +878,9 @@ def switch_model():
         return jsonify({"error": "Model identifier is required"}), 400
     
     try:
-        ai = get_interactor()
-        ai._setup_client(model, base_url, api_key)
-        ai._setup_encoding()
+        with hold_interactor() as ai:
+            ai._setup_client(model, base_url, api_key)
+            ai._setup_encoding()
         
         return jsonify({
             "success": True, 
@@ -629,8 +924,8 @@ def set_context_length():
         return jsonify({"error": "Valid context length (positive integer) is required"}), 400
     
     try:
-        ai = get_interactor()
-        ai.context_length = context_length
+        with hold_interactor() as ai:
+            ai.context_length = context_length
         
         return jsonify({
             "success": True,
@@ -1111,34 +1406,28 @@ def reset_interactor():
     api_key = data.get('api_key')
     context_length = data.get('context_length')
     
-    global interactor
+    session_id = request_session_id()
     
-    # Close existing interactor if it exists
-    if interactor is not None:
-        try:
-            interactor.close()
-        except Exception as e:
-            print(f"Warning: Error closing existing interactor: {e}")
-    
-    # Reset to None to force new creation
-    interactor = None
-    
-    # Get new interactor instance
-    ai = get_interactor()
-    
-    # Apply new settings if provided
-    if model or base_url or api_key:
-        try:
-            ai._setup_client(model, base_url, api_key)
-            ai._setup_encoding()
-        except Exception as e:
-            return jsonify({"error": f"Failed to apply new settings: {str(e)}"}), 500
+    # Drop the session's interactor and any spilled state to force new creation
+    try:
+        get_session_manager().discard(session_id)
+    except Exception as e:
+        print(f"Warning: Error closing existing interactor: {e}")
     
-    if context_length is not None:
-        try:
-            ai.context_length = context_length
-        except Exception as e:
-            return jsonify({"error": f"Failed to set context length: {str(e)}"}), 500
+    # Get new interactor instance and apply new settings if provided
+    with hold_interactor(session_id) as ai:
+        if model or base_url or api_key:
+            try:
+                ai._setup_client(model, base_url, api_key)
+                ai._setup_encoding()
+            except Exception as e:
+                return jsonify({"error": f"Failed to apply new settings: {str(e)}"}), 500
+        
+        if context_length is not None:
+            try:
+                ai.context_length = context_length
+            except Exception as e:
+                return jsonify({"error": f"Failed to set context length: {str(e)}"}), 500
     
     return jsonify({
         "success": True,
@@ -1326,33 +1615,12 @@ def load_transcript(transcript_id):
         return jsonify({"error": "Transcript not found"}), 404
     
     try:
-        # Get the interactor and update its messages with the transcript's messages
-        ai = get_interactor()
-        
-        # Clear existing messages but keep system prompt
-        ai.messages_flush()  
-        
-        # Add each message from the transcript to the interactor
-        for message in transcript['messages']:
-            if message['role'] != 'system':  # Skip system messages as they're preserved by messages_flush
-                # Handle different message formats (tool calls vs regular messages)
-                if message.get('tool_calls'):
-                    # This is an assistant message with tool calls
-                    ai.history.append({
-                        'role': message['role'],
-                        'content': message.get('content'),
-                        'tool_calls': message['tool_calls']
-                    })
-                elif message.get('tool_call_id'):
-                    # This is a tool response message
-                    ai.history.append({
-                        'role': 'tool',
-                        'content': message['content'],
-                        'tool_call_id': message['tool_call_id']
-                    })
-                else:
-                    # Regular user or assistant message
-                    ai.messages_add(message['role'], message['content'])
+        # Load the transcript's messages into its session's interactor
+        with get_session_manager().acquire(request_session_id(transcript_id)) as ai:
+            # Clear existing messages but keep system prompt
+            ai.messages_flush()
+            for message in transcript_messages(transcript):
+                ai.messages_append(message)
         
         # Return the transcript data without marking it as touched
         # This prevents a race condition with duplicate message saving
@@ -1399,12 +1667,25 @@ def create_app(test_config=None):
     if test_config:
         app.config.update(test_config)
     
-    # Initialize the interactor
-    get_interactor()
+    # Load tokenizers in the background so the first request does not wait on them
+    token_registry.preload([DEFAULT_MODEL])
+    
+    # Initialize the default session's interactor
+    get_interactor(DEFAULT_SESSION)
     
     return app
 
 
+def preload():
+    """Load what every worker process needs before a multi-process server forks.
+    
+    Tokenizers are loaded in the foreground, so forked workers share them instead
+    of each loading its own. Nothing that must not cross a fork is created: no
+    session, provider client, thread or database connection.
+    """
+    token_registry.preload([DEFAULT_MODEL], background=False)
+
+
 def run_api(host='127.0.0.1', port=5000, debug=False):
     """Run the API server.
     
@@ -1413,6 +1694,7 @@ def run_api(host='127.0.0.1', port=5000, debug=False):
         port (int): Port to run the server on
         debug (bool): Whether to run in debug mode
     """
+    token_registry.preload([DEFAULT_MODEL])
     app.run(host=host, port=port, debug=debug, threaded=True)
 
 
@@ -1431,6 +1713,12 @@ if __name__ == '__main__':
 # Interact with the AI (streaming)
 # curl -N -X POST http://127.0.0.1:5000/api/interact -H "Content-Type: application/json" -d '{"message": "hello"}'
 
+# Interact with the AI (streaming typed events, one JSON object per line)
+# curl -N -X POST http://127.0.0.1:5000/api/interact -H "Content-Type: application/json" -d '{"message": "hello", "stream": true, "format": "ndjson"}'
+
+# Interact with the AI (streaming server-sent events)
+# curl -N -X POST http://127.0.0.1:5000/api/interact -H "Content-Type: application/json" -H "Accept: text/event-stream" -d '{"message": "hello", "stream": true}'
+
 # List available models
 # curl http://127.0.0.1:5000/api/models
 
@@ -1440,6 +1728,21 @@ if __name__ == '__main__':
 # Get registered functions
 # curl http://127.0.0.1:5000/api/functions
 
+# Get tool result cache statistics
+# curl http://127.0.0.1:5000/api/tool_cache
+
+# Get statistics of the last interaction
+# curl http://127.0.0.1:5000/api/stats
+
+# Get session pool statistics
+# curl http://127.0.0.1:5000/api/sessions
+
+# Get generation scheduler statistics (running, queued and rejected requests)
+# curl http://127.0.0.1:5000/api/scheduler
+
+# Interact within a named session
+# curl -X POST http://127.0.0.1:5000/api/interact -H "Content-Type: application/json" -H "X-Session-ID: my-session" -d '{"message": "hello", "stream": false}'
+
 # Set system prompt
 # curl -X POST http://127.0.0.1:5000/api/system_prompt -H "Content-Type: application/json" -d '{"prompt": "You are a helpful assistant."}'
 
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: asgi.py
+# Author: Wadih Khairallah
+# Description: ASGI entry point serving the /api routes with natively
+#              async interaction streaming on AsyncInteractor
+# Created: 2025-04-25 09:12:37
+# Modified: 2025-04-25 09:12:37
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+try:
+    from . import api
+    from . import token_registry
+    from .async_interactor import AsyncInteractor
+    from .cancellation import Cancelled, CancelToken
+    from .events import (
+        STREAM_QUEUE_SIZE,
+        TOOL_PROGRESS_INTERVAL,
+        apublish,
+        event_stream,
+        format_tool_results,
+        interaction_error,
+        output_event,
+        usage_event
+    )
+    from .scheduler import AsyncGenerationScheduler, SchedulerFull
+    from .sessions import DEFAULT_SESSION
+except ImportError:
+    import api
+    import token_registry
+    from async_interactor import AsyncInteractor
+    from cancellation import Cancelled, CancelToken
+    from events import (
+        STREAM_QUEUE_SIZE,
+        TOOL_PROGRESS_INTERVAL,
+        apublish,
+        event_stream,
+        format_tool_results,
+        interaction_error,
+        output_event,
+        usage_event
+    )
+    from scheduler import AsyncGenerationScheduler, SchedulerFull
+    from sessions import DEFAULT_SESSION
+
+# Sessions created by this server run their interactions on the event loop.
+# The routes bridged to the Flask app only use the synchronous parts of the interactor.
+api.INTERACTOR_CLASS = AsyncInteractor
+
+# Worker tasks that run every generation request on the event loop
+scheduler = None
+
+# Threads running the Flask routes that have no async version
+WSGI_WORKERS = 16
+
+
+def get_scheduler() -> AsyncGenerationScheduler:
+    """Get or initialize the async generation scheduler.
+
+    Returns:
+        AsyncGenerationScheduler: The worker tasks that run generation requests
+    """
+    global scheduler
+    if scheduler is None:
+        scheduler = AsyncGenerationScheduler(
+            max_workers=api.GENERATION_WORKERS,
+            max_queue=api.GENERATION_QUEUE,
+            max_queue_per_client=api.GENERATION_QUEUE_PER_CLIENT
+        )
+    return scheduler
+
+
+def request_client_id(request: Request) -> str:
+    """Get the client a request comes from, for fair scheduling.
+
+    Args:
+        request: The incoming request
+
+    Returns:
+        str: The X-Client-ID header, or the remote address
+    """
+    return request.headers.get('X-Client-ID') or (request.client.host if request.client else None) or "unknown"
+
+
+def request_session_id(request: Request, data: Dict[str, Any], transcript_id: Optional[str] = None) -> str:
+    """Get the session a request belongs to, resolved like api.request_session_id().
+
+    Args:
+        request: The incoming request
+        data: The request JSON
+        transcript_id: Transcript the request is about, if any
+
+    Returns:
+        str: The session ID
+    """
+    return (
+        request.headers.get('X-Session-ID')
+        or request.query_params.get('session_id')
+        or data.get('session_id')
+        or transcript_id
+        or data.get('transcript_id')
+        or request.query_params.get('transcript_id')
+        or DEFAULT_SESSION
+    )
+
+
+def overloaded_response(error: SchedulerFull) -> JSONResponse:
+    """Build the response for a generation request rejected by the scheduler.
+
+    Args:
+        error: The rejection
+
+    Returns:
+        JSONResponse: A 503 response with a Retry-After header
+    """
+    return JSONResponse(
+        {"error": str(error), "retry_after": error.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+async def interact(request: Request):
+    """Interact with the AI model and get a response.
+
+    Accepts the same JSON parameters and returns the same responses, plain or framed
+    as typed events, as the Flask /api/interact route. Streamed tokens go from the
+    interaction's output callback straight into the response body; no thread waits
+    on them. A client that disconnects cancels its interaction, as in the Flask route.
+    """
+    data = await request.json()
+    stream = data.get('stream', False)
+    enable_tools = data.get('tools', True)
+    transcript_id = data.get('transcript_id', None)
+    combined_input = api.interaction_input(data)
+
+    sessions = api.get_session_manager()
+    session_id = request_session_id(request, data, transcript_id)
+    generation = get_scheduler()
+
+    # Capture the response timestamp for storing with the message
+    response_timestamp = int(time.time() * 1000)
+
+    if stream:
+        # Bounded, so a slow client holds the interaction back rather than buffering it
+        q: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        events = event_stream(data, request.headers.get('Accept'))
+        cancel = CancelToken()
+
+        async def stream_callback(token):
+            await apublish(q, output_event(token), cancel)
+
+        async def generate_response():
+            try:
+                async with sessions.aacquire(session_id, transcript_id) as ai:
+                    await ai.interact(
+                        combined_input,
+                        output_callback=stream_callback,
+                        stream=True,
+                        tools=enable_tools,
+                        cancel=cancel
+                    )
+                    stats = ai.last_stats
+
+                error = interaction_error(stats)
+                if error and not cancel.cancelled:
+                    await apublish(q, {"type": "error", "message": error}, cancel)
+                if stats is not None:
+                    await apublish(q, usage_event(stats), cancel)
+                await apublish(q, None, cancel)  # Signal end of stream
+            except Exception as e:
+                if isinstance(e, Cancelled) and cancel.cancelled:
+                    return  # The client is gone; nobody reads the queue any more
+                # Anything else, including a Cancelled that is not ours, still ends the stream.
+                try:
+                    await apublish(q, {"type": "error", "message": str(e)}, cancel)
+                    await apublish(q, None, cancel)
+                except Cancelled:
+                    pass
+                raise
+
+        # Queue the generation before streaming starts, so an overloaded server can still answer 503
+        try:
+            job = generation.submit(generate_response, request_client_id(request), session_id)
+        except SchedulerFull as e:
+            return overloaded_response(e)
+
+        async def generate():
+            finished = False
+            try:
+                # Report the queue position while the request waits for a worker
+                position = None
+                while not job.started:
+                    current = generation.position(job)
+                    if current and current != position:
+                        position = current
+                        yield events.frame({"type": "queue", "position": position})
+                    await job.wait_started(api.QUEUE_POSITION_INTERVAL)
+                if position is not None:
+                    yield events.frame({"type": "queue", "position": 0, "status": "started"})
+
+                while True:
+                    try:
+                        event = await asyncio.wait_for(q.get(), TOOL_PROGRESS_INTERVAL)
+                    except asyncio.TimeoutError:
+                        # Nothing new; report the tools that are still running, or
+                        # write a heartbeat so a closed connection is noticed
+                        for frame in events.progress() or [events.heartbeat()]:
+                            if frame:
+                                yield frame
+                        continue
+                    if event is None:
+                        break
+                    frame = events.frame(event)
+                    if frame:
+                        yield frame
+
+                frame = events.frame({"type": "done"})
+                if frame:
+                    yield frame
+                finished = True
+            finally:
+                # A client that disconnects while queued gives up its place;
+                # one that disconnects later stops its interaction
+                generation.cancel(job)
+                if not finished:
+                    cancel.cancel("Client disconnected")
+
+        return StreamingResponse(
+            generate(),
+            media_type=events.content_type,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    try:
+        collected_tool_results = []
+
+        def collect_tool_results(token):
+            result = api.completed_tool_result(token)
+            if result is not None:
+                collected_tool_results.append(result)
+
+        async def generate_response():
+            async with sessions.aacquire(session_id, transcript_id) as ai:
+                response = await ai.interact(
+                    combined_input,
+                    quiet=True,
+                    tools=enable_tools,
+                    stream=False,
+                    output_callback=collect_tool_results
+                )
+                return response, ai.messages_get()
+
+        try:
+            job = generation.submit(generate_response, request_client_id(request), session_id)
+        except SchedulerFull as e:
+            return overloaded_response(e)
+        response, messages = await job.wait()
+
+        # interact() returns None for an empty or oversized prompt
+        if response is not None:
+            response += format_tool_results(collected_tool_results)
+        tool_data = api.extract_tool_data(messages)
+        if transcript_id:
+            await run_in_threadpool(
+                api.save_interaction, transcript_id, combined_input, response, tool_data, response_timestamp
+            )
+
+        return JSONResponse({"response": response})
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def list_models(request: Request):
+    """List available AI models. Same parameters and response as the Flask /api/models route."""
+    provider = request.query_params.get('provider')
+    filter_pattern = request.query_params.get('filter')
+    refresh = request.query_params.get('refresh', 'false').lower() == 'true'
+
+    sessions = api.get_session_manager()
+    ai = await run_in_threadpool(sessions.get, request_session_id(request, {}))
+    models = await ai.list(providers=provider, filter=filter_pattern, refresh=refresh)
+
+    return JSONResponse({"models": models})
+
+
+async def get_scheduler_stats(request: Request):
+    """Get statistics of the async generation scheduler.
+
+    Returns:
+        JSON response with running and queued requests, rejection counts and the
+        average request duration and queue wait in seconds
+    """
+    return JSONResponse(get_scheduler().stats())
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load tokenizers in the background so the first request does not wait on them
+    token_registry.preload([api.DEFAULT_MODEL])
+    yield
+    if scheduler is not None:
+        await scheduler.aclose()
+    if api.session_manager is not None:
+        await run_in_threadpool(api.session_manager.close)
+
+
+app = Starlette(
+    routes=[
+        Route('/api/interact', interact, methods=['POST']),
+        Route('/api/models', list_models, methods=['GET']),
+        Route('/api/scheduler', get_scheduler_stats, methods=['GET']),
+        # Every other route is served by the Flask app on a thread pool
+        Mount('/', app=WSGIMiddleware(api.app, workers=WSGI_WORKERS))
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=api.CORS_ORIGINS,
+            allow_credentials=True,
+            allow_headers=api.CORS_HEADERS,
+            allow_methods=api.CORS_METHODS
+        )
+    ],
+    lifespan=lifespan
+)
+
+
+def run_asgi(host='127.0.0.1', port=5000, log_level='info'):
+    """Run the ASGI server.
+
+    Args:
+        host (str): Host to run the server on
+        port (int): Port to run the server on
+        log_level (str): uvicorn log level
+    """
+    import uvicorn
+    uvicorn.run(app, host=host, port=port, log_level=log_level)
+
+
+if __name__ == '__main__':
+    run_asgi()
+
+
+# ----------------------------------------------------------------------
+# Running the ASGI server
+# ----------------------------------------------------------------------
+
+# pip install starlette uvicorn a2wsgi
+# uvicorn pathfinder.backend.asgi:app --host 127.0.0.1 --port 5000
+
+# All curl examples in api.py work unchanged against this server.
+
+# Several worker processes sharing their sessions: see gunicorn_conf.py
+
+# Compare against the Flask server with the load tester
+# python -m pathfinder.backend.loadtest http://127.0.0.1:5000 --requests 200 --concurrency 50
@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: async_interactor.py
+# Author: Wadih Khairallah
+# Description: asyncio version of the Interactor class built
+#              on openai.AsyncOpenAI
+# Created: 2025-04-18 15:21:09
+# Modified: 2025-04-18 15:21:09
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import time
+import openai
+from concurrent.futures import Executor
+from rich.console import Console
+from rich.markdown import Markdown
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from .interactor import Interactor
+    from .coalesce import AsyncCoalescingCallback
+    from . import clients
+    from .probe_cache import rejects_tools
+    from .cancellation import Cancelled, CancelToken, cancel_scope
+except ImportError:
+    from interactor import Interactor
+    from coalesce import AsyncCoalescingCallback
+    import clients
+    from probe_cache import rejects_tools
+    from cancellation import Cancelled, CancelToken, cancel_scope
+
+console = Console()
+
+
+class AsyncInteractor(Interactor):
+    """Interactor whose network calls and tool loop run on an asyncio event loop.
+
+    Exposes the same surface as Interactor (interact, add_function, messages_*,
+    list), but interact() and list() are coroutines. Tools may be plain functions,
+    which run in an executor, or coroutine functions, which are awaited directly.
+    One event loop can drive many conversations without a thread per request.
+
+    Constructors cannot await, so a model with no cached tool-support result is
+    treated as supporting tools until the first interact() call probes it.
+    """
+
+    def __init__(self, *args, executor: Optional[Executor] = None, **kwargs):
+        """Initialize the async AI interaction client.
+
+        Accepts the same arguments as Interactor.
+
+        Args:
+            executor: Optional executor for synchronous tools. If None, uses the
+                event loop's default executor.
+        """
+        self.executor = executor
+        self._tool_support_pending = False
+        super().__init__(*args, **kwargs)
+
+    def _create_client(self, provider: str, base_url: str, api_key: str):
+        """Record the provider endpoint used for chat completions.
+
+        Async clients are bound to an event loop, so the client itself is looked
+        up on each access through the client property.
+
+        Args:
+            provider: Provider name.
+            base_url: Effective base URL for the provider.
+            api_key: Effective API key for the provider.
+        """
+        self._client_key = (provider, base_url, api_key)
+
+    @property
+    def client(self):
+        """The pooled async client for the current endpoint on the running event loop."""
+        return clients.get_async_client(*self._client_key)
+
+    @client.setter
+    def client(self, value):
+        # Interactor._setup_client assigns the result of _create_client; the
+        # endpoint is already recorded there.
+        pass
+
+    def _check_tool_support(self) -> bool:
+        """Read tool support from the cache, deferring the probe on a miss.
+
+        Returns:
+            bool: The cached result, or True until _ensure_tool_support() probes the model.
+        """
+        cached = self.tool_support_cache.get(self.provider, self.base_url, self.model)
+        self._tool_support_pending = cached is None
+        return True if cached is None else cached
+
+    async def _ensure_tool_support(self):
+        """Probe the current model for tool support if the result is not known yet."""
+        if not self._tool_support_pending:
+            return
+        self._tool_support_pending = False
+
+        try:
+            response = await self.client.chat.completions.create(**self._probe_params())
+            message = response.choices[0].message
+            supported = bool(message.tool_calls and len(message.tool_calls) > 0)
+        except openai.BadRequestError as e:
+            supported = False if rejects_tools(e) else None
+        except Exception:
+            supported = None
+
+        if supported is not None:
+            self.tool_support_cache.set(self.provider, self.base_url, self.model, supported)
+        self.tools_supported = bool(supported)
+
+    async def refresh_tool_support(self, all_models: bool = False) -> bool:
+        """Invalidate cached tool-support results and re-probe the current model.
+
+        Args:
+            all_models: If True, clears the cached results for every model instead
+                of only the current provider, base URL and model.
+
+        Returns:
+            bool: True if the current model supports tool calling.
+        """
+        if all_models:
+            self.tool_support_cache.invalidate()
+        else:
+            self.tool_support_cache.invalidate(self.provider, self.base_url, self.model)
+        self._tool_support_pending = True
+        await self._ensure_tool_support()
+        return self.tools_supported
+
+    async def list(
+        self,
+        providers: Optional[str | list[str]] = None,
+        filter: Optional[str] = None,
+        refresh: bool = False
+    ) -> list:
+        """Check providers for available models.
+
+        Runs Interactor.list() in the executor; providers are queried concurrently
+        and cached by the shared model catalog.
+
+        Args:
+            providers: If specified, list only models from these providers. Can be a single provider string
+                      or a list of provider strings. If None, lists all providers.
+            filter: If specified, only include models whose names match this regex pattern (case-insensitive).
+            refresh: If True, bypasses the cache and queries every selected provider.
+
+        Returns:
+            List of model names matching the criteria.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(Interactor.list, self, providers, filter, refresh)
+        return await loop.run_in_executor(self.executor, call)
+
+    async def interact(
+        self,
+        user_input: Optional[str],
+        quiet: bool = False,
+        tools: bool = True,
+        stream: bool = True,
+        markdown: bool = False,
+        model: Optional[str] = None,
+        output_callback: Optional[Callable[[str], Any]] = None,
+        return_stats: bool = False,
+        cancel: Optional[CancelToken] = None
+    ) -> Optional[str]:
+        """Interact with the AI, handling streaming and multiple tool calls iteratively.
+
+        Args:
+            user_input: The user's input message to send to the AI.
+            quiet: If True, suppresses console output.
+            tools: Enable (True) or disable (False) tool calling for this interaction.
+            stream: Enable (True) or disable (False) streaming responses for this interaction.
+            markdown: If True, renders the final response as markdown in the console.
+            model: Optional model to use for this interaction, overriding the current model.
+            output_callback: Optional callback, plain or async, to handle each token output.
+            return_stats: If True, returns (response, InteractionStats) instead of the response alone.
+            cancel: Optional token that stops the interaction from any thread. The awaited
+                provider call or tool is cancelled, and the response generated so far is
+                kept in history and returned.
+
+        Returns:
+            str: The AI's response, or None if user_input is empty or exceeds the context
+            length. The statistics of the interaction are also kept in last_stats, which
+            is None for an interaction that never started.
+
+        Note:
+            Tool calls returned together in one turn run concurrently; their results
+            are added to history in the order the model issued them.
+        """
+        self.last_stats = None
+        if not user_input:
+            return (None, None) if return_stats else None
+
+        # Switch model if provided and different from current model.
+        if model:
+            self._switch_model(model)
+        await self._ensure_tool_support()
+
+        if not self._start_turn(user_input, tools):
+            return (None, None) if return_stats else None
+
+        stats = self._begin_stats()
+        use_stream = self.stream if stream is None else stream
+        content = ""
+        token_output = (
+            AsyncCoalescingCallback(output_callback, self.coalesce_window, self.coalesce_bytes)
+            if output_callback else None
+        )
+        disarm = self._cancel_task_on(cancel) if cancel is not None else None
+
+        while True:
+            params = self._request_params(use_stream)
+            request = stats.request_started(self._prompt_tokens(params))
+            request_text = ""
+
+            try:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                response = await self._acreate_completion(params)
+                stats.request_sent(request, self.last_target)
+                tool_calls = []
+
+                if use_stream:
+                    tool_calls_dict = {}
+                    async for chunk in response:
+                        stats.usage(request, getattr(chunk, "usage", None))
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.content or delta.tool_calls:
+                            stats.first_token(request)
+
+                        if delta.content:
+                            content += delta.content
+                            request_text += delta.content
+                            # Stream token to callback if provided, batched by the coalescer.
+                            if token_output:
+                                await token_output(delta.content)
+                            elif not markdown and not quiet:
+                                print(delta.content, end="")
+
+                        if delta.tool_calls:
+                            # Tool-call boundary: release buffered text right away.
+                            if token_output:
+                                await token_output.flush()
+                            self._merge_tool_call_deltas(tool_calls_dict, delta.tool_calls)
+
+                    tool_calls = list(tool_calls_dict.values())
+                    if token_output:
+                        await token_output.flush()
+                    stats.request_ended(request, self._completion_tokens(request_text, tool_calls))
+                else:
+                    stats.first_token(request)
+                    stats.usage(request, getattr(response, "usage", None))
+                    message = response.choices[0].message
+                    tool_calls = message.tool_calls or []
+                    stats.request_ended(request, self._completion_tokens(message.content or "", tool_calls))
+                    if not tool_calls:
+                        content += message.content or "No response."
+                        if output_callback:
+                            await self._emit(output_callback, message.content or "No response.")
+                        elif not quiet and not markdown:
+                            print(content, end="")
+                        break
+
+                if not tool_calls:
+                    break
+
+                # Add assistant message with tool calls.
+                self._append_message(self._assistant_tool_message(tool_calls))
+
+                # Send tool call notification through callback
+                if output_callback:
+                    for call in tool_calls:
+                        tool_call_id, name, _ = self._tool_call_fields(call)
+                        await self._emit(output_callback, self._tool_notification(name, "started", tool_call_id=tool_call_id))
+
+                async def run_tool(call):
+                    tool_call_id, name, arguments = self._tool_call_fields(call)
+                    try:
+                        with cancel_scope(cancel):
+                            result = await self._handle_tool_call_async(name, arguments)
+                    except Cancelled:
+                        raise
+                    except Exception as e:
+                        # Answered like any other call; the turn ends with the error once all are in.
+                        return tool_call_id, {"status": "error", "error": str(e)}, e
+                    shaped, shaping = self._shape_tool_result(name, arguments, result)
+                    # Send tool completion notification
+                    if output_callback:
+                        await self._emit(output_callback, self._tool_notification(name, "completed", result, shaping, tool_call_id))
+                    return tool_call_id, shaped, None
+
+                # Process tool calls and add their results to history in call order.
+                try:
+                    results = await asyncio.gather(*(run_tool(call) for call in tool_calls))
+                except (Cancelled, asyncio.CancelledError):
+                    # Answer every call, so the history stays valid for the next request.
+                    for call in tool_calls:
+                        tool_call_id, _, _ = self._tool_call_fields(call)
+                        self._append_tool_result(tool_call_id, {"status": "cancelled", "message": "Tool call cancelled"})
+                    raise
+                for tool_call_id, result, _ in results:
+                    self._append_tool_result(tool_call_id, result)
+                error = next((error for _, _, error in results if error is not None), None)
+                if error is not None:
+                    raise error
+
+            except asyncio.CancelledError:
+                # Only a cancellation requested through the token ends the turn quietly.
+                task = asyncio.current_task()
+                if cancel is None or not cancel.cancelled or (hasattr(task, "uncancel") and task.uncancel() > 0):
+                    if token_output:
+                        token_output.close()
+                    raise
+                if request.duration is None:
+                    stats.request_ended(request, self._completion_tokens(request_text, []), cancel.reason)
+                stats.failed(cancel.reason)
+                break
+            except Exception as e:
+                if cancel is not None and cancel.cancelled:
+                    if request.duration is None:
+                        stats.request_ended(request, self._completion_tokens(request_text, []), cancel.reason)
+                    stats.failed(cancel.reason)
+                    break
+                error_msg = f"Error: {e}"
+                if request.duration is None:
+                    stats.request_ended(request, self._completion_tokens(request_text, []), str(e))
+                stats.failed(str(e))
+                if not quiet:
+                    console.print(f"[red]{error_msg}[/red]")
+                content += f"\n{error_msg}"
+                break
+
+        if disarm is not None:
+            disarm()
+
+        if token_output:
+            if cancel is not None and cancel.cancelled:
+                token_output.close()
+            else:
+                await token_output.flush()
+
+        if markdown and not quiet and not output_callback:
+            console.print(Markdown(content))
+
+        # Add final assistant response to history.
+        self._append_message({"role": "assistant", "content": content})
+        self._end_stats()
+
+        return (content, stats) if return_stats else content
+
+    async def interact_many(
+        self,
+        prompts: List[Any],
+        concurrency: int = 4,
+        retries: int = 0,
+        retry_delay: float = 1.0,
+        on_result: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        **kwargs
+    ) -> List[Dict[str, Any]]:
+        """Run many independent prompts against the current history with bounded concurrency.
+
+        The asyncio version of Interactor.interact_many(): prompts run as tasks on
+        the current event loop, at most concurrency at a time, each on its own fork().
+
+        Args:
+            prompts: Prompt strings, or dicts with a 'prompt' key and optional 'id',
+                'system' (system prompt for that item) and 'model' keys.
+            concurrency: Maximum number of prompts in flight at once.
+            retries: Extra attempts for a prompt whose request or tool call failed.
+            retry_delay: Seconds before the first retry, doubled on each further retry.
+            on_result: Optional plain or async callback receiving each result as soon
+                as it finishes.
+            **kwargs: Passed to interact() for every prompt. quiet defaults to True.
+
+        Returns:
+            list: One dict per prompt, in input order, with id, prompt, response, error,
+            attempts, duration in seconds and the InteractionStats of the last attempt.
+        """
+        kwargs.setdefault("quiet", True)
+        kwargs.pop("return_stats", None)
+        items = [item if isinstance(item, dict) else {"prompt": item} for item in prompts]
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(index, item):
+            async with semaphore:
+                result = await self._interact_item_async(index, item, retries, retry_delay, kwargs)
+            if on_result:
+                reported = on_result(result)
+                if inspect.isawaitable(reported):
+                    await reported
+            return result
+
+        return list(await asyncio.gather(*(run(index, item) for index, item in enumerate(items))))
+
+    async def _interact_item_async(
+        self,
+        index: int,
+        item: Dict[str, Any],
+        retries: int,
+        retry_delay: float,
+        kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Run one interact_many() prompt on a fresh fork, retrying failed attempts.
+
+        Args:
+            index: Position of the prompt in the batch, used as its id if it has none.
+            item: The prompt dict.
+            retries: Extra attempts after a failed one.
+            retry_delay: Seconds before the first retry, doubled on each further retry.
+            kwargs: Keyword arguments for interact().
+
+        Returns:
+            dict: The result record.
+        """
+        started = time.monotonic()
+        result, options = self._batch_item(index, item, kwargs)
+        if result["error"]:
+            return result
+
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(retry_delay * 2 ** (attempt - 1))
+            result["attempts"] = attempt + 1
+            fork = self.fork()
+            try:
+                if item.get("system"):
+                    fork.messages_system(item["system"])
+                response, stats = await fork.interact(result["prompt"], return_stats=True, **options)
+            except Exception as e:
+                response, stats, error, retryable = None, None, str(e), True
+            else:
+                error, retryable = self._batch_outcome(stats, options)
+            finally:
+                await fork.aclose()
+
+            result.update({"response": response, "stats": stats, "error": error})
+            if error is None or not retryable:
+                break
+
+        result["duration"] = time.monotonic() - started
+        return result
+
+    async def _acreate_completion(self, params: Dict[str, Any]):
+        """Get a chat completion from the response cache or the provider.
+
+        Args:
+            params: Keyword arguments for chat.completions.create.
+
+        Returns:
+            The response, or an async iterator over its chunks when streaming.
+        """
+        if self.response_cache is None:
+            return await self._asend_completion(params)
+
+        key = self.response_cache.make_key(self.provider, self.base_url, params)
+        loop = asyncio.get_running_loop()
+        entry = await loop.run_in_executor(self.executor, self.response_cache.get, key)
+        if entry is not None:
+            self.last_target = "cache"
+            return self.response_cache.areplay(entry) if params.get("stream") else self.response_cache.message(entry)
+
+        response = await self._asend_completion(params)
+        # Only answers from the requested model are cached under its key.
+        if self.last_target != f"{self.provider}:{self.model}":
+            return response
+        if params.get("stream"):
+            return self.response_cache.arecord(key, self.last_target, response)
+        self.response_cache.store_message(key, self.last_target, response)
+        return response
+
+    async def _asend_completion(self, params: Dict[str, Any]):
+        """Send a chat completion request, through the failover policy when one is configured.
+
+        Args:
+            params: Keyword arguments for chat.completions.create.
+
+        Returns:
+            The response, or an async iterator over its chunks when streaming.
+        """
+        if not self.failover:
+            self.last_target = f"{self.provider}:{self.model}"
+            return await self.client.chat.completions.create(**params)
+
+        attempts = self._completion_attempts(params, clients.get_async_client)
+        index, response = await self.failover.arun(attempts, params.get("stream", False))
+        self.last_target = attempts[index][0]
+        return response
+
+    @staticmethod
+    async def _emit(output_callback: Callable[[str], Any], token: Optional[str]):
+        """Send a token to a plain or async output callback.
+
+        Args:
+            output_callback: The callback to invoke.
+            token: The token or notification string. Nothing is sent if empty.
+        """
+        if not token:
+            return
+        result = output_callback(token)
+        if inspect.isawaitable(result):
+            await result
+
+    async def _handle_tool_call_async(self, function_name: str, function_arguments: str) -> Any:
+        """Process a tool call and return the result.
+
+        Coroutine functions are awaited on the event loop; plain functions run in
+        the configured executor so they do not block other conversations. Both go
+        through the tool result cache when one is configured.
+
+        Args:
+            function_name: Name of the function to call.
+            function_arguments: JSON string containing the function arguments.
+
+        Returns:
+            The result of the function call.
+
+        Raises:
+            ValueError: If the function is not found.
+        """
+        func, arguments = self._resolve_tool_call(function_name, function_arguments)
+        if inspect.iscoroutinefunction(func):
+            started = time.monotonic()
+            error = None
+            try:
+                if self.tool_cache is not None:
+                    return await self.tool_cache.acall(function_name, arguments, func)
+                return await func(**arguments)
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                self._record_tool_call(function_name, started, error)
+
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self._call_tool, function_name, func, arguments)
+        # Run in a copy of the current context, so the tool sees the interaction's cancel token.
+        result = await loop.run_in_executor(self.executor, contextvars.copy_context().run, call)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    @staticmethod
+    def _cancel_task_on(cancel: CancelToken) -> Callable[[], None]:
+        """Cancel the current task when a token is cancelled, from whatever thread cancels it.
+
+        Args:
+            cancel: The token to watch.
+
+        Returns:
+            callable: Stops watching; call it before the task does anything that must not be cancelled.
+        """
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        armed = True
+
+        def cancel_task():
+            if armed:
+                task.cancel()
+
+        def on_cancel():
+            try:
+                loop.call_soon_threadsafe(cancel_task)
+            except RuntimeError:
+                pass  # The loop is closed; the task is gone.
+
+        release = cancel.on_cancel(on_cancel)
+
+        def disarm():
+            nonlocal armed
+            armed = False
+            release()
+
+        return disarm
+
+    async def aclose(self):
+        """Release resources held by the interactor.
+
+        Provider clients are pooled per event loop and shared with other
+        interactors, so they are left open.
+        """
+        self.close()
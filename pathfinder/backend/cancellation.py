@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: cancellation.py
+# Author: Wadih Khairallah
+# Description: Cooperative cancellation of an interaction and the
+#              tool calls it runs
+# Created: 2025-04-27 09:48:20
+# Modified: 2025-04-27 09:48:20
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Optional
+
+from rich.console import Console
+
+console = Console()
+log = console.log
+
+
+class Cancelled(Exception):
+    """Raised inside an interaction or tool call whose CancelToken was cancelled."""
+
+
+class CancelToken:
+    """Flag that tells an interaction, and the tools it runs, to stop.
+
+    Cancelling is thread-safe and happens once. Code that blocks on something the
+    flag cannot interrupt, such as a provider stream, a browser or a subprocess,
+    registers a callback with on_cancel() that closes or kills it.
+    """
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancel() was called."""
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "Cancelled"):
+        """Cancel and run the registered callbacks.
+
+        Args:
+            reason: Why the work was cancelled, used as the Cancelled message.
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                log(f"[yellow]Cancel callback failed:[/yellow] {e}")
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run a callback when the token is cancelled, or now if it already is.
+
+        Args:
+            callback: Callable without arguments. It may run on any thread.
+
+        Returns:
+            callable: Unregisters the callback; call it once the guarded work is over.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        """Raise Cancelled if the token was cancelled."""
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the token is cancelled.
+
+        Args:
+            timeout: Maximum seconds to wait.
+
+        Returns:
+            bool: True if the token was cancelled.
+        """
+        return self._event.wait(timeout)
+
+
+class ClosableStream:
+    """Chunk iterator wrapping a provider stream, closable from another thread.
+
+    Streams passed through a generator, such as a failover replay or a response
+    cache recording, cannot be stopped by closing the generator while a read is
+    blocked in it; that fails with "generator already executing". close() here
+    closes the provider stream itself, which ends the blocked read.
+    """
+
+    def __init__(self, chunks: Iterator[Any], stream: Any):
+        """Wrap a stream.
+
+        Args:
+            chunks: Iterator yielding the chunks, usually a generator reading stream.
+            stream: The underlying stream; anything with close(), including another ClosableStream.
+        """
+        self.chunks = chunks
+        self.stream = stream
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        """Close the underlying stream. Safe to call from any thread."""
+        close = getattr(self.stream, "close", None)
+        if close is not None:
+            close()
+
+
+_current: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """Make a token the current one for the code inside the block.
+
+    Tool calls started from the block, including those on the interactor's tool
+    threads, see the token through current_token().
+
+    Args:
+        token: The token, or None for no cancellation.
+
+    Yields:
+        CancelToken: The token.
+    """
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def current_token() -> Optional[CancelToken]:
+    """Get the token of the interaction running the current code.
+
+    Returns:
+        CancelToken: The token, or None outside a cancellable interaction.
+    """
+    return _current.get()
+
+
+def cancelled() -> bool:
+    """Whether the current interaction was cancelled. For use in tools.
+
+    A tool whose browser or process was stopped by on_cancel() should check this
+    and return {"status": "cancelled"} instead of reporting what it got so far,
+    so the partial result is neither shown as a success nor cached.
+
+    Returns:
+        bool: True if the current token was cancelled, False outside a cancellable interaction.
+    """
+    token = _current.get()
+    return token is not None and token.cancelled
+
+
+def check_cancelled():
+    """Raise Cancelled if the current interaction was cancelled. For use in tools."""
+    token = _current.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def on_cancel(callback: Callable[[], None]) -> Callable[[], None]:
+    """Run a callback if the current interaction is cancelled. For use in tools.
+
+    Args:
+        callback: Callable without arguments, such as a browser's quit or a process's kill.
+
+    Returns:
+        callable: Unregisters the callback. Does nothing outside a cancellable interaction.
+    """
+    token = _current.get()
+    if token is None:
+        return lambda: None
+    return token.on_cancel(callback)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: clients.py
+# Author: Wadih Khairallah
+# Description: Shared HTTP transport and cached OpenAI-compatible
+#              provider clients
+# Created: 2025-04-19 11:32:45
+# Modified: 2025-04-19 11:32:45
+
+import asyncio
+import importlib.util
+import os
+import threading
+import weakref
+import httpx
+import openai
+from typing import Dict, Optional, Tuple
+
+# Connection pool and timeout settings shared by every provider client.
+MAX_CONNECTIONS = int(os.getenv("PATHFINDER_HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("PATHFINDER_HTTP_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = 60.0
+CONNECT_TIMEOUT = 10.0
+REQUEST_TIMEOUT = 600.0
+
+# HTTP/2 is used only when requested and the optional h2 package is installed.
+HTTP2 = os.getenv("PATHFINDER_HTTP2", "").lower() in ("1", "true", "yes") and importlib.util.find_spec("h2") is not None
+
+ClientKey = Tuple[str, str, Optional[str]]
+
+_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+_clients: Dict[ClientKey, openai.OpenAI] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def get_http_client() -> httpx.Client:
+    """Get the process-wide HTTP client that all sync provider clients share.
+
+    Returns:
+        httpx.Client: Keep-alive connection pool with the module's limits and timeouts.
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None or _http_client.is_closed:
+            _http_client = httpx.Client(limits=_limits(), timeout=_timeout(), http2=HTTP2)
+        return _http_client
+
+
+def get_client(provider: str, base_url: str, api_key: Optional[str]) -> openai.OpenAI:
+    """Get the cached sync client for a provider endpoint.
+
+    Switching back and forth between models of the same provider reuses the
+    client and its warm connections.
+
+    Args:
+        provider: Provider name (e.g., 'openai').
+        base_url: Effective base URL for the provider.
+        api_key: Effective API key for the provider.
+
+    Returns:
+        openai.OpenAI: The shared client.
+    """
+    key = (provider, base_url, api_key)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    http_client = get_http_client()
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = openai.OpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                timeout=_timeout(),
+                http_client=http_client
+            )
+            _clients[key] = client
+        return client
+
+
+def get_async_client(provider: str, base_url: str, api_key: Optional[str]) -> openai.AsyncOpenAI:
+    """Get the cached async client for a provider endpoint on the running event loop.
+
+    httpx async connection pools are bound to the loop that first uses them, so
+    clients and their transport are cached per event loop. Outside a running loop
+    a fresh, uncached client is returned.
+
+    Args:
+        provider: Provider name (e.g., 'openai').
+        base_url: Effective base URL for the provider.
+        api_key: Effective API key for the provider.
+
+    Returns:
+        openai.AsyncOpenAI: The shared client for the current loop.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return openai.AsyncOpenAI(base_url=base_url, api_key=api_key, timeout=_timeout())
+
+    key = (provider, base_url, api_key)
+    with _lock:
+        entry = _async_clients.get(loop)
+        if entry is None:
+            entry = (httpx.AsyncClient(limits=_limits(), timeout=_timeout(), http2=HTTP2), {})
+            _async_clients[loop] = entry
+        http_client, loop_clients = entry
+        client = loop_clients.get(key)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                timeout=_timeout(),
+                http_client=http_client
+            )
+            loop_clients[key] = client
+        return client
+
+
+def close_all():
+    """Close the shared sync transport and forget every cached client."""
+    global _http_client
+    with _lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+        _clients.clear()
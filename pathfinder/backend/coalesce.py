@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: coalesce.py
+# Author: Wadih Khairallah
+# Description: Batches streamed tokens into larger chunks by time
+#              window or byte threshold before they reach callbacks
+# Created: 2025-04-19 09:14:02
+# Modified: 2025-04-19 09:14:02
+
+import asyncio
+import heapq
+import inspect
+import itertools
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+
+class TokenCoalescer:
+    """Buffers streamed tokens and releases them in batches.
+
+    A batch is released when the buffer reaches max_bytes or when at least
+    `window` seconds have passed since the previous release. The first token
+    of a stream is released immediately so time-to-first-token is unaffected.
+    The window is checked as tokens arrive, so text buffered before the model
+    stalls waits for deadline(); the callbacks below release it then. Callers
+    also drain() at tool-call boundaries and at the end of the stream.
+    """
+
+    def __init__(
+        self,
+        window: float = 0.03,
+        max_bytes: int = 512,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize the coalescer.
+
+        Args:
+            window: Seconds between releases. 0 releases every token as it arrives.
+            max_bytes: Release as soon as the buffered UTF-8 text reaches this size.
+            clock: Monotonic clock, replaceable for testing.
+        """
+        self.window = window
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._parts: List[str] = []
+        self._size = 0
+        self._last_release = None
+
+    def push(self, token: str) -> Optional[str]:
+        """Add a token to the buffer.
+
+        Args:
+            token: The streamed text fragment.
+
+        Returns:
+            str: A batch to send now, or None if the token was buffered.
+        """
+        self._parts.append(token)
+        self._size += len(token.encode("utf-8"))
+
+        now = self.clock()
+        if (
+            self._last_release is None
+            or self._size >= self.max_bytes
+            or now - self._last_release >= self.window
+        ):
+            return self._release(now)
+        return None
+
+    def deadline(self) -> Optional[float]:
+        """Get the clock time at which the buffered text is due.
+
+        Returns:
+            float: The deadline, or None if the buffer is empty.
+        """
+        if not self._parts:
+            return None
+        return self._last_release + self.window
+
+    def drain(self) -> Optional[str]:
+        """Release everything buffered.
+
+        Returns:
+            str: The buffered text, or None if the buffer is empty.
+        """
+        if not self._parts:
+            return None
+        return self._release(self.clock())
+
+    def _release(self, now: float) -> str:
+        batch = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._last_release = now
+        return batch
+
+
+class _DeadlineFlusher:
+    """A single background thread that flushes coalescing callbacks once their window runs out.
+
+    One thread serves every stream in the process. A callback that blocks delays the
+    idle flushes of other streams, whose text then goes out with their next token.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap: List[tuple] = []
+        self._order = itertools.count()
+        self._thread = None
+
+    def schedule(self, deadline: float, target: "CoalescingCallback"):
+        """Call target._flush_due() at deadline, a time.monotonic() value."""
+        with self._cond:
+            heapq.heappush(self._heap, (deadline, next(self._order), target))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="token-flusher")
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                deadline, _, target = self._heap[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+            target._flush_due()
+
+
+_flusher = _DeadlineFlusher()
+
+
+class CoalescingCallback:
+    """Wraps an output callback so streamed tokens reach it in batches.
+
+    Text still buffered when the window runs out is sent from a background thread,
+    so a stalled stream does not hold it back until the next token. An error raised
+    by the callback there is raised by the next call from the stream.
+    """
+
+    def __init__(self, callback: Callable[[str], None], window: float = 0.03, max_bytes: int = 512):
+        """Initialize the wrapper.
+
+        Args:
+            callback: The callback receiving batched text.
+            window: Seconds between releases. 0 passes every token straight through.
+            max_bytes: Release as soon as the buffered UTF-8 text reaches this size.
+        """
+        self.callback = callback
+        self.coalescer = TokenCoalescer(window=window, max_bytes=max_bytes)
+        # Held while sending, so batches from the stream and the flusher stay in order
+        self._lock = threading.Lock()
+        self._armed = False
+        self._closed = False
+        self._error: Optional[BaseException] = None
+
+    def __call__(self, token: str):
+        with self._lock:
+            self._raise_error()
+            batch = self.coalescer.push(token)
+            if batch:
+                self.callback(batch)
+            else:
+                self._arm()
+
+    def flush(self):
+        """Send any buffered text immediately."""
+        with self._lock:
+            self._raise_error()
+            batch = self.coalescer.drain()
+            if batch:
+                self.callback(batch)
+
+    def close(self):
+        """Drop any buffered text and stop sending, such as when the stream was cancelled."""
+        with self._lock:
+            self._closed = True
+            self.coalescer.drain()
+
+    def _arm(self):
+        if not self._armed and not self._closed:
+            self._armed = True
+            _flusher.schedule(self.coalescer.deadline(), self)
+
+    def _flush_due(self):
+        with self._lock:
+            self._armed = False
+            deadline = self.coalescer.deadline()
+            if self._closed or self._error is not None or deadline is None:
+                return
+            if deadline > self.coalescer.clock():
+                # Released and refilled since this flush was scheduled
+                self._arm()
+                return
+            try:
+                self.callback(self.coalescer.drain())
+            except Exception as e:
+                self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+class AsyncCoalescingCallback:
+    """Async counterpart of CoalescingCallback for plain or coroutine callbacks.
+
+    Text still buffered when the window runs out is sent from a timer on the event
+    loop. An error raised by the callback there is raised by the next call.
+    """
+
+    def __init__(self, callback: Callable[[str], Any], window: float = 0.03, max_bytes: int = 512):
+        """Initialize the wrapper.
+
+        Args:
+            callback: The callback receiving batched text; its result is awaited if awaitable.
+            window: Seconds between releases. 0 passes every token straight through.
+            max_bytes: Release as soon as the buffered UTF-8 text reaches this size.
+        """
+        self.callback = callback
+        self.coalescer = TokenCoalescer(window=window, max_bytes=max_bytes)
+        # Held while sending, so batches from the stream and the timer stay in order
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._error: Optional[BaseException] = None
+
+    async def __call__(self, token: str):
+        async with self._lock:
+            self._raise_error()
+            batch = self.coalescer.push(token)
+            if batch:
+                await self._send(batch)
+            else:
+                self._arm()
+
+    async def flush(self):
+        """Send any buffered text immediately."""
+        async with self._lock:
+            self._raise_error()
+            await self._send(self.coalescer.drain())
+
+    def close(self):
+        """Drop any buffered text and stop sending, such as when the stream was cancelled."""
+        self._closed = True
+        self.coalescer.drain()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._task is not None:
+            self._task.cancel()
+
+    def _arm(self):
+        if self._timer is None and not self._closed:
+            delay = max(0.0, self.coalescer.deadline() - self.coalescer.clock())
+            self._timer = asyncio.get_running_loop().call_later(delay, self._due)
+
+    def _due(self):
+        self._timer = None
+        self._task = asyncio.ensure_future(self._flush_due())
+
+    async def _flush_due(self):
+        async with self._lock:
+            deadline = self.coalescer.deadline()
+            if self._closed or self._error is not None or deadline is None:
+                return
+            if deadline > self.coalescer.clock():
+                # Released and refilled since this flush was scheduled
+                self._arm()
+                return
+            try:
+                await self._send(self.coalescer.drain())
+            except Exception as e:
+                self._error = e
+
+    async def _send(self, batch: Optional[str]):
+        if not batch:
+            return
+        result = self.callback(batch)
+        if inspect.isawaitable(result):
+            await result
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
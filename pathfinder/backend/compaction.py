@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: compaction.py
+# Author: Wadih Khairallah
+# Description: Background summarization of old conversation turns
+#              with an on-disk archive of the turns it replaces
+# Created: 2025-04-20 09:41:53
+# Modified: 2025-04-20 09:41:53
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+try:
+    from . import clients
+except ImportError:
+    import clients
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pathfinder")
+
+SUMMARY_PROMPT = (
+    "You compress chat history. Summarize the conversation excerpt below so the "
+    "assistant can continue the conversation without it. Keep facts, names, numbers, "
+    "decisions, user preferences, tool results that were relied on and open questions. "
+    "Drop pleasantries and repetition. If the excerpt starts with an earlier summary, "
+    "merge it into the new one. Answer with the summary only."
+)
+
+SUMMARY_PREFIX = "Summary of earlier conversation:\n"
+
+# Assistant reply that closes the summary turn. Many OpenAI-compatible providers
+# only accept a system message at the start, so the summary is sent as a
+# user/assistant exchange instead.
+SUMMARY_ACKNOWLEDGEMENT = "Understood. I will continue from that summary."
+
+# Longest rendering of a single message sent to the summarizer.
+MAX_MESSAGE_CHARS = 4000
+
+
+class HistoryArchive:
+    """SQLite store for the full turns removed from a conversation's history.
+
+    Also keeps generated summaries keyed by a digest of the turns they cover, so
+    the same block is never summarized twice.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """Initialize the archive with a SQLite database.
+
+        Args:
+            db_path: Path to the SQLite database file. Defaults to
+                $PATHFINDER_CACHE_DIR/history_archive.db (~/.cache/pathfinder if unset).
+        """
+        if db_path is None:
+            cache_dir = os.getenv("PATHFINDER_CACHE_DIR", DEFAULT_CACHE_DIR)
+            db_path = os.path.join(cache_dir, "history_archive.db")
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._ensure_db_exists()
+
+    def _ensure_db_exists(self):
+        """Ensure the database and its schema exist."""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS archived_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                message TEXT NOT NULL,
+                archived_at REAL NOT NULL
+            )
+            ''')
+            conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_archived_conversation
+            ON archived_messages (conversation_id, id)
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS summaries (
+                digest TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            ''')
+            conn.commit()
+
+    def append(self, conversation_id: str, messages: List[Dict[str, Any]]):
+        """Archive messages removed from a conversation, oldest first.
+
+        Args:
+            conversation_id: Identifier of the conversation.
+            messages: The removed message dictionaries.
+        """
+        if not messages:
+            return
+        now = time.time()
+        rows = [(conversation_id, json.dumps(message, default=str), now) for message in messages]
+        with self._lock, sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT INTO archived_messages (conversation_id, message, archived_at) VALUES (?, ?, ?)",
+                rows
+            )
+            conn.commit()
+
+    def load(self, conversation_id: str) -> List[Dict[str, Any]]:
+        """Get every archived message of a conversation.
+
+        Args:
+            conversation_id: Identifier of the conversation.
+
+        Returns:
+            list: The archived messages in their original order.
+        """
+        with self._lock, sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT message FROM archived_messages WHERE conversation_id = ? ORDER BY id",
+                (conversation_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_summary(self, digest: str) -> Optional[str]:
+        """Look up a stored summary.
+
+        Args:
+            digest: Digest of the summarized messages and model.
+
+        Returns:
+            str: The summary, or None if the block was never summarized.
+        """
+        with self._lock, sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT summary FROM summaries WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def set_summary(self, digest: str, model: str, summary: str):
+        """Store a summary.
+
+        Args:
+            digest: Digest of the summarized messages and model.
+            model: Model that produced the summary.
+            summary: The summary text.
+        """
+        with self._lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (digest, model, summary, created_at) VALUES (?, ?, ?, ?)",
+                (digest, model, summary, time.time())
+            )
+            conn.commit()
+
+
+class HistoryCompactor:
+    """Replaces old conversation turns with a summary instead of dropping them.
+
+    Once the history passes `high_water` of the context length, the oldest turns
+    down to `low_water` are summarized on a background thread by a cheaper model.
+    The Interactor swaps the block for the summary, sent as a user message and an
+    assistant acknowledgement, at the start of a later turn, so requests never
+    wait for the summarizer and the prompt settles well below the context limit. The replaced turns are written to the archive and stay
+    retrievable. Summaries are cached in memory and in the archive.
+    """
+
+    def __init__(
+        self,
+        model: str = "openai:gpt-4o-mini",
+        high_water: float = 0.6,
+        low_water: float = 0.3,
+        keep_recent: int = 4,
+        summary_tokens: int = 1024,
+        archive: Optional[HistoryArchive] = None,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_workers: int = 2,
+        max_cached: int = 256
+    ):
+        """Initialize the compactor.
+
+        Args:
+            model: Summarizer model in format "provider:model_name".
+            high_water: Fraction of the context length that triggers a compaction.
+            low_water: Fraction of the context length the history is compacted down to.
+            keep_recent: Number of most recent messages that are never summarized.
+            summary_tokens: Maximum length of a generated summary.
+            archive: Store for replaced turns and summaries. If None, uses the shared archive.
+            base_url: Optional base URL for the summarizer. If None, uses the provider's default.
+            api_key: Optional API key for the summarizer. If None, uses the provider's default.
+            max_workers: Maximum number of summaries generated at once.
+            max_cached: Maximum number of summaries kept in memory.
+
+        Raises:
+            ValueError: If low_water is not below high_water.
+        """
+        if not 0 < low_water < high_water:
+            raise ValueError("low_water must be between 0 and high_water")
+        self.model = model
+        self.high_water = high_water
+        self.low_water = low_water
+        self.keep_recent = max(1, keep_recent)
+        self.summary_tokens = summary_tokens
+        self.archive = archive or get_history_archive()
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_cached = max_cached
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="history-compactor")
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def plan(self, history, context_length: int, reserved_tokens: int = 0) -> int:
+        """Decide how many of the oldest messages should be summarized.
+
+        Args:
+            history: The MessageHistory to inspect.
+            context_length: The conversation's context length.
+            reserved_tokens: Tokens sent with every request outside the history, such as tool schemas.
+
+        Returns:
+            int: Number of oldest non-system messages to summarize, or 0 if the
+            history is below the high-water mark or too short to compact.
+        """
+        used = history.total_tokens + reserved_tokens
+        if used < self.high_water * context_length:
+            return 0
+
+        live = len(history) - (1 if history.system else 0)
+        count = min(history.plan_eviction(used - int(self.low_water * context_length)), live - self.keep_recent)
+
+        # Never separate tool results from the assistant message that requested them.
+        messages = history.oldest(count + 1)
+        while count > 0 and len(messages) > count and messages[count].get("role") == "tool":
+            count -= 1
+
+        # The summary ends with an assistant message, so prefer ending the block
+        # right before a user message to keep the roles alternating.
+        turn = count
+        while turn > 0 and len(messages) > turn and messages[turn].get("role") != "user":
+            turn -= 1
+        if turn >= 2:
+            count = turn
+        return count if count >= 2 else 0
+
+    def submit(self, messages: List[Dict[str, Any]], providers: Dict[str, dict]) -> Future:
+        """Summarize messages on a background thread.
+
+        Args:
+            messages: The messages to summarize, oldest first.
+            providers: Provider configurations used to resolve the summarizer endpoint.
+
+        Returns:
+            Future: Resolves to the list of summary messages.
+        """
+        return self._executor.submit(self.summary_messages, list(messages), providers)
+
+    def summary_messages(self, messages: List[Dict[str, Any]], providers: Dict[str, dict]) -> List[Dict[str, Any]]:
+        """Build the messages that replace a block of turns.
+
+        Args:
+            messages: The messages to summarize, oldest first.
+            providers: Provider configurations used to resolve the summarizer endpoint.
+
+        Returns:
+            list: A user message carrying the summary and the assistant's acknowledgement.
+        """
+        return [
+            {"role": "user", "content": SUMMARY_PREFIX + self.summarize(messages, providers)},
+            {"role": "assistant", "content": SUMMARY_ACKNOWLEDGEMENT}
+        ]
+
+    def summarize(self, messages: List[Dict[str, Any]], providers: Dict[str, dict]) -> str:
+        """Summarize messages, reusing a cached summary of the same block.
+
+        Args:
+            messages: The messages to summarize, oldest first.
+            providers: Provider configurations used to resolve the summarizer endpoint.
+
+        Returns:
+            str: The summary text.
+
+        Raises:
+            ValueError: If the summarizer provider is not configured.
+        """
+        digest = self._digest(messages)
+        with self._lock:
+            summary = self._summaries.get(digest)
+            if summary is not None:
+                self._summaries.move_to_end(digest)
+                return summary
+
+        summary = self.archive.get_summary(digest)
+        if summary is None:
+            summary = self._generate(messages, providers)
+            self.archive.set_summary(digest, self.model, summary)
+
+        with self._lock:
+            self._summaries[digest] = summary
+            while len(self._summaries) > self.max_cached:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def _generate(self, messages: List[Dict[str, Any]], providers: Dict[str, dict]) -> str:
+        """Ask the summarizer model for a summary.
+
+        Raises:
+            ValueError: If the summarizer provider is not configured.
+        """
+        provider, model_name = self.model.split(":", 1)
+        if provider not in providers:
+            raise ValueError(f"Unsupported provider: {provider}. Supported providers: {list(providers.keys())}")
+        config = providers[provider]
+        client = clients.get_client(
+            provider,
+            self.base_url or config["base_url"],
+            self.api_key or config["api_key"]
+        )
+
+        response = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": self._render(messages)}
+            ],
+            max_tokens=self.summary_tokens,
+            stream=False
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    def _digest(self, messages: List[Dict[str, Any]]) -> str:
+        payload = json.dumps([self.model, messages], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _render(messages: List[Dict[str, Any]]) -> str:
+        """Render messages as a plain transcript for the summarizer."""
+        lines = []
+        for message in messages:
+            role = message.get("role", "unknown")
+            content = message.get("content") or ""
+            if not isinstance(content, str):
+                content = json.dumps(content, default=str)
+            for call in message.get("tool_calls") or []:
+                function = call.get("function", {})
+                content += f"\n[called {function.get('name')}({function.get('arguments')})]"
+            if len(content) > MAX_MESSAGE_CHARS:
+                content = content[:MAX_MESSAGE_CHARS] + " [...]"
+            lines.append(f"{role}: {content}")
+        return "\n\n".join(lines)
+
+    def close(self):
+        """Stop the background worker threads."""
+        self._executor.shutdown(wait=False)
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_history_archive() -> HistoryArchive:
+    """Get or initialize the process-wide history archive.
+
+    Returns:
+        HistoryArchive: The shared archive instance.
+    """
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = HistoryArchive()
+        return _archive
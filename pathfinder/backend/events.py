@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: events.py
+# Author: Wadih Khairallah
+# Description: Typed, sequence-numbered event stream for streamed
+#              interactions, framed as NDJSON or server-sent events
+# Created: 2025-04-26 10:03:15
+# Modified: 2025-04-26 10:03:15
+
+import asyncio
+import json
+import time
+from queue import Full, Queue
+from typing import Any, Dict, List, Optional
+
+try:
+    from .interactor import ToolNotification
+    from .cancellation import CancelToken
+except ImportError:
+    from interactor import ToolNotification
+    from cancellation import CancelToken
+
+# Framings a client can ask for, with their content types
+EVENT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+# Bytes of serialized tool result sent in a tool_result event before it is cut
+TOOL_RESULT_EVENT_LIMIT = 16 * 1024
+
+# Seconds without events before running tools are reported with tool_progress.
+# Framed streams send a heartbeat at the same interval, so a client that went
+# away is noticed on the next write and its interaction cancelled.
+TOOL_PROGRESS_INTERVAL = 0.5
+
+# Events buffered between an interaction and its response. A client reading slower
+# than the model writes holds the interaction back instead of growing the buffer.
+STREAM_QUEUE_SIZE = 256
+
+# Seconds between checks of the cancel token while an event waits for buffer space
+PUBLISH_INTERVAL = 0.25
+
+
+def stream_format(data: Dict[str, Any], accept: Optional[str] = None) -> Optional[str]:
+    """Get the event framing a streaming request asks for.
+
+    Args:
+        data: The request JSON. A "format" of "ndjson" or "sse" wins.
+        accept: The request's Accept header.
+
+    Returns:
+        str: "ndjson" or "sse", or None for the plain text stream.
+    """
+    requested = data.get("format")
+    if requested in EVENT_FORMATS:
+        return requested
+    accept = accept or ""
+    if "text/event-stream" in accept:
+        return "sse"
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    return None
+
+
+def output_event(token: str) -> Dict[str, Any]:
+    """Convert a string sent to an Interactor output callback into an event.
+
+    Args:
+        token: Model text or a ToolNotification.
+
+    Returns:
+        dict: A token, tool_started or tool_result event, without sequence number.
+    """
+    if isinstance(token, ToolNotification):
+        notification = token.data
+        event = {
+            "type": "tool_started" if notification["status"] == "started" else "tool_result",
+            "tool_name": notification["tool_name"],
+            "tool_call_id": notification.get("tool_call_id")
+        }
+        if "tool_result" in notification:
+            event["result"] = notification["tool_result"]
+        if notification.get("shaping"):
+            event["shaping"] = notification["shaping"]
+        return event
+    return {"type": "token", "text": token}
+
+
+def usage_event(stats: Any) -> Dict[str, Any]:
+    """Build the usage event of a finished interaction.
+
+    Args:
+        stats: The InteractionStats of the interaction.
+
+    Returns:
+        dict: Token counts and timings.
+    """
+    return {
+        "type": "usage",
+        "model": stats.model,
+        "prompt_tokens": stats.prompt_tokens,
+        "completion_tokens": stats.completion_tokens,
+        "iterations": stats.iterations,
+        "ttft": stats.ttft,
+        "duration": stats.duration,
+        "tool_time": stats.tool_time
+    }
+
+
+def interaction_error(stats: Any) -> Optional[str]:
+    """Get the error that ended an interaction, if any.
+
+    Interactor.interact() reports a failed request or tool in its response text
+    instead of raising, so the error is read from the interaction statistics.
+
+    Args:
+        stats: The InteractionStats of the interaction, or None.
+
+    Returns:
+        str: The error message, or None if the interaction succeeded.
+    """
+    if stats is None:
+        return None
+    return stats.error
+
+
+def publish(q: Queue, event: Optional[Dict[str, Any]], cancel: CancelToken, interval: float = PUBLISH_INTERVAL):
+    """Put an event on a bounded stream queue, waiting for space until the stream is cancelled.
+
+    Args:
+        q: The queue read by the response generator.
+        event: The event, or None for the end of the stream.
+        cancel: Token of the interaction, cancelled when the client goes away.
+        interval: Seconds between checks of the token.
+
+    Raises:
+        Cancelled: If the token is cancelled before the event fits.
+    """
+    while True:
+        cancel.raise_if_cancelled()
+        try:
+            q.put(event, timeout=interval)
+            return
+        except Full:
+            continue
+
+
+async def apublish(q: asyncio.Queue, event: Optional[Dict[str, Any]], cancel: CancelToken, interval: float = PUBLISH_INTERVAL):
+    """Put an event on a bounded asyncio stream queue; async version of publish().
+
+    Args:
+        q: The queue read by the response generator.
+        event: The event, or None for the end of the stream.
+        cancel: Token of the interaction, cancelled when the client goes away.
+        interval: Seconds between checks of the token.
+
+    Raises:
+        Cancelled: If the token is cancelled before the event fits.
+    """
+    while True:
+        cancel.raise_if_cancelled()
+        try:
+            await asyncio.wait_for(q.put(event), interval)
+            return
+        except asyncio.TimeoutError:
+            continue
+
+
+def format_tool_results(tool_results: List[Dict[str, Any]]) -> str:
+    """Format tool results as text appended to a response.
+
+    Args:
+        tool_results: Dicts with the tool_name and result of each call.
+
+    Returns:
+        str: The formatted results, or an empty string if there are none
+    """
+    if not tool_results:
+        return ""
+    text = "\n\n"  # Add spacing
+    for result in tool_results:
+        tool_name = result.get("tool_name", "Unknown Tool")
+        result_data = result.get("result", {})
+        text += f"Tool Results from {tool_name}:\n"
+        text += json.dumps(result_data, indent=2)
+        text += "\n\n"
+    return text
+
+
+class EventStream:
+    """Numbers and frames the events of one streamed interaction.
+
+    Every frame carries a type and a sequence number starting at 0, so clients can
+    parse the stream incrementally and notice gaps. Events are framed as NDJSON,
+    one JSON object per line, or as server-sent events with the sequence number as
+    the event ID.
+
+    Event types:
+        queue: position while the request waits for a worker; 0 with status "started" once it runs.
+        token: a batch of model text.
+        tool_started: a tool call began.
+        tool_progress: a tool call is still running, with seconds elapsed.
+        tool_result: a tool call finished. Results larger than result_limit bytes
+            are sent as a truncated JSON string with truncated set.
+        usage: token counts and timings of the interaction.
+        error: the interaction failed.
+        done: the last event.
+
+    While nothing happens the server sends heartbeat() keepalives, blank lines or
+    SSE comments, which clients skip.
+
+    Frames must be built by a single consumer, usually the response generator.
+    """
+
+    def __init__(self, format: str = "ndjson", result_limit: int = TOOL_RESULT_EVENT_LIMIT):
+        """Initialize the stream.
+
+        Args:
+            format: "ndjson" or "sse".
+            result_limit: Maximum bytes of serialized tool result per tool_result event.
+        """
+        if format not in EVENT_FORMATS:
+            raise ValueError(f"Unknown event format: {format}")
+        self.format = format
+        self.content_type = EVENT_FORMATS[format]
+        self.result_limit = result_limit
+        self.seq = 0
+        self._running: Dict[str, Dict[str, Any]] = {}
+
+    def frame(self, event: Dict[str, Any]) -> str:
+        """Number and serialize an event.
+
+        Args:
+            event: The event, with at least a type.
+
+        Returns:
+            str: The framed event.
+        """
+        event = self._track(dict(event))
+        event = {"seq": self.seq, **event}
+        self.seq += 1
+        data = json.dumps(event, default=str)
+        if self.format == "sse":
+            return f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
+        return data + "\n"
+
+    def progress(self) -> List[str]:
+        """Frame a tool_progress event for every tool call still running.
+
+        Returns:
+            list: The framed events.
+        """
+        now = time.monotonic()
+        return [
+            self.frame({
+                "type": "tool_progress",
+                "tool_name": call["tool_name"],
+                "tool_call_id": call["tool_call_id"],
+                "elapsed": round(now - call["started"], 3)
+            })
+            for call in list(self._running.values())
+        ]
+
+    def heartbeat(self) -> str:
+        """Frame a keepalive that clients skip: a blank line, or an SSE comment.
+
+        Returns:
+            str: The keepalive. It carries no sequence number.
+        """
+        return ": keepalive\n\n" if self.format == "sse" else "\n"
+
+    def _track(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Record running tool calls and cap tool results."""
+        if event["type"] == "tool_started":
+            key = event.get("tool_call_id") or event["tool_name"]
+            self._running[key] = {**event, "started": time.monotonic()}
+        elif event["type"] == "tool_result":
+            call = self._running.pop(event.get("tool_call_id") or event["tool_name"], None)
+            if call is not None:
+                event["duration"] = round(time.monotonic() - call["started"], 3)
+            serialized = json.dumps(event.get("result"), default=str)
+            event["size"] = len(serialized)
+            event["truncated"] = len(serialized) > self.result_limit
+            if event["truncated"]:
+                event["result"] = serialized[:self.result_limit]
+        return event
+
+
+class PlainTextStream:
+    """Renders events as the original text/plain stream.
+
+    Model text is sent as is and queue notices as JSON strings. Tool results are
+    held back and appended as "Tool Results from ..." text at the end. Used for
+    clients that do not ask for typed events.
+    """
+
+    content_type = "text/plain"
+
+    def __init__(self):
+        self._tool_results: List[Dict[str, Any]] = []
+
+    def frame(self, event: Dict[str, Any]) -> str:
+        """Render an event.
+
+        Args:
+            event: The event, with at least a type.
+
+        Returns:
+            str: The text to send, possibly empty.
+        """
+        if event["type"] == "token":
+            return event["text"]
+        if event["type"] == "queue":
+            return json.dumps(event)
+        if event["type"] == "tool_result":
+            self._tool_results.append({"tool_name": event["tool_name"], "result": event.get("result")})
+        elif event["type"] == "done":
+            return format_tool_results(self._tool_results)
+        return ""
+
+    def progress(self) -> List[str]:
+        """The plain text stream has no progress events.
+
+        Returns:
+            list: Always empty.
+        """
+        return []
+
+    def heartbeat(self) -> str:
+        """The plain text stream has no keepalive; any byte would end up in the response.
+
+        Returns:
+            str: Always empty.
+        """
+        return ""
+
+
+def event_stream(data: Dict[str, Any], accept: Optional[str] = None):
+    """Create the renderer for a streaming request.
+
+    Args:
+        data: The request JSON.
+        accept: The request's Accept header.
+
+    Returns:
+        EventStream or PlainTextStream: The renderer the request asked for.
+    """
+    format = stream_format(data, accept)
+    return EventStream(format) if format else PlainTextStream()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: failover.py
+# Author: Wadih Khairallah
+# Description: Provider failover and hedged chat completion requests
+#              raced on time-to-first-token
+# Created: 2025-04-20 16:52:07
+# Modified: 2025-04-20 16:52:07
+
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+try:
+    from .cancellation import ClosableStream
+except ImportError:
+    from cancellation import ClosableStream
+
+# One attempt: (target key, create callable, chat completion parameters)
+Attempt = Tuple[str, Callable[..., Any], Dict[str, Any]]
+
+
+def _close(response: Any):
+    """Close a losing response so its connection goes back to the pool."""
+    close = getattr(response, "close", None)
+    if close is None:
+        return
+    try:
+        close()
+    except Exception:
+        pass
+
+
+async def _aclose(response: Any):
+    """Close a losing async response so its connection goes back to the pool."""
+    close = getattr(response, "close", None)
+    if close is None:
+        return
+    try:
+        result = close()
+        if asyncio.iscoroutine(result):
+            await result
+    except Exception:
+        pass
+
+
+class FailoverPolicy:
+    """Sends a chat completion to an ordered list of targets until one delivers.
+
+    The first target is the Interactor's current model. If it fails before
+    delivering anything, the next target is tried at once. With hedging enabled,
+    the next target is also started when the running attempt has not produced its
+    first token within the configured percentile of that target's observed
+    time-to-first-token. Whichever attempt delivers first wins; every other
+    attempt is cancelled and its response closed.
+
+    Failover only covers the start of a response. An error after the first token
+    is reported as usual, since part of the answer has already been streamed.
+    """
+
+    def __init__(
+        self,
+        fallbacks: List[Union[str, Dict[str, Any]]],
+        hedge_percentile: Optional[float] = None,
+        hedge_after: Optional[float] = None,
+        min_samples: int = 20,
+        max_samples: int = 200,
+        max_workers: int = 8
+    ):
+        """Initialize the policy.
+
+        Args:
+            fallbacks: Backup targets in order of preference. Each is a "provider:model"
+                string or a dict with 'model' and optional 'base_url' and 'api_key'.
+            hedge_percentile: Percentile (0-100) of a target's time-to-first-token after which
+                the next target is started in parallel. None disables percentile hedging.
+            hedge_after: Seconds to wait before hedging while fewer than min_samples
+                are recorded for a target. None waits for enough samples.
+            min_samples: Samples needed before the percentile is trusted.
+            max_samples: Number of recent samples kept per target.
+            max_workers: Maximum number of attempts running at once across all requests.
+
+        Raises:
+            ValueError: If hedge_percentile is outside 0-100 or a target is malformed.
+        """
+        if hedge_percentile is not None and not 0 < hedge_percentile <= 100:
+            raise ValueError("hedge_percentile must be between 0 and 100")
+        self.fallbacks = [self._target(target) for target in fallbacks]
+        self.hedge_percentile = hedge_percentile
+        self.hedge_after = hedge_after
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="failover")
+
+    @staticmethod
+    def _target(target: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(target, str):
+            target = {"model": target}
+        if ":" not in target.get("model", ""):
+            raise ValueError(f"Fallback target must name a 'provider:model', got: {target}")
+        return {"model": target["model"], "base_url": target.get("base_url"), "api_key": target.get("api_key")}
+
+    def record_ttft(self, key: str, seconds: float):
+        """Record an observed time-to-first-token for a target.
+
+        Args:
+            key: Target key, "provider:model".
+            seconds: Seconds from sending the request to the first chunk.
+        """
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.max_samples)
+            samples.append(seconds)
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """Get how long to wait on a target before hedging to the next one.
+
+        Args:
+            key: Target key, "provider:model".
+
+        Returns:
+            float: Seconds to wait, or None if the target should not be hedged.
+        """
+        if self.hedge_percentile is None and self.hedge_after is None:
+            return None
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if self.hedge_percentile is None or len(samples) < self.min_samples:
+            return self.hedge_after
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return samples[index]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get time-to-first-token statistics per target.
+
+        Returns:
+            dict: Sample count, median and hedge delay keyed by target.
+        """
+        with self._lock:
+            keys = list(self._samples)
+            snapshot = {key: sorted(self._samples[key]) for key in keys}
+        return {
+            key: {
+                "samples": len(samples),
+                "median_ttft": samples[len(samples) // 2] if samples else None,
+                "hedge_delay": self.hedge_delay(key)
+            }
+            for key, samples in snapshot.items()
+        }
+
+    def _wait_time(self, key: str, launched_at: float) -> Optional[float]:
+        delay = self.hedge_delay(key)
+        if delay is None:
+            return None
+        return max(0.0, launched_at + delay - time.monotonic())
+
+    def run(self, attempts: List[Attempt], stream: bool) -> Tuple[int, Any]:
+        """Race attempts in order until one delivers.
+
+        Args:
+            attempts: (target key, create callable, parameters) in order of preference.
+            stream: Whether the parameters request a streaming response.
+
+        Returns:
+            tuple: (index of the winning attempt, response). A streaming response is
+            an iterator over every chunk, including the one that decided the race,
+            whose close() closes the winner's provider stream.
+
+        Raises:
+            Exception: The primary target's error if every attempt failed.
+        """
+        results: "queue.Queue[tuple]" = queue.Queue()
+        state = {"winner": None, "open": {}}
+        lock = threading.Lock()
+
+        def attempt(index: int, started: float):
+            key, create, params = attempts[index]
+            try:
+                response = create(**params)
+                with lock:
+                    lost = state["winner"] is not None
+                    if not lost:
+                        state["open"][index] = response
+                if lost:
+                    _close(response)
+                    return
+                if stream:
+                    chunks = iter(response)
+                    first = next(chunks, None)
+                else:
+                    chunks, first = None, response
+            except Exception as e:
+                results.put((index, None, e))
+                return
+            self.record_ttft(key, time.monotonic() - started)
+
+            with lock:
+                won = state["winner"] is None
+                if won:
+                    state["winner"] = index
+                    # Attempts still waiting for their first chunk have lost too.
+                    losers = [other for i, other in state["open"].items() if i != index]
+            if won:
+                for loser in losers:
+                    _close(loser)
+                results.put((index, (response, chunks, first), None))
+            else:
+                _close(response)
+
+        launched = []
+        errors: Dict[int, Exception] = {}
+
+        def launch():
+            started = time.monotonic()
+            launched.append(started)
+            self._executor.submit(attempt, len(launched) - 1, started)
+
+        launch()
+        while True:
+            timeout = None
+            if len(launched) < len(attempts):
+                timeout = self._wait_time(attempts[len(launched) - 1][0], launched[-1])
+            try:
+                index, outcome, error = results.get(timeout=timeout)
+            except queue.Empty:
+                launch()
+                continue
+
+            if error is None:
+                break
+            errors[index] = error
+            if len(launched) < len(attempts):
+                launch()
+            elif len(errors) == len(launched):
+                raise errors[min(errors)]
+
+        response, chunks, first = outcome
+        if not stream:
+            return index, response
+
+        def replay():
+            if first is not None:
+                yield first
+            yield from chunks
+
+        return index, ClosableStream(replay(), response)
+
+    async def arun(self, attempts: List[Attempt], stream: bool) -> Tuple[int, Any]:
+        """Race attempts in order until one delivers, on the running event loop.
+
+        Args:
+            attempts: (target key, coroutine function, parameters) in order of preference.
+            stream: Whether the parameters request a streaming response.
+
+        Returns:
+            tuple: (index of the winning attempt, response). A streaming response is
+            an async iterator over every chunk, including the one that decided the race.
+
+        Raises:
+            Exception: The primary target's error if every attempt failed.
+        """
+        async def attempt(index: int):
+            key, create, params = attempts[index]
+            started = time.monotonic()
+            response = await create(**params)
+            if stream:
+                chunks = response.__aiter__()
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    first = None
+            else:
+                chunks, first = None, response
+            self.record_ttft(key, time.monotonic() - started)
+            return response, chunks, first
+
+        tasks: Dict[asyncio.Task, int] = {}
+        launched = []
+        errors: Dict[int, Exception] = {}
+
+        def launch():
+            launched.append(time.monotonic())
+            tasks[asyncio.ensure_future(attempt(len(launched) - 1))] = len(launched) - 1
+
+        launch()
+        winner = None
+        try:
+            while winner is None:
+                timeout = None
+                if len(launched) < len(attempts):
+                    timeout = self._wait_time(attempts[len(launched) - 1][0], launched[-1])
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+
+                for task in done:
+                    index = tasks.pop(task)
+                    if task.exception() is None:
+                        if winner is None:
+                            winner = (index, task.result())
+                        else:
+                            await _aclose(task.result()[0])
+                        continue
+                    errors[index] = task.exception()
+                    if len(launched) < len(attempts):
+                        launch()
+
+                if winner is None and not tasks and len(launched) == len(attempts):
+                    raise errors[min(errors)]
+        finally:
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    await _aclose(task.result()[0])
+                else:
+                    task.cancel()
+
+        index, (response, chunks, first) = winner
+        if not stream:
+            return index, response
+
+        async def replay():
+            if first is not None:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+
+        return index, replay()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: gunicorn_conf.py
+# Author: Wadih Khairallah
+# Description: Production server config running the API in several
+#              worker processes that share their sessions
+# Created: 2025-04-28 13:37:05
+# Modified: 2025-04-28 13:37:05
+
+import multiprocessing
+import os
+
+# Sessions live in the shared SQLite store, so any worker can serve any session.
+# Set before the app is imported, which preload_app does in the master process.
+os.environ.setdefault("PATHFINDER_SHARED_SESSIONS", "1")
+
+bind = os.getenv("PATHFINDER_BIND", "127.0.0.1:5000")
+
+# One process per core by default. Each worker runs its own generation scheduler
+# and keeps its own in-memory sessions in front of the shared store.
+workers = int(os.getenv("PATHFINDER_WORKERS", multiprocessing.cpu_count()))
+
+# gthread serves the Flask app (pathfinder.backend.api:app) with a thread per
+# connection; a streaming response holds its thread until it ends. Use
+# uvicorn.workers.UvicornWorker for the ASGI app (pathfinder.backend.asgi:app).
+worker_class = os.getenv("PATHFINDER_WORKER_CLASS", "gthread")
+threads = int(os.getenv("PATHFINDER_THREADS", 32))
+
+# Import the app and load tokenizers once in the master; forked workers share them.
+preload_app = True
+
+# Seconds a worker may go silent before it is restarted. Workers report in while
+# requests run, so long streams are not cut off.
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    """Load shared resources in the master, after the app import and before the first fork."""
+    from pathfinder.backend import api
+    api.preload()
+    server.log.info(
+        "PathFinder: %s workers, shared sessions in %s",
+        server.num_workers,
+        os.getenv("PATHFINDER_SESSION_DB", "data/sessions.db")
+    )
+
+
+# ----------------------------------------------------------------------
+# Running the production server
+# ----------------------------------------------------------------------
+
+# pip install gunicorn
+# gunicorn -c python:pathfinder.backend.gunicorn_conf pathfinder.backend.api:app
+
+# ASGI app with uvicorn workers
+# pip install gunicorn uvicorn starlette a2wsgi
+# PATHFINDER_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c python:pathfinder.backend.gunicorn_conf pathfinder.backend.asgi:app
+
+# Measure throughput at 1, 2, 4 and 8 workers, with requests spread over 16 shared sessions
+# python -m pathfinder.backend.loadtest http://127.0.0.1:5001 --workers 1 2 4 8 --sessions 16 \
+#     --spawn "gunicorn -c python:pathfinder.backend.gunicorn_conf -w {workers} -b 127.0.0.1:5001 pathfinder.backend.api:app"
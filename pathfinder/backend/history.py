@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: history.py
+# Author: Wadih Khairallah
+# Description: Conversation history buffer with a pinned system
+#              message, token prefix sums and tool-group-aware
+#              eviction from the oldest end
+# Created: 2025-04-18 10:02:11
+# Modified: 2025-04-18 10:02:11
+
+from bisect import bisect_left
+from typing import Dict, Any, Optional, List, Callable, Iterator
+
+
+class MessageHistory:
+    """Ordered chat history used by the Interactor.
+
+    The system message is pinned outside the buffer. All other messages live in
+    an append-only list with a moving head index, so evicting from the oldest end
+    is O(1) amortized. A running prefix sum of token counts lets evict() find the
+    cut point for a token budget with a single bisect, and the cut is widened so an
+    assistant tool_calls message is never separated from its tool results.
+    """
+
+    # Compact the backing lists once this many evicted entries pile up at the head.
+    COMPACT_THRESHOLD = 256
+
+    def __init__(self):
+        self._system: Optional[Dict[str, Any]] = None
+        self._system_tokens = 0
+        self._messages: List[Dict[str, Any]] = []
+        self._tokens: List[int] = []
+        self._prefix: List[int] = []
+        self._head = 0
+        self._evicted = 0
+
+    def __len__(self) -> int:
+        return (1 if self._system else 0) + len(self._messages) - self._head
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self._system:
+            yield self._system
+        for i in range(self._head, len(self._messages)):
+            yield self._messages[i]
+
+    def __getitem__(self, index):
+        return self.copy()[index]
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    @property
+    def system(self) -> Optional[Dict[str, Any]]:
+        """The pinned system message, if any."""
+        return self._system
+
+    @property
+    def total_tokens(self) -> int:
+        """Token count of the system message plus every live message."""
+        return self._system_tokens + self._live_tokens()
+
+    def _evicted_tokens(self) -> int:
+        return self._evicted
+
+    def _live_tokens(self) -> int:
+        return (self._prefix[-1] if self._prefix else 0) - self._evicted_tokens()
+
+    def copy(self) -> List[Dict[str, Any]]:
+        """Return the history as a plain list, system message first.
+
+        Returns:
+            list: Shallow copy of the messages in send order.
+        """
+        messages = [self._system] if self._system else []
+        messages.extend(self._messages[self._head:])
+        return messages
+
+    def clone(self) -> "MessageHistory":
+        """Return an independent history with the same messages and token counts.
+
+        Message dicts are shared; appending to or evicting from either history
+        does not affect the other.
+
+        Returns:
+            MessageHistory: The copy.
+        """
+        other = MessageHistory()
+        other._system = self._system
+        other._system_tokens = self._system_tokens
+        other._messages = self._messages[self._head:]
+        other._tokens = self._tokens[self._head:]
+        other._prefix = [value - self._evicted for value in self._prefix[self._head:]]
+        return other
+
+    def token_counts(self) -> List[int]:
+        """Return the per-message token counts in the same order as copy().
+
+        Returns:
+            list: Token count for each message.
+        """
+        counts = [self._system_tokens] if self._system else []
+        counts.extend(self._tokens[self._head:])
+        return counts
+
+    def set_system(self, message: Dict[str, Any], tokens: int):
+        """Replace the pinned system message.
+
+        Args:
+            message: The system message dictionary.
+            tokens: Token count of the message.
+        """
+        self._system = message
+        self._system_tokens = tokens
+
+    def append(self, message: Dict[str, Any], tokens: int):
+        """Append a message at the newest end.
+
+        Args:
+            message: The message dictionary.
+            tokens: Token count of the message.
+        """
+        self._messages.append(message)
+        self._tokens.append(tokens)
+        self._prefix.append((self._prefix[-1] if self._prefix else 0) + tokens)
+
+    def clear(self):
+        """Drop every message except the pinned system message."""
+        self._messages = []
+        self._tokens = []
+        self._prefix = []
+        self._head = 0
+        self._evicted = 0
+
+    def recount(self, counter: Callable[[Dict[str, Any]], int]):
+        """Recount every message with a new token counter.
+
+        Args:
+            counter: Callable returning the token count of a message.
+        """
+        if self._system:
+            self._system_tokens = counter(self._system)
+        messages = self._messages[self._head:]
+        self.clear()
+        for message in messages:
+            self.append(message, counter(message))
+
+    def _group_end(self, index: int) -> int:
+        """Extend a cut index so it ends on a tool-group boundary."""
+        while index + 1 < len(self._messages) and self._messages[index + 1].get("role") == "tool":
+            index += 1
+        return index
+
+    def plan_eviction(self, excess: int) -> int:
+        """Count the oldest messages that must go to free at least `excess` tokens.
+
+        The count always ends on a tool-group boundary.
+
+        Args:
+            excess: Number of tokens that must be released.
+
+        Returns:
+            int: Number of live non-system messages, counted from the oldest.
+        """
+        if excess <= 0 or self._head >= len(self._messages):
+            return 0
+
+        cut = bisect_left(self._prefix, self._evicted + excess, lo=self._head)
+        cut = self._group_end(min(cut, len(self._messages) - 1))
+        return cut + 1 - self._head
+
+    def oldest(self, count: int) -> List[Dict[str, Any]]:
+        """Return the oldest live non-system messages.
+
+        Args:
+            count: Number of messages to return.
+
+        Returns:
+            list: Up to `count` messages, oldest first.
+        """
+        return self._messages[self._head:self._head + count]
+
+    def evict(self, excess: int) -> List[Dict[str, Any]]:
+        """Evict the oldest messages until at least `excess` tokens are freed.
+
+        An assistant message carrying tool_calls and the tool messages answering it
+        are removed together, so the remaining history never holds orphaned tool results.
+
+        Args:
+            excess: Number of tokens that must be released.
+
+        Returns:
+            list: The evicted messages, oldest first.
+        """
+        count = self.plan_eviction(excess)
+        if not count:
+            return []
+
+        evicted = self.oldest(count)
+        self._head += count
+        self._evicted = self._prefix[self._head - 1]
+        self._compact()
+        return evicted
+
+    def replace_oldest(self, count: int, messages: List[Dict[str, Any]], tokens: List[int]) -> List[Dict[str, Any]]:
+        """Replace the oldest messages with fewer messages, such as a summary.
+
+        Args:
+            count: Number of oldest live messages to replace.
+            messages: The replacement messages, no more than count.
+            tokens: Token count of each replacement message.
+
+        Returns:
+            list: The replaced messages, oldest first.
+
+        Raises:
+            ValueError: If there are more replacement messages than replaced ones.
+        """
+        count = min(count, len(self._messages) - self._head)
+        if count <= 0:
+            return []
+        if len(messages) > count:
+            raise ValueError("More replacement messages than replaced messages")
+
+        replaced = self.oldest(count)
+        last = self._head + count - 1
+        first = last - len(messages) + 1
+        # The replacements take the slots of the last replaced messages; the prefix
+        # value of the last slot is unchanged, so only the evicted offset absorbs
+        # the difference and later prefix sums stay valid.
+        self._evicted = self._prefix[last] - sum(tokens)
+        total = self._evicted
+        for index, (message, message_tokens) in enumerate(zip(messages, tokens), start=first):
+            total += message_tokens
+            self._messages[index] = message
+            self._tokens[index] = message_tokens
+            self._prefix[index] = total
+        self._head = first
+        self._compact()
+        return replaced
+
+    def _compact(self):
+        """Release evicted entries once they dominate the backing lists."""
+        if self._head < self.COMPACT_THRESHOLD or self._head * 2 < len(self._messages):
+            return
+        offset = self._evicted
+        self._messages = self._messages[self._head:]
+        self._tokens = self._tokens[self._head:]
+        self._prefix = [value - offset for value in self._prefix[self._head:]]
+        self._head = 0
+        self._evicted = 0
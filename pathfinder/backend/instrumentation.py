@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: instrumentation.py
+# Author: Wadih Khairallah
+# Description: Timing and token statistics for Interactor.interact
+#              with a listener API for live consumers
+# Created: 2025-04-21 10:07:44
+# Modified: 2025-04-21 10:07:44
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from rich.console import Console
+
+console = Console()
+log = console.log
+
+
+class InteractionListener:
+    """Receives timing events from an Interactor.
+
+    Subclass and override the events you need; every method is a no-op by
+    default. on_tool_call may be called from tool worker threads. Exceptions
+    raised by a listener are logged and never interrupt the interaction.
+    """
+
+    def on_interaction_start(self, stats: "InteractionStats"):
+        """Called once the user message is accepted, before the first request."""
+
+    def on_request_sent(self, stats: "InteractionStats", request: "RequestStats"):
+        """Called when the provider accepted a chat completion request."""
+
+    def on_first_token(self, stats: "InteractionStats", request: "RequestStats"):
+        """Called when the first content or tool-call chunk of a request arrives."""
+
+    def on_request_end(self, stats: "InteractionStats", request: "RequestStats"):
+        """Called when a chat completion request finished or failed."""
+
+    def on_tool_call(self, stats: "InteractionStats", tool_call: "ToolCallStats"):
+        """Called when a tool call finished or failed."""
+
+    def on_interaction_end(self, stats: "InteractionStats"):
+        """Called when interact() is about to return."""
+
+
+class RequestStats:
+    """Timings and token counts of one chat completion request in the tool loop."""
+
+    def __init__(self, iteration: int, prompt_tokens: int):
+        self.iteration = iteration
+        self.target: Optional[str] = None
+        self.started = time.monotonic()
+        self.send_time: Optional[float] = None
+        self.ttft: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = 0
+        self.usage_reported = False
+        self.error: Optional[str] = None
+        self._first_token_at: Optional[float] = None
+        self._ended_at: Optional[float] = None
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Completion tokens per second, measured from the first token to the end of the response."""
+        if self._first_token_at is None or self._ended_at is None or not self.completion_tokens:
+            return None
+        elapsed = self._ended_at - self._first_token_at
+        return self.completion_tokens / elapsed if elapsed > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the request statistics.
+
+        Returns:
+            dict: Times in seconds and token counts. Token counts are estimates
+            unless usage_reported is True.
+        """
+        return {
+            "iteration": self.iteration,
+            "target": self.target,
+            "send_time": self.send_time,
+            "ttft": self.ttft,
+            "duration": self.duration,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "usage_reported": self.usage_reported,
+            "tokens_per_second": self.tokens_per_second,
+            "error": self.error
+        }
+
+
+class ToolCallStats:
+    """Duration and outcome of one tool call."""
+
+    def __init__(self, name: str, iteration: int, duration: float, error: Optional[str] = None):
+        self.name = name
+        self.iteration = iteration
+        self.duration = duration
+        self.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the tool call statistics.
+
+        Returns:
+            dict: Tool name, iteration, duration in seconds and error, if any.
+        """
+        return {"name": self.name, "iteration": self.iteration, "duration": self.duration, "error": self.error}
+
+
+class InteractionStats:
+    """Statistics of one Interactor.interact() call.
+
+    Collects a RequestStats per request of the tool loop and a ToolCallStats per
+    tool call, and forwards every event to the registered listeners.
+    """
+
+    def __init__(self, model: str, listeners: Optional[List[InteractionListener]] = None):
+        """Start collecting statistics.
+
+        Args:
+            model: The model the interaction started on, "provider:model".
+            listeners: Listeners notified of every event.
+        """
+        self.model = model
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        self.requests: List[RequestStats] = []
+        self.tool_calls: List[ToolCallStats] = []
+        self.error: Optional[str] = None
+        self._started = time.monotonic()
+        self._listeners = list(listeners or [])
+        self._lock = threading.Lock()
+        self._emit("on_interaction_start", self)
+
+    @property
+    def iterations(self) -> int:
+        """Number of chat completion requests made by the tool loop."""
+        return len(self.requests)
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from the start of the interaction to its first streamed token."""
+        for request in self.requests:
+            if request._first_token_at is not None:
+                return request._first_token_at - self._started
+        return None
+
+    @property
+    def prompt_tokens(self) -> int:
+        """Prompt tokens summed over every request."""
+        return sum(request.prompt_tokens for request in self.requests)
+
+    @property
+    def completion_tokens(self) -> int:
+        """Completion tokens summed over every request."""
+        return sum(request.completion_tokens for request in self.requests)
+
+    @property
+    def tool_time(self) -> float:
+        """Seconds spent in tool calls, summed over calls that may have overlapped."""
+        return sum(tool_call.duration for tool_call in self.tool_calls)
+
+    def request_started(self, prompt_tokens: int) -> RequestStats:
+        """Start timing a request of the tool loop.
+
+        Args:
+            prompt_tokens: Estimated prompt size, replaced by provider usage when reported.
+
+        Returns:
+            RequestStats: The new request record.
+        """
+        request = RequestStats(len(self.requests) + 1, prompt_tokens)
+        self.requests.append(request)
+        return request
+
+    def request_sent(self, request: RequestStats, target: Optional[str]):
+        """Record that the provider accepted a request.
+
+        Args:
+            request: The request record.
+            target: The "provider:model" that served it.
+        """
+        request.target = target
+        request.send_time = time.monotonic() - request.started
+        self._emit("on_request_sent", self, request)
+
+    def first_token(self, request: RequestStats):
+        """Record the first content or tool-call chunk of a request. Later calls are ignored.
+
+        Args:
+            request: The request record.
+        """
+        if request._first_token_at is not None:
+            return
+        request._first_token_at = time.monotonic()
+        request.ttft = request._first_token_at - request.started
+        self._emit("on_first_token", self, request)
+
+    def usage(self, request: RequestStats, usage: Any):
+        """Record token usage reported by the provider.
+
+        Args:
+            request: The request record.
+            usage: The response's usage object. Ignored if None.
+        """
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if prompt_tokens is not None:
+            request.prompt_tokens = prompt_tokens
+        if completion_tokens is not None:
+            request.completion_tokens = completion_tokens
+        request.usage_reported = True
+
+    def request_ended(self, request: RequestStats, completion_tokens: int = 0, error: Optional[str] = None):
+        """Finish timing a request.
+
+        Args:
+            request: The request record.
+            completion_tokens: Estimated completion size, used if the provider reported no usage.
+            error: Error message if the request failed.
+        """
+        request._ended_at = time.monotonic()
+        request.duration = request._ended_at - request.started
+        if not request.usage_reported:
+            request.completion_tokens = completion_tokens
+        request.error = error
+        self._emit("on_request_end", self, request)
+
+    def tool_called(self, name: str, duration: float, error: Optional[str] = None):
+        """Record a finished tool call.
+
+        Args:
+            name: Tool name.
+            duration: Seconds the call took.
+            error: Error message if the call raised.
+        """
+        tool_call = ToolCallStats(name, len(self.requests), duration, error)
+        with self._lock:
+            self.tool_calls.append(tool_call)
+        self._emit("on_tool_call", self, tool_call)
+
+    def failed(self, error: str):
+        """Record the error that ended the interaction early.
+
+        Covers failures after the last request finished, such as a tool that
+        raised, which the request statistics alone do not show.
+
+        Args:
+            error: Error message.
+        """
+        if self.error is None:
+            self.error = error
+
+    def finish(self):
+        """Stop the clock and notify listeners that the interaction ended."""
+        self.duration = time.monotonic() - self._started
+        self._emit("on_interaction_end", self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the interaction statistics.
+
+        Returns:
+            dict: Totals plus one entry per request and per tool call.
+        """
+        return {
+            "model": self.model,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "ttft": self.ttft,
+            "iterations": self.iterations,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tool_time": self.tool_time,
+            "error": self.error,
+            "requests": [request.to_dict() for request in self.requests],
+            "tool_calls": [tool_call.to_dict() for tool_call in self.tool_calls]
+        }
+
+    def _emit(self, event: str, *args):
+        for listener in self._listeners:
+            try:
+                getattr(listener, event)(*args)
+            except Exception as e:
+                log(f"[yellow]Interaction listener {type(listener).__name__}.{event} failed:[/yellow] {e}")
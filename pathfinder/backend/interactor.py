@@ -11,12 +11,16 @@
 
 import os
 import re
+import sys
 import openai
 import json
 import subprocess
 import inspect
 import argparse
-import tiktoken
+import time
+import uuid
+import copy
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from rich import print
 from rich.prompt import Confirm
 from rich.console import Console
@@ -26,9 +30,55 @@ from rich.syntax import Syntax
 from rich.rule import Rule
 from typing import Dict, Any, Optional, List, Callable
 
+try:
+    from .history import MessageHistory
+    from .probe_cache import ToolSupportCache, get_tool_support_cache, rejects_tools
+    from . import token_registry
+    from .tool_cache import ToolResultCache
+    from .coalesce import CoalescingCallback
+    from . import clients
+    from .model_catalog import get_model_catalog
+    from .compaction import HistoryCompactor
+    from .result_shaping import ResultShaper
+    from .failover import FailoverPolicy
+    from .instrumentation import InteractionListener, InteractionStats
+    from .response_cache import ResponseCache
+    from .tool_selection import ToolSelector
+    from .cancellation import Cancelled, CancelToken, cancel_scope
+except ImportError:
+    from history import MessageHistory
+    from probe_cache import ToolSupportCache, get_tool_support_cache, rejects_tools
+    import token_registry
+    from tool_cache import ToolResultCache
+    from coalesce import CoalescingCallback
+    import clients
+    from model_catalog import get_model_catalog
+    from compaction import HistoryCompactor
+    from result_shaping import ResultShaper
+    from failover import FailoverPolicy
+    from instrumentation import InteractionListener, InteractionStats
+    from response_cache import ResponseCache
+    from tool_selection import ToolSelector
+    from cancellation import Cancelled, CancelToken, cancel_scope
+
 console = Console()
 log = console.log
 
+
+class ToolNotification(str):
+    """A tool call notification sent to an output callback.
+
+    It is the notification's JSON text, so callbacks that print or forward tokens
+    keep working, and carries the parsed notification in `data` so consumers can
+    tell it apart from model text without parsing.
+    """
+
+    def __new__(cls, data: Dict[str, Any]):
+        notification = super().__new__(cls, json.dumps(data))
+        notification.data = data
+        return notification
+
+
 class Interactor:
     def __init__(
         self,
@@ -38,6 +88,18 @@ class Interactor:
         tools: Optional[bool] = True,
         stream: bool = True,
         context_length: int = 128000,
+        tool_support_cache: Optional[ToolSupportCache] = None,
+        max_tool_workers: int = 4,
+        tool_cache: Optional[ToolResultCache] = None,
+        coalesce_window: float = 0.0,
+        coalesce_bytes: int = 512,
+        compactor: Optional[HistoryCompactor] = None,
+        conversation_id: Optional[str] = None,
+        result_shaper: Optional[ResultShaper] = None,
+        failover: Optional[FailoverPolicy] = None,
+        stream_usage: Optional[bool] = None,
+        response_cache: Optional[ResponseCache] = None,
+        tool_selector: Optional[ToolSelector] = None,
     ):
         """Initialize the universal AI interaction client.
         
@@ -48,15 +110,63 @@ class Interactor:
             tools: Enable (True) or disable (False) tool calling; None for auto-detection based on model support.
             stream: Enable (True) or disable (False) streaming responses.
             context_length: Maximum number of tokens to maintain in conversation history.
+            tool_support_cache: Optional cache for tool-support probe results. If None, uses the
+                shared on-disk cache so warm starts and model switches skip the probe request.
+            max_tool_workers: Maximum number of tool calls from a single turn that run concurrently.
+            tool_cache: Optional cache for tool results. Share one instance between interactors to
+                reuse results and coalesce identical calls across conversations. Disabled if None.
+            coalesce_window: Seconds to batch streamed tokens before passing them to output_callback.
+                0 sends every token as it arrives.
+            coalesce_bytes: Send a batch early once it reaches this many bytes.
+            compactor: Optional history compactor. When set, old turns are summarized in the
+                background once the history passes its high-water mark, and every message
+                removed from the history is archived on disk. If None, old messages are dropped.
+            conversation_id: Identifier under which removed messages are archived. Generated if None.
+            result_shaper: Optional shaper that fits tool results into per-tool token budgets
+                before they enter the history. Registers the read_tool_result tool so the model
+                can read the rest of a truncated result. If None, results are stored whole.
+            failover: Optional policy with fallback models and hedging. Requests that fail
+                or stall before their first token are retried or raced on the fallbacks.
+            stream_usage: Ask the provider to report token usage at the end of streamed responses.
+                None enables it for OpenAI only, since other providers may reject the option.
+            response_cache: Optional cache of chat completion responses keyed on the endpoint, model,
+                messages, tool schemas and sampling parameters. Cached streams are replayed chunk by
+                chunk through output_callback. Disabled if None.
+            tool_selector: Optional selector that sends only the tools relevant to each turn,
+                plus every tool already used in the conversation. If None, all tools are sent.
         
         Raises:
             ValueError: If provider is not supported or API key is missing for non-Ollama providers.
         """
         self.stream = stream
         self.tools = []
-        self.history = []
+        self.function_sources: Dict[str, Dict[str, Any]] = {}
+        self.history = MessageHistory()
         self.context_length = context_length
         self.encoding = None
+        self._tools_tokens = 0
+        self.tool_support_cache = tool_support_cache or get_tool_support_cache()
+        self.max_tool_workers = max(1, max_tool_workers)
+        self.tool_cache = tool_cache
+        self.coalesce_window = coalesce_window
+        self.coalesce_bytes = coalesce_bytes
+        self._tool_executor = None
+        self.compactor = compactor
+        self.conversation_id = conversation_id or uuid.uuid4().hex
+        self._compaction = None
+        self.result_shaper = result_shaper
+        self._turn_query = ""
+        self.failover = failover
+        self.last_target = None
+        self.stream_usage = stream_usage
+        self.response_cache = response_cache
+        self.tool_selector = tool_selector
+        self.used_tools = set()
+        self._turn_tools = None
+        self._turn_tools_tokens = 0
+        self.listeners: List[InteractionListener] = []
+        self.last_stats: Optional[InteractionStats] = None
+        self._stats: Optional[InteractionStats] = None
         self.providers = {
             "openai": {
                 "base_url": "https://api.openai.com/v1",
@@ -93,6 +203,8 @@ class Interactor:
         self._setup_client(model, base_url, api_key)
         self.tools_enabled = self.tools_supported if tools is None else tools and self.tools_supported
         self._setup_encoding()
+        if self.result_shaper:
+            self.add_function(self.result_shaper.read_tool_result, name="read_tool_result")
 
     def _setup_client(
             self,
@@ -121,46 +233,110 @@ class Interactor:
         if not effective_api_key and provider != "ollama":  # Ollama doesn't require a real API key
             raise ValueError(f"API key not provided and not found in environment for {provider.upper()}_API_KEY")
 
-        self.client = openai.OpenAI(base_url=effective_base_url, api_key=effective_api_key)
+        self.client = self._create_client(provider, effective_base_url, effective_api_key)
         self.model = model_name
         self.provider = provider
+        self.base_url = effective_base_url
         self.tools_supported = self._check_tool_support()
-        if not self.tools_supported:
-            pass
+
+    def _create_client(self, provider: str, base_url: str, api_key: str):
+        """Get the provider client used for chat completions.
+        
+        Clients are cached per provider, base URL and API key and share one pooled
+        HTTP transport, so model switches reuse warm connections.
+        
+        Args:
+            provider: Provider name.
+            base_url: Effective base URL for the provider.
+            api_key: Effective API key for the provider.
+            
+        Returns:
+            The OpenAI-compatible client.
+        """
+        return clients.get_client(provider, base_url, api_key)
 
     def _check_tool_support(self) -> bool:
         """Test if the model supports tool calling.
         
-        Performs a test call to the model with a simple tool to determine if it supports tool calling.
+        Returns the cached result for the current provider, base URL and model when one is
+        fresh. Otherwise performs a test call to the model with a simple tool and caches the
+        outcome. Failures that say nothing about tools (network errors, rate limits, server
+        errors, a 400 about the key or another parameter) are not cached.
         
         Returns:
             bool: True if the model supports tool calling, False otherwise.
         """
+        cached = self.tool_support_cache.get(self.provider, self.base_url, self.model)
+        if cached is not None:
+            return cached
+
+        supported = self._probe_tool_support()
+        if supported is not None:
+            self.tool_support_cache.set(self.provider, self.base_url, self.model, supported)
+        return bool(supported)
+
+    def _probe_tool_support(self) -> Optional[bool]:
+        """Send the tool-support probe request to the current model.
+        
+        Returns:
+            bool: Whether the model answered with a tool call, or None if the probe
+            failed for a reason that says nothing about tool support.
+        """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "Use a tool for NY weather."}],
-                stream=False,
-                tools=[{
-                    "type": "function",
-                    "function": {
-                        "name": "test_function",
-                        "description": "Test tool support",
-                        "parameters": {"type": "object", "properties": {"location": {"type": "string"}}, "required": ["location"]}
-                    }
-                }],
-                tool_choice="auto"
-            )
+            response = self.client.chat.completions.create(**self._probe_params())
             message = response.choices[0].message
             return bool(message.tool_calls and len(message.tool_calls) > 0)
+        except openai.BadRequestError as e:
+            # Only a rejection of the tools parameter means the model lacks tool support;
+            # a bad key, parameter or context size is not cached.
+            return False if rejects_tools(e) else None
         except Exception:
-            return False
+            return None
+
+    def _probe_params(self) -> Dict[str, Any]:
+        """Build the chat completion parameters for the tool-support probe.
+        
+        Returns:
+            dict: Keyword arguments for chat.completions.create.
+        """
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": "Use a tool for NY weather."}],
+            "stream": False,
+            "tools": [{
+                "type": "function",
+                "function": {
+                    "name": "test_function",
+                    "description": "Test tool support",
+                    "parameters": {"type": "object", "properties": {"location": {"type": "string"}}, "required": ["location"]}
+                }
+            }],
+            "tool_choice": "auto"
+        }
+
+    def refresh_tool_support(self, all_models: bool = False) -> bool:
+        """Invalidate cached tool-support results and re-probe the current model.
+        
+        Args:
+            all_models: If True, clears the cached results for every model instead
+                of only the current provider, base URL and model.
+                
+        Returns:
+            bool: True if the current model supports tool calling.
+        """
+        if all_models:
+            self.tool_support_cache.invalidate()
+        else:
+            self.tool_support_cache.invalidate(self.provider, self.base_url, self.model)
+        self.tools_supported = self._check_tool_support()
+        return self.tools_supported
 
     def add_function(
         self,
         external_callable,
         name: Optional[str] = None,
-        description: Optional[str] = None
+        description: Optional[str] = None,
+        source: Optional[Dict[str, str]] = None
     ):
         """Register a function for tool calling.
         
@@ -168,12 +344,17 @@ class Interactor:
             external_callable: The function to register for tool calling.
             name: Optional custom name for the function. If None, uses the function's name.
             description: Optional description of the function. If None, extracts from docstring.
+            source: Optional dict with the module_path and function_name the function was
+                loaded from. Functions with a source are kept in export_state(), so a
+                restored session registers them again.
             
         Raises:
             ValueError: If external_callable is None.
             
         Note:
-            This method has no effect if tools are disabled.
+            This method has no effect if tools are disabled. Callables with a tool_schema
+            attribute, such as tools from the lazy tool registry, are registered from that
+            schema without inspecting or importing the function.
         """
         if not self.tools_enabled:
             return
@@ -181,33 +362,78 @@ class Interactor:
             raise ValueError("An external callable is required.")
 
         function_name = name or external_callable.__name__
-        description = description or (inspect.getdoc(external_callable) or "No description provided.").split("\n")[0]
-        
-        signature = inspect.signature(external_callable)
-        properties = {
-            name: {
-                "type": (
-                    "number" if param.annotation in (float, int) else
-                    "string" if param.annotation in (str, inspect.Parameter.empty) else
-                    "boolean" if param.annotation == bool else
-                    "array" if param.annotation == list else
-                    "object"
-                ),
-                "description": f"{name} parameter"
-            } for name, param in signature.parameters.items()
-        }
-        required = [name for name, param in signature.parameters.items() if param.default == inspect.Parameter.empty]
+        schema = getattr(external_callable, "tool_schema", None)
+        if schema:
+            # Precomputed by the lazy tool registry; the tool's module is not imported.
+            description = description or schema["description"]
+            parameters = schema["parameters"]
+        else:
+            description = description or (inspect.getdoc(external_callable) or "No description provided.").split("\n")[0]
+            
+            signature = inspect.signature(external_callable)
+            properties = {
+                name: {
+                    "type": (
+                        "number" if param.annotation in (float, int) else
+                        "string" if param.annotation in (str, inspect.Parameter.empty) else
+                        "boolean" if param.annotation == bool else
+                        "array" if param.annotation == list else
+                        "object"
+                    ),
+                    "description": f"{name} parameter"
+                } for name, param in signature.parameters.items()
+            }
+            required = [name for name, param in signature.parameters.items() if param.default == inspect.Parameter.empty]
+            parameters = {"type": "object", "properties": properties, "required": required}
 
         tool = {
             "type": "function",
             "function": {
                 "name": function_name,
                 "description": description,
-                "parameters": {"type": "object", "properties": properties, "required": required}
+                "parameters": parameters
             }
         }
         self.tools.append(tool)
+        self._tools_tokens += self._schema_tokens(tool)
         setattr(self, function_name, external_callable)
+        if source:
+            self.function_sources[function_name] = {
+                "module_path": source["module_path"],
+                "function_name": source["function_name"],
+                "name": function_name,
+                "description": description
+            }
+
+    def add_function_from_file(
+        self,
+        module_path: str,
+        function_name: str,
+        name: Optional[str] = None,
+        description: Optional[str] = None
+    ):
+        """Import a function from a Python file and register it for tool calling.
+        
+        Args:
+            module_path: Path to the Python module containing the function.
+            function_name: Name of the function in the module.
+            name: Optional custom name for the function.
+            description: Optional description of the function.
+            
+        Raises:
+            AttributeError: If the module has no such function.
+        """
+        import importlib.util
+        spec = importlib.util.spec_from_file_location("module", module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        func = getattr(module, function_name)
+        self.add_function(
+            func,
+            name=name,
+            description=description,
+            source={"module_path": module_path, "function_name": function_name}
+        )
 
     def get_functions(self) -> List[Dict[str, Any]]:
         """Get the list of registered functions for tool calling.
@@ -220,20 +446,51 @@ class Interactor:
     def list(
         self,
         providers: Optional[str | list[str]] = None,
-        filter: Optional[str] = None
+        filter: Optional[str] = None,
+        refresh: bool = False
     ) -> list:
         """Check providers for available models.
 
+        Providers are queried concurrently through the shared model catalog, which
+        caches each provider's list and refreshes stale lists in the background.
+        The filter is applied to the cached lists.
+
         Args:
             providers: If specified, list only models from these providers. Can be a single provider string
                       or a list of provider strings. If None, lists all providers.
             filter: If specified, only include models whose names match this regex pattern (case-insensitive).
+            refresh: If True, bypasses the cache and queries every selected provider.
 
         Returns:
             List of model names matching the criteria.
         """
+        selection = self._select_providers(providers, filter)
+        if selection is None:
+            return []
+        providers_to_list, regex_pattern = selection
+
+        # Fetch and filter models
+        catalog = get_model_catalog().models(providers_to_list, refresh=refresh)
         models = []
+        for provider_name in providers_to_list:
+            models.extend(self._filter_models(provider_name, catalog.get(provider_name, []), regex_pattern))
+
+        return models
 
+    def _select_providers(
+        self,
+        providers: Optional[str | List[str]],
+        filter: Optional[str]
+    ) -> Optional[tuple]:
+        """Normalize the provider selection and model filter used by list().
+        
+        Args:
+            providers: A provider name, a list of provider names, or None for all providers.
+            filter: Optional regex pattern for model names (case-insensitive).
+            
+        Returns:
+            tuple: (providers dict, compiled regex or None), or None if the selection is invalid.
+        """
         # Normalize providers input to a list
         if providers is None:
             providers_to_list = self.providers
@@ -242,12 +499,12 @@ class Interactor:
         elif isinstance(providers, list):
             providers_to_list = {p: self.providers.get(p) for p in providers}
         else:
-            return []
+            return None
 
         # Validate providers
         invalid_providers = [p for p in providers_to_list if p not in self.providers]
         if invalid_providers:
-            return []
+            return None
 
         # Compile regex pattern if filter is provided
         regex_pattern = None
@@ -255,23 +512,27 @@ class Interactor:
             try:
                 regex_pattern = re.compile(filter, re.IGNORECASE)
             except re.error as e:
-                return []
+                return None
 
-        # Fetch and filter models
-        for provider_name, config in providers_to_list.items():
-            try:
-                client = openai.OpenAI(
-                    api_key=config["api_key"],
-                    base_url=config["base_url"]
-                )
-                response = client.models.list()
-                for model_data in response:
-                    model_id = f"{provider_name}:{model_data.id}"
-                    if regex_pattern is None or regex_pattern.search(model_id):
-                        models.append(model_id)
-            except Exception as e:
-                pass
+        return providers_to_list, regex_pattern
 
+    @staticmethod
+    def _filter_models(provider_name: str, model_ids: List[str], regex_pattern) -> List[str]:
+        """Prefix model ids with their provider and apply the optional filter.
+        
+        Args:
+            provider_name: Provider the models belong to.
+            model_ids: Model ids offered by the provider.
+            regex_pattern: Compiled filter pattern, or None to keep every model.
+            
+        Returns:
+            list: Matching "provider:model" identifiers.
+        """
+        models = []
+        for model_name in model_ids:
+            model_id = f"{provider_name}:{model_name}"
+            if regex_pattern is None or regex_pattern.search(model_id):
+                models.append(model_id)
         return models
 
     def interact(
@@ -282,7 +543,9 @@ class Interactor:
         stream: bool = True,
         markdown: bool = False,
         model: Optional[str] = None,
-        output_callback: Optional[Callable[[str], None]] = None  # New parameter for external streaming.
+        output_callback: Optional[Callable[[str], None]] = None,  # New parameter for external streaming.
+        return_stats: bool = False,
+        cancel: Optional[CancelToken] = None
     ) -> Optional[str]:
         """Interact with the AI, handling streaming and multiple tool calls iteratively.
         
@@ -294,95 +557,98 @@ class Interactor:
             markdown: If True, renders responses as markdown in the console.
             model: Optional model to use for this interaction, overriding the current model.
             output_callback: Optional callback to handle each token output (for web streaming, etc.).
+            return_stats: If True, returns (response, InteractionStats) instead of the response alone.
+            cancel: Optional token that stops the interaction from another thread. The provider
+                stream is closed, running tools see the token through cancellation.current_token(),
+                and the response generated so far is kept in history and returned.
             
         Returns:
-            str: The AI's response, or None if user_input is empty.
+            str: The AI's response, or None if user_input is empty or exceeds the context
+            length. The statistics of the interaction are also kept in last_stats, which
+            is None for an interaction that never started.
             
         Note:
             This method handles tool calls automatically if tools are enabled and supported.
         """
+        self.last_stats = None
         if not user_input:
-            return None
-
-        # Check token length of user input
-        if self.encoding:
-            input_tokens = len(self.encoding.encode(user_input))
-            if input_tokens > self.context_length:
-                print(f"[red]User Input exceeds max context length:[/red] {self.context_length}")
-                return
+            return (None, None) if return_stats else None
 
         # Switch model if provided and different from current model.
         if model:
-            provider, model_name = model.split(":", 1)
-            if provider != self.provider or model_name != self.model:
-                self._setup_client(model)
-                self._setup_encoding()  # Update encoding for the new model.
-            self.provider = provider
-            self.model = model_name
-
-        tool_results = ""
-        self.tools_enabled = tools and self.tools_supported
+            self._switch_model(model)
 
-        # Add user message and cycle history to stay within context length.
-        self.history.append({"role": "user", "content": user_input})
-        exceeded_context = self._cycle_messages()
-        if exceeded_context:
-            return
+        if not self._start_turn(user_input, tools):
+            return (None, None) if return_stats else None
 
+        stats = self._begin_stats()
         use_stream = self.stream if stream is None else stream
         content = ""
         live = Live(console=console, refresh_per_second=100) if use_stream and markdown and not quiet else None
+        token_output = (
+            CoalescingCallback(output_callback, self.coalesce_window, self.coalesce_bytes)
+            if output_callback else None
+        )
 
         while True:
-            params = {
-                "model": self.model,
-                "messages": self.history,
-                "stream": use_stream
-            }
-            if self.tools_supported and self.tools_enabled:
-                params["tools"] = self.tools
-                params["tool_choice"] = "auto"
+            params = self._request_params(use_stream)
+            request = stats.request_started(self._prompt_tokens(params))
+            request_text = ""
+            release_stream = None
 
             try:
-                response = self.client.chat.completions.create(**params)
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                response = self._create_completion(params)
+                stats.request_sent(request, self.last_target)
                 tool_calls = []
 
                 if use_stream:
                     if live:
                         live.start()
+                    if cancel is not None:
+                        # Closing the stream unblocks a read that is waiting on the provider.
+                        release_stream = cancel.on_cancel(lambda: self._close_stream(response))
                     tool_calls_dict = {}
                     for chunk in response:
+                        if cancel is not None:
+                            cancel.raise_if_cancelled()
+                        stats.usage(request, getattr(chunk, "usage", None))
+                        if not chunk.choices:
+                            continue
                         delta = chunk.choices[0].delta
-                        finish_reason = chunk.choices[0].finish_reason
+                        if delta.content or delta.tool_calls:
+                            stats.first_token(request)
 
                         if delta.content:
                             content += delta.content
-                            # Stream token to callback if provided.
-                            if output_callback:
-                                output_callback(delta.content)
+                            request_text += delta.content
+                            # Stream token to callback if provided, batched by the coalescer.
+                            if token_output:
+                                token_output(delta.content)
                             elif live:
                                 live.update(Markdown(content))
                             elif not markdown and not quiet:
                                 print(delta.content, end="")
 
                         if delta.tool_calls:
-                            for tool_call_delta in delta.tool_calls:
-                                index = tool_call_delta.index
-                                if index not in tool_calls_dict:
-                                    tool_calls_dict[index] = {"id": None, "function": {"name": "", "arguments": ""}}
-                                if tool_call_delta.id:
-                                    tool_calls_dict[index]["id"] = tool_call_delta.id
-                                if tool_call_delta.function.name:
-                                    tool_calls_dict[index]["function"]["name"] = tool_call_delta.function.name
-                                if tool_call_delta.function.arguments:
-                                    tool_calls_dict[index]["function"]["arguments"] += tool_call_delta.function.arguments
+                            # Tool-call boundary: release buffered text right away.
+                            if token_output:
+                                token_output.flush()
+                            self._merge_tool_call_deltas(tool_calls_dict, delta.tool_calls)
 
                     tool_calls = list(tool_calls_dict.values())
+                    if token_output:
+                        token_output.flush()
                     if live:
                         live.stop()
+                    stats.request_ended(request, self._completion_tokens(request_text, tool_calls))
                 else:
+                    stats.first_token(request)
+                    stats.usage(request, getattr(response, "usage", None))
                     message = response.choices[0].message
                     tool_calls = message.tool_calls or []
+                    stats.request_ended(request, self._completion_tokens(message.content or "", tool_calls))
                     if not tool_calls:
                         content += message.content or "No response."
                         if output_callback:
@@ -395,65 +661,653 @@ class Interactor:
                     break
 
                 # Add assistant message with tool calls.
-                assistant_msg = {
-                    "role": "assistant",
-                    "content": None,
-                    "tool_calls": [{
-                        "id": call["id"] if isinstance(call, dict) else call.id,
-                        "type": "function",
-                        "function": {
-                            "name": call["function"]["name"] if isinstance(call, dict) else call.function.name,
-                            "arguments": call["function"]["arguments"] if isinstance(call, dict) else call.function.arguments
-                        }
-                    } for call in tool_calls]
-                }
-                self.history.append(assistant_msg)
+                self._append_message(self._assistant_tool_message(tool_calls))
 
                 # Send tool call notification through callback
                 if output_callback:
                     for call in tool_calls:
-                        name = call["function"]["name"] if isinstance(call, dict) else call.function.name
-                        # Send a special notification format that the frontend can recognize
-                        notification = json.dumps({
-                            "type": "tool_call",
-                            "tool_name": name,
-                            "status": "started"
-                        })
-                        output_callback(notification)
-
-                # Process tool calls and add their results to history.
-                for call in tool_calls:
-                    name = call["function"]["name"] if isinstance(call, dict) else call.function.name
-                    arguments = call["function"]["arguments"] if isinstance(call, dict) else call.function.arguments
-                    tool_call_id = call["id"] if isinstance(call, dict) else call.id
-                    result = self._handle_tool_call(name, arguments, tool_call_id, params, markdown, live)
-                    self.history.append({
-                        "role": "tool",
-                        "content": json.dumps(result),
-                        "tool_call_id": tool_call_id
-                    })
-
-                    # Send tool completion notification
-                    if output_callback:
-                        notification = json.dumps({
-                            "type": "tool_call",
-                            "tool_name": name,
-                            "status": "completed",
-                            "tool_result": result
-                        })
-                        output_callback(notification)
+                        tool_call_id, name, _ = self._tool_call_fields(call)
+                        output_callback(self._tool_notification(name, "started", tool_call_id=tool_call_id))
+
+                # Process tool calls and add their results to history in call order.
+                try:
+                    results, error = self._run_tool_calls(tool_calls, params, markdown, live, output_callback, cancel)
+                except Cancelled:
+                    # Answer every call, so the history stays valid for the next request.
+                    for call in tool_calls:
+                        tool_call_id, _, _ = self._tool_call_fields(call)
+                        self._append_tool_result(tool_call_id, {"status": "cancelled", "message": "Tool call cancelled"})
+                    raise
+                for call, result in zip(tool_calls, results):
+                    tool_call_id, _, _ = self._tool_call_fields(call)
+                    self._append_tool_result(tool_call_id, result)
+                if error is not None:
+                    raise error
 
             except Exception as e:
+                if cancel is not None and cancel.cancelled:
+                    # A stream closed by the token fails with a read error rather than Cancelled.
+                    if request.duration is None:
+                        stats.request_ended(request, self._completion_tokens(request_text, []), cancel.reason)
+                    stats.failed(cancel.reason)
+                    break
                 error_msg = f"Error: {e}"
+                if request.duration is None:
+                    stats.request_ended(request, self._completion_tokens(request_text, []), str(e))
+                stats.failed(str(e))
                 if not quiet:
                     print(f"[red]{error_msg}[/red]")
                 content += f"\n{error_msg}"
                 break
+            finally:
+                if release_stream is not None:
+                    release_stream()
+
+        if token_output:
+            if cancel is not None and cancel.cancelled:
+                token_output.close()
+            else:
+                token_output.flush()
 
         # Add final assistant response to history.
-        self.history.append({"role": "assistant", "content": content})
+        self._append_message({"role": "assistant", "content": content})
+        self._end_stats()
 
-        return content
+        return (content, stats) if return_stats else content
+
+    def fork(self, conversation_id: Optional[str] = None) -> "Interactor":
+        """Create an interactor that starts from this one's history but evolves independently.
+        
+        The fork shares the client, registered tools and caches, and gets its own copy of the
+        history, listener list and tool thread pool. Model switches, messages and system
+        prompt changes on the fork never reach the original.
+        
+        Args:
+            conversation_id: Identifier under which the fork archives removed messages. Generated if None.
+            
+        Returns:
+            Interactor: The fork.
+        """
+        fork = copy.copy(self)
+        fork.history = self.history.clone()
+        fork.tools = list(self.tools)
+        fork.function_sources = dict(self.function_sources)
+        fork.used_tools = set(self.used_tools)
+        fork.listeners = list(self.listeners)
+        fork.conversation_id = conversation_id or uuid.uuid4().hex
+        fork.last_target = None
+        fork.last_stats = None
+        fork._stats = None
+        fork._compaction = None
+        fork._tool_executor = None
+        return fork
+
+    def export_state(self) -> Dict[str, Any]:
+        """Capture the conversation state needed to resume this interactor elsewhere.
+        
+        API keys are never included; a restored interactor uses the provider's configured key.
+        
+        Returns:
+            dict: JSON-serializable state with the model, base URL, system prompt,
+            context length, messages, used tools, functions registered from files
+            and conversation ID.
+        """
+        return {
+            "model": f"{self.provider}:{self.model}",
+            "base_url": self.base_url,
+            "system": self.system,
+            "context_length": self.context_length,
+            "messages": self.history.copy()[1 if self.history.system else 0:],
+            "used_tools": sorted(self.used_tools),
+            "functions": list(self.function_sources.values()),
+            "conversation_id": self.conversation_id
+        }
+
+    def load_state(self, state: Dict[str, Any]):
+        """Restore a conversation captured with export_state(), replacing the current history.
+        
+        API keys are not part of the state. If the stored model cannot be set up
+        without the key it was used with, the conversation continues on the
+        current model instead, so the session stays usable.
+        
+        Args:
+            state: The exported state.
+        """
+        model = state.get("model")
+        restored = True
+        if model and (model != f"{self.provider}:{self.model}" or state.get("base_url") not in (None, self.base_url)):
+            try:
+                self._setup_client(model, state.get("base_url"))
+                self._setup_encoding()
+            except Exception as e:
+                restored = False
+                log(f"[yellow]Could not restore model {model}, continuing with {self.provider}:{self.model}:[/yellow] {e}")
+        # The stored context length belongs to the stored model.
+        if restored and state.get("context_length"):
+            self.context_length = state["context_length"]
+        if state.get("conversation_id"):
+            self.conversation_id = state["conversation_id"]
+
+        self.history.clear()
+        self._compaction = None
+        self.messages_system(state.get("system") or self.system)
+        for message in state.get("messages", []):
+            self._append_message(message)
+        self.used_tools = set(state.get("used_tools", []))
+
+        registered = {tool["function"]["name"] for tool in self.tools}
+        for source in state.get("functions", []):
+            if source["name"] in registered:
+                continue
+            try:
+                self.add_function_from_file(source["module_path"], source["function_name"], source["name"], source["description"])
+            except Exception as e:
+                log(f"[yellow]Could not restore function {source['name']}:[/yellow] {e}")
+
+    def interact_many(
+        self,
+        prompts: List[Any],
+        concurrency: int = 4,
+        retries: int = 0,
+        retry_delay: float = 1.0,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        **kwargs
+    ) -> List[Dict[str, Any]]:
+        """Run many independent prompts against the current history with bounded concurrency.
+        
+        Every prompt runs on its own fork(), so prompts never see each other's messages
+        and the history of this interactor is left unchanged.
+        
+        Args:
+            prompts: Prompt strings, or dicts with a 'prompt' key and optional 'id',
+                'system' (system prompt for that item) and 'model' keys.
+            concurrency: Maximum number of prompts in flight at once.
+            retries: Extra attempts for a prompt whose request or tool call failed.
+            retry_delay: Seconds before the first retry, doubled on each further retry.
+            on_result: Optional callback receiving each result as soon as it finishes,
+                called from the calling thread in completion order.
+            **kwargs: Passed to interact() for every prompt. quiet defaults to True.
+            
+        Returns:
+            list: One dict per prompt, in input order, with id, prompt, response, error,
+            attempts, duration in seconds and the InteractionStats of the last attempt.
+        """
+        kwargs.setdefault("quiet", True)
+        kwargs.pop("return_stats", None)
+        items = [item if isinstance(item, dict) else {"prompt": item} for item in prompts]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="interactor-batch") as executor:
+            futures = {
+                executor.submit(self._interact_item, index, item, retries, retry_delay, kwargs): index
+                for index, item in enumerate(items)
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                if on_result:
+                    on_result(result)
+
+        return results
+
+    def _interact_item(
+        self,
+        index: int,
+        item: Dict[str, Any],
+        retries: int,
+        retry_delay: float,
+        kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Run one interact_many() prompt on a fresh fork, retrying failed attempts.
+        
+        Args:
+            index: Position of the prompt in the batch, used as its id if it has none.
+            item: The prompt dict.
+            retries: Extra attempts after a failed one.
+            retry_delay: Seconds before the first retry, doubled on each further retry.
+            kwargs: Keyword arguments for interact().
+            
+        Returns:
+            dict: The result record.
+        """
+        started = time.monotonic()
+        result, options = self._batch_item(index, item, kwargs)
+        if result["error"]:
+            return result
+
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(retry_delay * 2 ** (attempt - 1))
+            result["attempts"] = attempt + 1
+            fork = self.fork()
+            try:
+                if item.get("system"):
+                    fork.messages_system(item["system"])
+                response, stats = fork.interact(result["prompt"], return_stats=True, **options)
+            except Exception as e:
+                response, stats, error, retryable = None, None, str(e), True
+            else:
+                error, retryable = self._batch_outcome(stats, options)
+            finally:
+                fork.close()
+
+            result.update({"response": response, "stats": stats, "error": error})
+            if error is None or not retryable:
+                break
+
+        result["duration"] = time.monotonic() - started
+        return result
+
+    @staticmethod
+    def _batch_item(index: int, item: Dict[str, Any], kwargs: Dict[str, Any]) -> tuple:
+        """Build the result record and interact() options of one interact_many() prompt.
+        
+        Args:
+            index: Position of the prompt in the batch, used as its id if it has none.
+            item: The prompt dict.
+            kwargs: Keyword arguments for interact().
+            
+        Returns:
+            tuple: (result record, options). The record already carries an error
+            if the prompt is invalid.
+        """
+        result = {
+            "id": item.get("id", index),
+            "prompt": item.get("prompt"),
+            "response": None,
+            "error": None,
+            "attempts": 0,
+            "duration": None,
+            "stats": None
+        }
+        if not isinstance(result["prompt"], str) or not result["prompt"]:
+            result.update({"error": "Prompt must be a non-empty string.", "duration": 0.0})
+
+        options = dict(kwargs)
+        if item.get("model"):
+            options["model"] = item["model"]
+        return result, options
+
+    @staticmethod
+    def _batch_outcome(stats: Optional[InteractionStats], options: Dict[str, Any]) -> tuple:
+        """Decide whether one attempt of an interact_many() prompt failed and may be retried.
+        
+        Args:
+            stats: Statistics returned by interact(), None if the prompt was rejected.
+            options: The interact() options of the attempt.
+            
+        Returns:
+            tuple: (error message or None, whether another attempt may succeed)
+        """
+        if stats is None:
+            # Rejected before any request; another attempt would fail the same way.
+            return "Prompt is empty or exceeds the context length.", False
+        # Covers failed requests and tools that raised after the last request.
+        cancel = options.get("cancel")
+        return stats.error, not (cancel is not None and cancel.cancelled)
+
+    def add_listener(self, listener: InteractionListener):
+        """Register a listener for timing events of every interaction.
+        
+        Args:
+            listener: The listener to notify.
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: InteractionListener):
+        """Unregister a listener added with add_listener.
+        
+        Args:
+            listener: The listener to remove.
+        """
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _begin_stats(self) -> InteractionStats:
+        """Start collecting statistics for an interaction.
+        
+        Returns:
+            InteractionStats: The statistics of the interaction that is starting.
+        """
+        self._stats = InteractionStats(f"{self.provider}:{self.model}", self.listeners)
+        self.last_stats = self._stats
+        return self._stats
+
+    def _end_stats(self):
+        """Finish the statistics of the current interaction."""
+        if self._stats is not None:
+            self._stats.finish()
+            self._stats = None
+
+    def _prompt_tokens(self, params: Dict[str, Any]) -> int:
+        """Estimate the prompt size of a request from the token ledger.
+        
+        Args:
+            params: The request parameters.
+            
+        Returns:
+            int: History tokens plus tool schema tokens if tools are sent.
+        """
+        return self.history.total_tokens + (self._active_tools_tokens() if "tools" in params else 0)
+
+    def _completion_tokens(self, text: str, tool_calls: list) -> int:
+        """Estimate the completion size of a response when the provider reports no usage.
+        
+        Args:
+            text: The streamed or returned content.
+            tool_calls: The tool calls in the response.
+            
+        Returns:
+            int: Token count of the content plus the tool names and arguments.
+        """
+        tokens = self._text_tokens(text) if text else 0
+        for call in tool_calls:
+            _, name, arguments = self._tool_call_fields(call)
+            tokens += self._text_tokens(f"{name}{arguments or ''}")
+        return tokens
+
+    def _switch_model(self, model: str):
+        """Switch the client and encoding to another model if it differs from the current one.
+        
+        Args:
+            model: Model identifier in format "provider:model_name".
+        """
+        provider, model_name = model.split(":", 1)
+        if provider != self.provider or model_name != self.model:
+            self._setup_client(model)
+            self._setup_encoding()  # Update encoding for the new model.
+        self.provider = provider
+        self.model = model_name
+
+    def _start_turn(self, user_input: str, tools: bool) -> bool:
+        """Add the user message to history and trim the history to the context length.
+        
+        Args:
+            user_input: The user's input message.
+            tools: Whether tool calling is requested for this interaction.
+            
+        Returns:
+            bool: True if the turn can proceed, False if the input or history exceeds the context length.
+        """
+        # Check token length of user input, counted once and reused by the ledger.
+        user_message = {"role": "user", "content": user_input}
+        input_tokens = self._message_tokens(user_message)
+        if input_tokens > self.context_length:
+            print(f"[red]User Input exceeds max context length:[/red] {self.context_length}")
+            return False
+
+        self.tools_enabled = tools and self.tools_supported
+        self._turn_query = user_input
+        self._select_tools(user_input)
+
+        # Add user message and cycle history to stay within context length.
+        self._append_message(user_message, input_tokens)
+        self._apply_compaction()
+        if self._cycle_messages():
+            return False
+        self._schedule_compaction()
+        return True
+
+    def _request_params(self, use_stream: bool) -> Dict[str, Any]:
+        """Build the chat completion parameters for the next request in the tool loop.
+        
+        Args:
+            use_stream: Whether to request a streaming response.
+            
+        Returns:
+            dict: Keyword arguments for chat.completions.create.
+        """
+        params = {
+            "model": self.model,
+            "messages": self.history.copy(),
+            "stream": use_stream
+        }
+        if self.tools_supported and self.tools_enabled:
+            params["tools"] = self._active_tools()
+            params["tool_choice"] = "auto"
+        stream_usage = self.provider == "openai" if self.stream_usage is None else self.stream_usage
+        if use_stream and stream_usage:
+            params["stream_options"] = {"include_usage": True}
+        return params
+
+    def _select_tools(self, user_input: str):
+        """Choose the tools sent with every request of the turn that is starting.
+        
+        The selection is made once per turn, so the tool loop keeps offering the same
+        tools. Without a tool selector, every registered tool is sent.
+        
+        Args:
+            user_input: The user's message for this turn.
+        """
+        self._turn_tools = None
+        if not self.tool_selector or not (self.tools_supported and self.tools_enabled):
+            return
+
+        context = []
+        if self.tool_selector.history_messages > 0:
+            recent = self.history.copy()[-self.tool_selector.history_messages:]
+            context = [
+                message["content"] for message in recent
+                if message.get("role") in ("user", "assistant") and isinstance(message.get("content"), str)
+            ]
+        selected = self.tool_selector.select(self.tools, user_input, context, self.used_tools)
+        if len(selected) < len(self.tools):
+            self._turn_tools = selected
+            self._turn_tools_tokens = sum(self._schema_tokens(tool) for tool in selected)
+
+    def _active_tools(self) -> List[Dict[str, Any]]:
+        """Get the tool schemas sent with requests of the current turn.
+        
+        Returns:
+            list: The selected tools, or every registered tool if none were pruned.
+        """
+        return self.tools if self._turn_tools is None else self._turn_tools
+
+    def _active_tools_tokens(self) -> int:
+        """Get the token count of the tool schemas sent with requests of the current turn.
+        
+        Returns:
+            int: Tokens of the selected tools, or of every registered tool if none were pruned.
+        """
+        return self._tools_tokens if self._turn_tools is None else self._turn_tools_tokens
+
+    def _create_completion(self, params: Dict[str, Any]):
+        """Get a chat completion from the response cache or the provider.
+        
+        Args:
+            params: Keyword arguments for chat.completions.create.
+            
+        Returns:
+            The response, or an iterator over its chunks when streaming.
+        """
+        if self.response_cache is None:
+            return self._send_completion(params)
+
+        key = self.response_cache.make_key(self.provider, self.base_url, params)
+        entry = self.response_cache.get(key)
+        if entry is not None:
+            self.last_target = "cache"
+            return self.response_cache.replay(entry) if params.get("stream") else self.response_cache.message(entry)
+
+        response = self._send_completion(params)
+        # Only answers from the requested model are cached under its key.
+        if self.last_target != f"{self.provider}:{self.model}":
+            return response
+        if params.get("stream"):
+            return self.response_cache.record(key, self.last_target, response)
+        self.response_cache.store_message(key, self.last_target, response)
+        return response
+
+    def _send_completion(self, params: Dict[str, Any]):
+        """Send a chat completion request, through the failover policy when one is configured.
+        
+        Args:
+            params: Keyword arguments for chat.completions.create.
+            
+        Returns:
+            The response, or an iterator over its chunks when streaming.
+        """
+        if not self.failover:
+            self.last_target = f"{self.provider}:{self.model}"
+            return self.client.chat.completions.create(**params)
+
+        attempts = self._completion_attempts(params, clients.get_client)
+        index, response = self.failover.run(attempts, params.get("stream", False))
+        self.last_target = attempts[index][0]
+        return response
+
+    def _completion_attempts(self, params: Dict[str, Any], get_client: Callable) -> list:
+        """Build the ordered request attempts for the failover policy.
+        
+        The current model comes first, followed by every fallback whose provider is
+        configured. Fallbacks without an API key are skipped.
+        
+        Args:
+            params: Chat completion parameters for the current model.
+            get_client: Function returning the client for a provider, base URL and API key.
+            
+        Returns:
+            list: (target key, create callable, parameters) tuples.
+        """
+        primary = f"{self.provider}:{self.model}"
+        attempts = [(primary, self.client.chat.completions.create, params)]
+        for target in self.failover.fallbacks:
+            provider, model_name = target["model"].split(":", 1)
+            config = self.providers.get(provider)
+            if config is None:
+                continue
+            base_url = target["base_url"] or config["base_url"]
+            api_key = target["api_key"] or config["api_key"]
+            if not api_key and provider != "ollama":
+                continue
+            if target["model"] == primary and base_url == self.base_url:
+                continue
+            client = get_client(provider, base_url, api_key)
+            attempts.append((target["model"], client.chat.completions.create, dict(params, model=model_name)))
+        return attempts
+
+    @staticmethod
+    def _merge_tool_call_deltas(tool_calls_dict: Dict[int, Dict[str, Any]], deltas: list):
+        """Accumulate streamed tool call fragments by index.
+        
+        Args:
+            tool_calls_dict: Tool calls assembled so far, keyed by stream index. Updated in place.
+            deltas: The tool_calls entries of a streamed chunk delta.
+        """
+        for tool_call_delta in deltas:
+            index = tool_call_delta.index
+            if index not in tool_calls_dict:
+                tool_calls_dict[index] = {"id": None, "function": {"name": "", "arguments": ""}}
+            if tool_call_delta.id:
+                tool_calls_dict[index]["id"] = tool_call_delta.id
+            if tool_call_delta.function.name:
+                tool_calls_dict[index]["function"]["name"] = tool_call_delta.function.name
+            if tool_call_delta.function.arguments:
+                tool_calls_dict[index]["function"]["arguments"] += tool_call_delta.function.arguments
+
+    @staticmethod
+    def _tool_call_fields(call) -> tuple:
+        """Extract the id, function name and arguments of a tool call.
+        
+        Args:
+            call: A tool call, either an assembled stream dict or an SDK object.
+            
+        Returns:
+            tuple: (tool_call_id, name, arguments)
+        """
+        if isinstance(call, dict):
+            return call["id"], call["function"]["name"], call["function"]["arguments"]
+        return call.id, call.function.name, call.function.arguments
+
+    def _assistant_tool_message(self, tool_calls: list) -> Dict[str, Any]:
+        """Build the assistant history message announcing a set of tool calls.
+        
+        The called tools are recorded as used, so a tool selector keeps offering them.
+        
+        Args:
+            tool_calls: Tool calls returned by the model.
+            
+        Returns:
+            dict: The assistant message with its tool_calls entries.
+        """
+        entries = []
+        for call in tool_calls:
+            tool_call_id, name, arguments = self._tool_call_fields(call)
+            self.used_tools.add(name)
+            entries.append({
+                "id": tool_call_id,
+                "type": "function",
+                "function": {"name": name, "arguments": arguments}
+            })
+        return {"role": "assistant", "content": None, "tool_calls": entries}
+
+    def _append_tool_result(self, tool_call_id: str, result: Any):
+        """Add a tool result to history as a tool message.
+        
+        Args:
+            tool_call_id: Identifier of the tool call being answered.
+            result: The tool's return value.
+        """
+        self._append_message({
+            "role": "tool",
+            "content": json.dumps(result),
+            "tool_call_id": tool_call_id
+        })
+
+    @staticmethod
+    def _tool_notification(
+        name: str,
+        status: str,
+        result: Any = None,
+        shaping: Optional[Dict[str, Any]] = None,
+        tool_call_id: Optional[str] = None
+    ) -> ToolNotification:
+        """Build a tool call notification for the output callback.
+        
+        Args:
+            name: Name of the tool.
+            status: 'started' or 'completed'.
+            result: The tool result, included for completed calls.
+            shaping: How the result was fitted to its token budget, included when a result shaper is configured.
+            tool_call_id: ID of the tool call, so the started and completed notifications of parallel calls can be paired.
+            
+        Returns:
+            ToolNotification: The notification, a JSON string.
+        """
+        notification = {
+            "type": "tool_call",
+            "tool_name": name,
+            "status": status
+        }
+        if tool_call_id:
+            notification["tool_call_id"] = tool_call_id
+        if status == "completed":
+            notification["tool_result"] = result
+            if shaping:
+                notification["shaping"] = shaping
+        return ToolNotification(notification)
+
+    def _shape_tool_result(self, name: str, arguments: str, result: Any) -> tuple:
+        """Fit a tool result into the tool's token budget before it enters history.
+        
+        Results are ranked against the user's question for this turn and the tool arguments.
+        
+        Args:
+            name: Name of the tool.
+            arguments: JSON string of the tool arguments.
+            result: The tool's return value.
+            
+        Returns:
+            tuple: (result to store in history, shaping record or None if no shaper is configured)
+        """
+        if not self.result_shaper:
+            return result, None
+        query = f"{self._turn_query} {arguments or ''}"
+        shaped, record = self.result_shaper.shape(name, result, query, self._text_tokens)
+        if record.get("ref"):
+            # The model needs read_tool_result to get at the rest of this result.
+            self.used_tools.add("read_tool_result")
+        return shaped, record
 
     def _render_content(
             self, content: str,
@@ -499,10 +1353,7 @@ class Interactor:
         Raises:
             ValueError: If the function is not found.
         """
-        arguments = json.loads(function_arguments or "{}")
-        func = getattr(self, function_name, None)
-        if not func:
-            raise ValueError(f"Function '{function_name}' not found.")
+        func, arguments = self._resolve_tool_call(function_name, function_arguments)
 
         if live:
             live.stop()
@@ -513,7 +1364,7 @@ class Interactor:
                 f"[bold yellow]Proposed tool call:[/bold yellow] {function_name}({json.dumps(arguments, indent=2)})\n[bold cyan]Execute? [y/n]: [/bold cyan]",
                 default=False
             )
-            else func(**arguments)
+            else self._call_tool(function_name, func, arguments)
         )
         if safe and command_result["status"] == "cancelled":
             print("[red]Tool call cancelled by user[/red]")
@@ -522,23 +1373,290 @@ class Interactor:
 
         return command_result
 
+    def _run_tool_calls(
+        self,
+        tool_calls: list,
+        params: dict,
+        markdown: bool,
+        live: Optional[Live],
+        output_callback: Optional[Callable[[str], None]] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> tuple:
+        """Run the tool calls of one assistant turn, concurrently when there are several.
+        
+        Calls run on a bounded thread pool of max_tool_workers threads. Completion
+        notifications are sent from the calling thread as each call finishes. A call
+        that raises still gets a result, so every call can be answered in history.
+        
+        Args:
+            tool_calls: Tool calls returned by the model.
+            params: Parameters used for the original API call.
+            markdown: If True, renders content as markdown.
+            live: Optional Live context for updating content in real-time.
+            output_callback: Optional callback receiving completion notifications.
+            cancel: Optional token made current for the tools. Once it is cancelled,
+                calls still running on the pool are no longer waited for.
+            
+        Returns:
+            tuple: (tool results shaped for history, in the same order as tool_calls, and
+            the first error raised by a tool or None). Calls that raised have an error
+            status result.
+            
+        Raises:
+            Cancelled: If the token is cancelled.
+        """
+        calls = [self._tool_call_fields(call) for call in tool_calls]
+
+        def run(tool_call_id, name, arguments, live):
+            with cancel_scope(cancel):
+                return self._handle_tool_call(name, arguments, tool_call_id, params, markdown, live)
+
+        if len(calls) == 1 or self.max_tool_workers == 1:
+            results, error = [], None
+            for tool_call_id, name, arguments in calls:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                try:
+                    result = run(tool_call_id, name, arguments, live)
+                except Cancelled:
+                    raise
+                except Exception as e:
+                    error = error or e
+                    results.append({"status": "error", "error": str(e)})
+                    continue
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                shaped, shaping = self._shape_tool_result(name, arguments, result)
+                if output_callback:
+                    output_callback(self._tool_notification(name, "completed", result, shaping, tool_call_id))
+                results.append(shaped)
+            return results, error
+
+        if live:
+            live.stop()
+
+        executor = self._tool_pool()
+        futures = {
+            executor.submit(run, tool_call_id, name, arguments, None): index
+            for index, (tool_call_id, name, arguments) in enumerate(calls)
+        }
+        results = [None] * len(calls)
+        error = None
+        for future in self._as_completed(futures, cancel):
+            index = futures[future]
+            tool_call_id, name, arguments = calls[index]
+            try:
+                result = future.result()
+            except Cancelled:
+                raise
+            except Exception as e:
+                error = error or e
+                results[index] = {"status": "error", "error": str(e)}
+                continue
+            results[index], shaping = self._shape_tool_result(name, arguments, result)
+            if output_callback:
+                output_callback(self._tool_notification(name, "completed", result, shaping, tool_call_id))
+
+        if live:
+            live.start()
+        return results, error
+
+    @staticmethod
+    def _as_completed(futures, cancel: Optional[CancelToken] = None, interval: float = 0.25):
+        """Yield futures as they finish, like as_completed, but stop waiting once cancel is cancelled.
+        
+        Args:
+            futures: The futures to wait for.
+            cancel: Optional token checked every interval seconds.
+            interval: Seconds between checks of the token.
+            
+        Yields:
+            Future: Each future once it is done.
+            
+        Raises:
+            Cancelled: If the token is cancelled. Calls still running are left to finish on their own.
+        """
+        if cancel is None:
+            yield from as_completed(futures)
+            return
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=interval, return_when=FIRST_COMPLETED)
+            cancel.raise_if_cancelled()
+            yield from done
+
+    @staticmethod
+    def _close_stream(response: Any):
+        """Close a streaming response, ignoring errors, to stop a cancelled interaction.
+
+        Failover and response cache streams are ClosableStreams, so this closes the
+        provider stream underneath them too.
+        """
+        close = getattr(response, "close", None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception:
+            pass
+
+    def _tool_pool(self) -> ThreadPoolExecutor:
+        """Get or create the thread pool used for concurrent tool calls.
+        
+        Returns:
+            ThreadPoolExecutor: The pool, bounded to max_tool_workers threads.
+        """
+        if self._tool_executor is None:
+            self._tool_executor = ThreadPoolExecutor(
+                max_workers=self.max_tool_workers,
+                thread_name_prefix="interactor-tool"
+            )
+        return self._tool_executor
+
+    def close(self):
+        """Release resources held by the interactor, such as the tool thread pool."""
+        if self._tool_executor is not None:
+            self._tool_executor.shutdown(wait=False)
+            self._tool_executor = None
+
+    def _call_tool(self, function_name: str, func: Callable, arguments: Dict[str, Any]) -> Any:
+        """Invoke a tool, going through the tool result cache when one is configured.
+        
+        Args:
+            function_name: Name of the tool.
+            func: The tool callable.
+            arguments: Decoded tool arguments.
+            
+        Returns:
+            The result of the function call.
+        """
+        started = time.monotonic()
+        error = None
+        try:
+            if self.tool_cache is None:
+                return func(**arguments)
+            return self.tool_cache.call(function_name, arguments, func)
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self._record_tool_call(function_name, started, error)
+
+    def _record_tool_call(self, function_name: str, started: float, error: Optional[str] = None):
+        """Add a finished tool call to the statistics of the current interaction.
+        
+        Args:
+            function_name: Name of the tool.
+            started: time.monotonic() when the call started.
+            error: Error message if the call raised.
+        """
+        stats = self._stats
+        if stats is not None:
+            stats.tool_called(function_name, time.monotonic() - started, error)
+
+    def _resolve_tool_call(self, function_name: str, function_arguments: str) -> tuple:
+        """Look up a registered tool and decode its arguments.
+        
+        Args:
+            function_name: Name of the function to call.
+            function_arguments: JSON string containing the function arguments.
+            
+        Returns:
+            tuple: (callable, arguments dict)
+            
+        Raises:
+            ValueError: If the function is not found.
+        """
+        arguments = json.loads(function_arguments or "{}")
+        func = getattr(self, function_name, None)
+        if not func:
+            raise ValueError(f"Function '{function_name}' not found.")
+        return func, arguments
+
     def _setup_encoding(self):
         """Set up the token encoding based on the current model.
         
         Attempts to use the model-specific encoding for OpenAI models,
         or falls back to cl100k_base for other providers or if model-specific encoding fails.
+        Encodings come from the process-wide token registry, so each one is loaded once and
+        shared by every Interactor. The token ledger is recounted only if the encoding changed.
         """
-        try:
-            if self.provider == "openai":
-                self.encoding = tiktoken.encoding_for_model(self.model)
-            else:
-                self.encoding = tiktoken.get_encoding("cl100k_base")
-        except Exception:
-            self.encoding = tiktoken.get_encoding("cl100k_base")
+        encoding = token_registry.get_encoding(self.provider, self.model)
+        if encoding is not self.encoding:
+            self.encoding = encoding
+            self._rebuild_token_ledger()
+
+    def _message_tokens(self, message: Dict[str, Any]) -> int:
+        """Count the tokens of a single message.
+        
+        Args:
+            message: Message dictionary to count tokens for.
+            
+        Returns:
+            int: The number of tokens in the message, or 0 if no encoding is set up yet.
+        """
+        if not self.encoding:
+            return 0
+
+        num_tokens = 4
+        for key, value in message.items():
+            num_tokens += len(self.encoding.encode(str(value)))
+            if key == "name":
+                num_tokens += -1
+        num_tokens += 2
+        return num_tokens
+
+    def _text_tokens(self, text: str) -> int:
+        """Count the tokens of a plain string.
+        
+        Args:
+            text: The string to count.
+            
+        Returns:
+            int: The number of tokens, estimated at four characters per token if no encoding is set up yet.
+        """
+        if not self.encoding:
+            return len(text) // 4
+        return len(self.encoding.encode(text))
+
+    def _schema_tokens(self, tool: Dict[str, Any]) -> int:
+        """Count the tokens a tool schema adds to every request.
+        
+        Args:
+            tool: Tool schema dictionary as registered by add_function.
+            
+        Returns:
+            int: The number of tokens in the serialized schema.
+        """
+        if not self.encoding:
+            return 0
+        return len(self.encoding.encode(json.dumps(tool)))
+
+    def _rebuild_token_ledger(self):
+        """Recount every message and tool schema from scratch.
+        
+        Only needed when the encoding changes; all other history updates
+        adjust the ledger incrementally.
+        """
+        self.history.recount(self._message_tokens)
+        self._tools_tokens = sum(self._schema_tokens(tool) for tool in self.tools)
+
+    def _append_message(self, message: Dict[str, Any], tokens: Optional[int] = None):
+        """Append a message to the history and record its token count.
+        
+        Args:
+            message: Message dictionary to append.
+            tokens: Precomputed token count for the message, if already known.
+        """
+        if tokens is None:
+            tokens = self._message_tokens(message)
+        self.history.append(message, tokens)
 
     def _count_tokens(self, messages: List[Dict[str, str]]) -> int:
         """Count the number of tokens in a list of messages.
         
+        The live history is answered from the token ledger; any other list is counted directly.
+        
         Args:
             messages: List of message dictionaries to count tokens for.
             
@@ -548,28 +1666,24 @@ class Interactor:
         if not self.encoding:
             self._setup_encoding()
 
-        num_tokens = 0
-        for message in messages:
-            num_tokens += 4
-            for key, value in message.items():
-                num_tokens += len(self.encoding.encode(str(value)))
-                if key == "name":
-                    num_tokens += -1
-            num_tokens += 2
-        return num_tokens
+        if messages is self.history:
+            return self.history.total_tokens
+        return sum(self._message_tokens(message) for message in messages)
 
     def _cycle_messages(self):
-        """Remove oldest non-system messages to stay within context length.
+        """Evict the oldest non-system messages to stay within context length.
         
-        Iteratively removes the oldest non-system messages until the total token count
-        is below the specified context_length.
+        The history finds the cut point from its token prefix sums in one step and
+        evicts tool-call turns together with their tool results. The budget covers
+        the history plus any tool schemas sent with the request.
         """
         exceeded_context = False
-        while self._count_tokens(self.history) > self.context_length:
-            for i, msg in enumerate(self.history):
-                if msg["role"] != "system":
-                    self.history.pop(i)
-                    break
+        tools_tokens = self._active_tools_tokens() if self.tools_supported and self.tools_enabled else 0
+        excess = self._count_tokens(self.history) + tools_tokens - self.context_length
+        if excess > 0:
+            evicted = self.history.evict(excess)
+            if self.compactor and evicted:
+                self.compactor.archive.append(self.conversation_id, evicted)
 
         if len(self.history) <= 1:
             print(f"[red]Context length exceeded:[/red] {self.context_length}")
@@ -577,6 +1691,49 @@ class Interactor:
 
         return exceeded_context
 
+    def _schedule_compaction(self):
+        """Start summarizing the oldest turns if the history passed the high-water mark.
+
+        The summary is generated on the compactor's worker threads; the block is
+        replaced by _apply_compaction() at the start of a later turn.
+        """
+        if not self.compactor or self._compaction is not None:
+            return
+
+        tools_tokens = self._active_tools_tokens() if self.tools_supported and self.tools_enabled else 0
+        count = self.compactor.plan(self.history, self.context_length, tools_tokens)
+        if count:
+            block = self.history.oldest(count)
+            self._compaction = (block, self.compactor.submit(block, self.providers))
+
+    def _apply_compaction(self):
+        """Replace a summarized block of turns with its summary once it is ready.
+
+        The block is only replaced if it is still the oldest part of the history;
+        if it was evicted or flushed in the meantime, the summary is discarded. A
+        failed summary leaves the history untouched so plain eviction takes over.
+        """
+        if self._compaction is None:
+            return
+        block, future = self._compaction
+        if not future.done():
+            return
+        self._compaction = None
+
+        try:
+            summary = future.result()
+        except Exception as e:
+            log(f"[yellow]History compaction failed:[/yellow] {e}")
+            return
+
+        current = self.history.oldest(len(block))
+        if len(current) != len(block) or any(a is not b for a, b in zip(current, block)):
+            return
+
+        tokens = [self._message_tokens(message) for message in summary]
+        replaced = self.history.replace_oldest(len(block), summary, tokens)
+        self.compactor.archive.append(self.conversation_id, replaced)
+
     def messages_add(
         self,
         role: Optional[str] = None,
@@ -612,16 +1769,40 @@ class Interactor:
             return self.history.copy()
             
         if role is not None:
-            self.history.append({"role": role, "content": content})
+            self._append_message({"role": role, "content": content})
             return self.history.copy()
 
         return self.history.copy()
 
+    def messages_append(self, message: Dict[str, Any]) -> list:
+        """Append a complete message dictionary to the conversation history.
+        
+        Used for messages that messages_add cannot express, such as assistant
+        messages carrying tool_calls or tool responses with a tool_call_id.
+        
+        Args:
+            message: The message dictionary, including at least a 'role' key.
+            
+        Returns:
+            The current message list
+            
+        Raises:
+            ValueError: If the message has no role or tries to set the system prompt
+        """
+        if not isinstance(message, dict) or not message.get("role"):
+            raise ValueError("Message must be a dictionary with a role")
+        if message["role"] == "system":
+            raise ValueError("Use messages_system to set the system prompt")
+
+        self._append_message(message)
+        return self.history.copy()
+
     def messages_system(self, prompt: str):
         """Set a new system prompt.
         
         Updates the system message in the conversation history. If a system message already exists,
-        it is replaced with the new one. The system message is always kept at the beginning of the history.
+        it is replaced with the new one. The system message is pinned at the beginning of the history
+        and is never evicted.
         
         Args:
             prompt: The new system prompt to set.
@@ -635,18 +1816,12 @@ class Interactor:
         if not isinstance(prompt, str) or not prompt:
             return self.system
 
-        filtered_messages = []
-        for message in self.history:
-            if message["role"] != "system":
-                filtered_messages.append(message)
-        self.history = filtered_messages
-
         system_message = {
             "role": "system",
             "content": prompt
         }
 
-        self.history.insert(0, system_message)
+        self.history.set_system(system_message, self._message_tokens(system_message))
         self.system = prompt
 
         return self.system
@@ -668,29 +1843,33 @@ class Interactor:
         Returns:
             list: The reset message list containing only the system message.
         """
-        self.history = []
+        self.history.clear()
+        self._compaction = None
+        self.used_tools.clear()
         self.messages_system(self.system)
         return self.history.copy()
 
+    def messages_archived(self) -> list:
+        """Retrieve the messages removed from the history by compaction or eviction.
+        
+        Returns:
+            list: The archived messages in their original order, or an empty list
+            if no compactor is configured.
+        """
+        if not self.compactor:
+            return []
+        return self.compactor.archive.load(self.conversation_id)
+
     def messages_length(self) -> int:
         """Calculate the total token count for the message history.
         
         Returns:
-            int: Total number of tokens in the message history.
+            int: Total number of tokens in the message history, read from the token ledger.
         """
         if not self.encoding:
             return 0
-            
-        total_tokens = 0
-        for message in self.history:
-            if message.get("content"):
-                total_tokens += len(self.encoding.encode(message["content"]))
-            if message.get("tool_calls"):
-                for tool_call in message["tool_calls"]:
-                    if tool_call.get("function"):
-                        total_tokens += len(self.encoding.encode(tool_call["function"].get("name", "")))
-                        total_tokens += len(self.encoding.encode(tool_call["function"].get("arguments", "")))
-        return total_tokens
+
+        return self.history.total_tokens
 
 def run_bash_command(command: str) -> Dict[str, Any]:
     """Run a simple bash command (e.g., 'ls -la ./' to list files) and return the output.
@@ -766,6 +1945,94 @@ def get_website_data(url: str) -> Dict[str, Any]:
     except Exception as e:
         return {"status": "error", "error": f"Processing error: {e}", "url": url}
 
+def run_batch(
+    caller: Interactor,
+    input_path: str,
+    output_path: Optional[str] = None,
+    concurrency: int = 4,
+    retries: int = 2,
+    **kwargs
+) -> Dict[str, Any]:
+    """Run a JSONL file of prompts through Interactor.interact_many and write JSONL results.
+    
+    Each input line is a JSON string or an object with a 'prompt' key and optional 'id',
+    'system' and 'model' keys. Lines without an id are identified by their line number.
+    Results are appended to the output file as they finish, so an interrupted run can be
+    resumed: items whose id already has a successful result in the output are skipped,
+    and failed ones are run again. The last line for an id is its current result.
+    
+    Prompts run on worker threads with nobody at the terminal, so the caller must not
+    have tools registered that ask for confirmation on stdin.
+    
+    Args:
+        caller: The interactor whose model, tools and system prompt every item starts from.
+        input_path: Path of the JSONL prompt file.
+        output_path: Path of the JSONL result file. Defaults to <input>.results.jsonl.
+        concurrency: Maximum number of prompts in flight at once.
+        retries: Extra attempts for a prompt whose request or tool call failed.
+        **kwargs: Passed to interact() for every prompt.
+        
+    Returns:
+        dict: Counts of total, skipped, succeeded and failed items, and the output path.
+        
+    Raises:
+        ValueError: If an input line is not valid JSON or has no prompt.
+    """
+    output_path = output_path or f"{os.path.splitext(input_path)[0]}.results.jsonl"
+
+    items = []
+    with open(input_path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{input_path}:{number}: invalid JSON: {e}") from None
+            item = item if isinstance(item, dict) else {"prompt": item}
+            if not item.get("prompt"):
+                raise ValueError(f"{input_path}:{number}: missing prompt")
+            item.setdefault("id", number)
+            items.append(item)
+
+    done = set()
+    terminated = True
+    if os.path.exists(output_path):
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                terminated = line.endswith("\n")
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partial line from an interrupted run.
+                key = json.dumps(record.get("id"))
+                if record.get("error") is None:
+                    done.add(key)
+                else:
+                    done.discard(key)
+
+    pending = [item for item in items if json.dumps(item["id"]) not in done]
+    summary = {"total": len(items), "skipped": len(items) - len(pending), "succeeded": 0, "failed": 0, "output": output_path}
+    print(f"[bold]Batch:[/bold] {len(pending)} of {len(items)} prompts to run, writing to {output_path}")
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        if not terminated:
+            out.write("\n")  # Keep the first new record off the interrupted run's partial line.
+
+        def write(result: Dict[str, Any]):
+            stats = result["stats"]
+            record = dict(result, stats=stats.to_dict() if stats else None)
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+            summary["failed" if result["error"] else "succeeded"] += 1
+            status = f"[red]failed:[/red] {result['error']}" if result["error"] else "[green]ok[/green]"
+            print(f"  {result['id']}: {status} ({result['duration']:.2f}s, {result['attempts']} attempt(s))")
+
+        caller.interact_many(pending, concurrency=concurrency, retries=retries, on_result=write, **kwargs)
+
+    print(f"[bold]Batch done:[/bold] {summary['succeeded']} succeeded, {summary['failed']} failed, {summary['skipped']} skipped")
+    return summary
+
 def main():
     """Run the interactor as a standalone AI chat client.
     
@@ -784,6 +2051,14 @@ def main():
                       help='Enable markdown rendering (default: False)')
     parser.add_argument('--tools', action='store_true', default=True,
                       help='Enable tool calling (default: True)')
+    parser.add_argument('--batch', metavar='INPUT',
+                      help='Run the prompts of a JSONL file instead of the interactive loop')
+    parser.add_argument('--output', metavar='OUTPUT',
+                      help='JSONL result file for --batch (default: INPUT.results.jsonl)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                      help='Prompts in flight at once in --batch mode (default: 4)')
+    parser.add_argument('--retries', type=int, default=2,
+                      help='Retries for a failed prompt in --batch mode (default: 2)')
     
     args = parser.parse_args()
     
@@ -798,8 +2073,10 @@ def main():
             context_length=500
         )
         
-        # Add default utility functions.
-        caller.add_function(run_bash_command)
+        # Add default utility functions. run_bash_command asks for confirmation on
+        # stdin, which nobody answers when batch prompts run on worker threads.
+        if not args.batch:
+            caller.add_function(run_bash_command)
         caller.add_function(get_current_weather)
         caller.add_function(get_website_data)
         
@@ -808,6 +2085,18 @@ def main():
             "You are a helpful assistant. Only call tools if one is applicable."
         )
         
+        if args.batch:
+            summary = run_batch(
+                caller,
+                args.batch,
+                args.output,
+                concurrency=args.concurrency,
+                retries=args.retries,
+                tools=args.tools,
+                stream=args.stream
+            )
+            return 1 if summary["failed"] else 0
+
         # Print welcome message and available models.
         print("[bold green]Interactor Class[/bold green]")
         
@@ -842,5 +2131,5 @@ def main():
     return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: loadtest.py
+# Author: Wadih Khairallah
+# Description: Concurrent streaming load test for /api/interact, to
+#              compare the Flask and ASGI servers and worker counts
+# Created: 2025-04-25 11:40:02
+# Modified: 2025-04-25 11:40:02
+
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import signal
+import subprocess
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Get a percentile of a list of values by nearest rank.
+
+    Args:
+        values: The values.
+        fraction: Percentile between 0 and 1.
+
+    Returns:
+        float: The value, or None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def stream_request(
+    client: httpx.AsyncClient,
+    url: str,
+    message: str,
+    session_id: str,
+    client_id: str
+) -> Dict[str, Any]:
+    """Send one streaming interact request and time it.
+
+    The response is requested as NDJSON events, so the first token and any
+    error event are recognized exactly.
+
+    Args:
+        client: HTTP client.
+        url: Base URL of the server.
+        message: Message sent to the model.
+        session_id: Session the request runs in.
+        client_id: Client the request is scheduled as.
+
+    Returns:
+        dict: status, ttfb (seconds to the first token event), total seconds,
+        bytes received and error, if any.
+    """
+    started = time.monotonic()
+    result = {"status": None, "ttfb": None, "total": None, "bytes": 0, "error": None}
+    headers = {"X-Session-ID": session_id, "X-Client-ID": client_id}
+    try:
+        async with client.stream(
+            "POST",
+            f"{url}/api/interact",
+            json={"message": message, "stream": True, "format": "ndjson"},
+            headers=headers
+        ) as response:
+            result["status"] = response.status_code
+            async for line in response.aiter_lines():
+                result["bytes"] += len(line) + 1
+                if not line.strip() or response.status_code != 200:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "token" and result["ttfb"] is None:
+                    result["ttfb"] = time.monotonic() - started
+                elif event["type"] == "error":
+                    result["error"] = event["message"]
+    except Exception as e:
+        result["error"] = str(e)
+    result["total"] = time.monotonic() - started
+    return result
+
+
+async def run_load(
+    url: str,
+    requests: int = 100,
+    concurrency: int = 20,
+    message: str = "Say hello in one short sentence.",
+    sessions: Optional[int] = None,
+    clients: Optional[int] = None,
+    timeout: float = 300.0
+) -> Dict[str, Any]:
+    """Fire streaming requests at a server, at most `concurrency` at a time.
+
+    Args:
+        url: Base URL of the server, such as http://127.0.0.1:5000.
+        requests: Total number of requests.
+        concurrency: Requests in flight at once.
+        message: Message sent to the model.
+        sessions: Number of distinct sessions the requests are spread over. Defaults
+            to one session per request.
+        clients: Number of distinct client IDs the requests are spread over. Defaults
+            to one client per request.
+        timeout: Seconds before a request is abandoned.
+
+    Returns:
+        dict: Per-request results and the wall-clock duration.
+    """
+    sessions = sessions or requests
+    clients = clients or requests
+    run_id = uuid.uuid4().hex[:8]
+    limit = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def one(index: int) -> Dict[str, Any]:
+            async with limit:
+                return await stream_request(
+                    client,
+                    url.rstrip("/"),
+                    message,
+                    f"loadtest-{run_id}-{index % sessions}",
+                    f"loadtest-{index % clients}"
+                )
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(one(index) for index in range(requests)))
+        return {"results": results, "duration": time.monotonic() - started}
+
+
+def summarize(run: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize a load test run.
+
+    Args:
+        run: Return value of run_load().
+
+    Returns:
+        dict: Request counts by outcome, throughput, and p50/p95 of time to first
+        token and total time over the successful requests.
+    """
+    results = run["results"]
+    ok = [result for result in results if result["status"] == 200 and not result["error"]]
+    ttfb = [result["ttfb"] for result in ok if result["ttfb"] is not None]
+    total = [result["total"] for result in ok]
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "rejected": sum(1 for result in results if result["status"] == 503),
+        "errors": sum(1 for result in results if result["error"] or result["status"] not in (200, 503)),
+        "duration": run["duration"],
+        "throughput": len(ok) / run["duration"] if run["duration"] else 0.0,
+        "ttfb_p50": percentile(ttfb, 0.5),
+        "ttfb_p95": percentile(ttfb, 0.95),
+        "total_p50": percentile(total, 0.5),
+        "total_p95": percentile(total, 0.95)
+    }
+
+
+def spawn_server(command: str, url: str, ready_timeout: float = 60.0) -> subprocess.Popen:
+    """Start a server and wait until it answers.
+
+    Args:
+        command: Command line starting the server.
+        url: Base URL the server listens on.
+        ready_timeout: Seconds to wait for the server.
+
+    Returns:
+        subprocess.Popen: The server process, in its own process group.
+
+    Raises:
+        RuntimeError: If the server exits or does not answer in time.
+    """
+    process = subprocess.Popen(shlex.split(command), start_new_session=True)
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}: {command}")
+        try:
+            if httpx.get(f"{url.rstrip('/')}/api/sessions", timeout=1.0).status_code < 500:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    stop_server(process)
+    raise RuntimeError(f"Server did not answer within {ready_timeout}s: {command}")
+
+
+def stop_server(process: subprocess.Popen, timeout: float = 30.0):
+    """Stop a server started by spawn_server() and its worker processes.
+
+    Args:
+        process: The server process.
+        timeout: Seconds to wait for a graceful shutdown before killing it.
+    """
+    if process.poll() is not None:
+        return
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def print_summary(url: str, summary: Dict[str, Any]):
+    """Print a load test summary as a table."""
+    table = Table(title=f"Load test: {url}")
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    for key, value in summary.items():
+        if value is None:
+            text = "-"
+        elif isinstance(value, float):
+            text = f"{value:.3f}"
+        else:
+            text = str(value)
+        table.add_row(key, text)
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load test the streaming /api/interact route of a Flask or ASGI PathFinder server"
+    )
+    parser.add_argument("urls", nargs="+", help="Base URLs to test one after the other, e.g. http://127.0.0.1:5000")
+    parser.add_argument("--requests", type=int, default=100, help="Total number of requests per server")
+    parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight at once")
+    parser.add_argument("--message", default="Say hello in one short sentence.", help="Message sent to the model")
+    parser.add_argument("--sessions", type=int, default=None, help="Distinct sessions to spread requests over")
+    parser.add_argument("--clients", type=int, default=None, help="Distinct client IDs to spread requests over")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds before a request is abandoned")
+    parser.add_argument("--json", action="store_true", help="Print the summaries as JSON")
+    parser.add_argument(
+        "--spawn",
+        default=None,
+        help="Command starting the server at the given URL, with {workers} for the worker count. "
+             "The server is started and stopped once per --workers value"
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="Worker counts to run --spawn with")
+    args = parser.parse_args()
+
+    if args.spawn and len(args.urls) != 1:
+        parser.error("--spawn takes exactly one URL")
+
+    targets = [(url, None) for url in args.urls]
+    if args.spawn:
+        targets = [(args.urls[0], workers) for workers in args.workers]
+
+    summaries = {}
+    for url, workers in targets:
+        label = url if workers is None else f"{url} ({workers} workers)"
+        process = spawn_server(args.spawn.format(workers=workers), url) if workers is not None else None
+        try:
+            run = asyncio.run(run_load(
+                url,
+                requests=args.requests,
+                concurrency=args.concurrency,
+                message=args.message,
+                sessions=args.sessions,
+                clients=args.clients,
+                timeout=args.timeout
+            ))
+        finally:
+            if process is not None:
+                stop_server(process)
+        summaries[label] = summarize(run)
+        if workers is not None:
+            # Throughput relative to the first worker count
+            baseline = next(iter(summaries.values()))["throughput"]
+            summaries[label]["scaling"] = summaries[label]["throughput"] / baseline if baseline else None
+        if not args.json:
+            print_summary(label, summaries[label])
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: model_catalog.py
+# Author: Wadih Khairallah
+# Description: Concurrent, cached listing of provider models with
+#              stale-while-revalidate refresh
+# Created: 2025-04-19 14:06:18
+# Modified: 2025-04-19 14:06:18
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+try:
+    from . import clients
+except ImportError:
+    import clients
+
+
+class ModelCatalog:
+    """Caches the model lists of every provider and refreshes them in the background.
+
+    Providers are queried concurrently, each bounded by its own timeout, so a
+    listing takes as long as the slowest provider rather than all of them combined.
+    A fresh entry is served directly. A stale entry is served immediately while a
+    background refresh replaces it (stale-while-revalidate); if that refresh fails,
+    the stale list stays. Providers that failed without a list to fall back on are
+    remembered for a short time so an unreachable endpoint does not cost a timeout
+    on every call.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        max_stale: float = 24 * 60 * 60,
+        failure_ttl: float = 30,
+        timeout: float = 5.0,
+        max_workers: int = 8
+    ):
+        """Initialize the catalog.
+
+        Args:
+            ttl: Seconds a provider's model list is considered fresh.
+            max_stale: Seconds a stale list may still be served while it refreshes.
+            failure_ttl: Seconds a failed provider is skipped before it is retried.
+            timeout: Seconds to wait for each provider's models endpoint.
+            max_workers: Maximum number of providers queried at once.
+        """
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.failure_ttl = failure_ttl
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-catalog")
+        self._entries: Dict[tuple, tuple] = {}
+        self._refreshing: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(provider: str, config: dict) -> tuple:
+        return (provider, config["base_url"], config["api_key"])
+
+    def _fetch(self, key: tuple) -> Optional[List[str]]:
+        """Query one provider's models endpoint and store the result.
+
+        Returns:
+            list: Model ids, or None if the provider failed.
+        """
+        provider, base_url, api_key = key
+        try:
+            client = clients.get_client(provider, base_url, api_key).with_options(timeout=self.timeout)
+            models = [model.id for model in client.models.list()]
+        except Exception:
+            models = None
+
+        with self._lock:
+            # A failed refresh keeps the previous list, still stale, to be retried on the next call.
+            if models is not None or self._entries.get(key, (0, None))[1] is None:
+                self._entries[key] = (time.monotonic(), models)
+            self._refreshing.pop(key, None)
+        return models
+
+    def _submit(self, key: tuple):
+        """Start a fetch for a provider unless one is already running.
+
+        Must be called with the lock held.
+        """
+        future = self._refreshing.get(key)
+        if future is None:
+            future = self._executor.submit(self._fetch, key)
+            self._refreshing[key] = future
+        return future
+
+    def models(self, providers: Dict[str, dict], refresh: bool = False) -> Dict[str, List[str]]:
+        """Get the model ids offered by each provider.
+
+        Args:
+            providers: Provider configurations keyed by provider name, each with
+                'base_url' and 'api_key'.
+            refresh: If True, ignores cached lists and queries every provider.
+
+        Returns:
+            dict: Model ids keyed by provider name. Providers that failed or timed
+            out map to an empty list.
+        """
+        now = time.monotonic()
+        results: Dict[str, List[str]] = {}
+        pending = {}
+
+        with self._lock:
+            for provider, config in providers.items():
+                key = self._key(provider, config)
+                entry = None if refresh else self._entries.get(key)
+                if entry is None:
+                    pending[provider] = self._submit(key)
+                    continue
+
+                fetched_at, models = entry
+                age = now - fetched_at
+                if models is None:
+                    if age < self.failure_ttl:
+                        results[provider] = []
+                    else:
+                        pending[provider] = self._submit(key)
+                elif age < self.ttl:
+                    results[provider] = models
+                elif age < self.max_stale:
+                    results[provider] = models
+                    self._submit(key)
+                else:
+                    pending[provider] = self._submit(key)
+
+        if pending:
+            wait(pending.values(), timeout=self.timeout)
+            for provider, future in pending.items():
+                models = future.result() if future.done() else None
+                results[provider] = models or []
+
+        return results
+
+    def invalidate(self):
+        """Forget every cached model list."""
+        with self._lock:
+            self._entries.clear()
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_model_catalog() -> ModelCatalog:
+    """Get or initialize the process-wide model catalog.
+
+    Returns:
+        ModelCatalog: The shared catalog instance.
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ModelCatalog()
+        return _catalog
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: probe_cache.py
+# Author: Wadih Khairallah
+# Description: Persistent SQLite cache for model tool-support probes
+# Created: 2025-04-18 11:40:27
+# Modified: 2025-04-18 11:40:27
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pathfinder")
+DEFAULT_TTL = 7 * 24 * 60 * 60  # One week
+
+# Words in a 400 response showing the provider rejected tool calling itself,
+# rather than the key, another parameter or the prompt size.
+TOOL_ERROR_PATTERN = re.compile(r"\btools?\b|tool_choice|tool[ _-]?call|function[ _-]?call|\bfunctions?\b", re.IGNORECASE)
+
+
+def rejects_tools(error: Exception) -> bool:
+    """Tell whether a rejected probe request failed because of its tools.
+
+    Only such failures say the model does not support tool calling and may be
+    cached as False. Any other 400 says nothing about tool support.
+
+    Args:
+        error: The openai.BadRequestError raised by the probe.
+
+    Returns:
+        bool: True if the error message or body refers to tools or function calling.
+    """
+    body = getattr(error, "body", None)
+    text = str(error) + (json.dumps(body, default=str) if body else "")
+    return bool(TOOL_ERROR_PATTERN.search(text))
+
+
+class ToolSupportCache:
+    """Caches whether a provider/base_url/model combination supports tool calling.
+
+    Probing a model costs a full chat completion, so results are kept on disk and
+    shared by every Interactor in every process pointing at the same database.
+    Entries expire after `ttl` seconds and can be invalidated manually.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, ttl: int = DEFAULT_TTL):
+        """Initialize the cache with a SQLite database.
+
+        Args:
+            db_path: Path to the SQLite database file. Defaults to
+                $PATHFINDER_CACHE_DIR/tool_support.db (~/.cache/pathfinder if unset).
+            ttl: Seconds before a cached probe result expires.
+        """
+        if db_path is None:
+            cache_dir = os.getenv("PATHFINDER_CACHE_DIR", DEFAULT_CACHE_DIR)
+            db_path = os.path.join(cache_dir, "tool_support.db")
+        self.db_path = db_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ensure_db_exists()
+
+    def _ensure_db_exists(self):
+        """Ensure the database and its schema exist."""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS tool_support (
+                provider TEXT NOT NULL,
+                base_url TEXT NOT NULL,
+                model TEXT NOT NULL,
+                supported INTEGER NOT NULL,
+                checked_at REAL NOT NULL,
+                PRIMARY KEY (provider, base_url, model)
+            )
+            ''')
+            conn.commit()
+
+    def get(self, provider: str, base_url: str, model: str) -> Optional[bool]:
+        """Look up a cached probe result.
+
+        Args:
+            provider: Provider name (e.g., 'openai').
+            base_url: Effective base URL the client talks to.
+            model: Model name without the provider prefix.
+
+        Returns:
+            True or False if a fresh result is cached, None on a miss or expired entry.
+        """
+        with self._lock, sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT supported, checked_at FROM tool_support WHERE provider = ? AND base_url = ? AND model = ?",
+                (provider, base_url, model)
+            ).fetchone()
+
+        if not row:
+            return None
+        supported, checked_at = row
+        if time.time() - checked_at > self.ttl:
+            return None
+        return bool(supported)
+
+    def set(self, provider: str, base_url: str, model: str, supported: bool):
+        """Store a probe result.
+
+        Args:
+            provider: Provider name (e.g., 'openai').
+            base_url: Effective base URL the client talks to.
+            model: Model name without the provider prefix.
+            supported: Whether the model answered the probe with a tool call.
+        """
+        with self._lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tool_support (provider, base_url, model, supported, checked_at) VALUES (?, ?, ?, ?, ?)",
+                (provider, base_url, model, int(bool(supported)), time.time())
+            )
+            conn.commit()
+
+    def invalidate(
+        self,
+        provider: Optional[str] = None,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> int:
+        """Remove cached probe results.
+
+        Any argument left as None matches every value, so invalidate() with no
+        arguments clears the whole cache.
+
+        Args:
+            provider: Only remove entries for this provider.
+            base_url: Only remove entries for this base URL.
+            model: Only remove entries for this model.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        clauses = []
+        params = []
+        for column, value in (("provider", provider), ("base_url", base_url), ("model", model)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock, sqlite3.connect(self.db_path) as conn:
+            cursor = conn.execute(f"DELETE FROM tool_support{where}", params)
+            conn.commit()
+            return cursor.rowcount
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_tool_support_cache() -> ToolSupportCache:
+    """Get or initialize the process-wide tool support cache.
+
+    Returns:
+        ToolSupportCache: The shared cache instance.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ToolSupportCache()
+        return _default_cache
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: response_cache.py
+# Author: Wadih Khairallah
+# Description: Two-tier (memory LRU and SQLite) cache of chat
+#              completion responses with stream replay
+# Created: 2025-04-21 14:30:12
+# Modified: 2025-04-21 14:30:12
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+try:
+    from .cancellation import ClosableStream
+except ImportError:
+    from cancellation import ClosableStream
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pathfinder")
+DEFAULT_TTL = 60 * 60  # One hour
+
+# Request parameters that change what the model returns. Streaming options only
+# change how it is delivered, so streamed and plain requests share entries.
+KEY_PARAMS = (
+    "model", "messages", "tools", "tool_choice", "temperature", "top_p", "max_tokens",
+    "max_completion_tokens", "presence_penalty", "frequency_penalty", "stop", "seed",
+    "n", "logit_bias", "response_format"
+)
+
+# Delete expired SQLite rows after this many writes.
+PRUNE_EVERY = 100
+
+
+class ResponseCache:
+    """Caches chat completion responses keyed on everything that determines them.
+
+    The key is a hash of the endpoint, model, messages, tool schemas and sampling
+    parameters. Hits are served from an in-memory LRU first and from SQLite next,
+    so entries survive restarts and are shared between processes. A cached
+    response keeps the chunk boundaries it was streamed with and is replayed as
+    the same sequence of chunks, so output callbacks see the same stream.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        ttl: int = DEFAULT_TTL,
+        max_entries: int = 256,
+        persist: bool = True
+    ):
+        """Initialize the cache.
+
+        Args:
+            db_path: Path to the SQLite database file. Defaults to
+                $PATHFINDER_CACHE_DIR/responses.db (~/.cache/pathfinder if unset).
+            ttl: Seconds before a cached response expires.
+            max_entries: Maximum number of responses kept in memory.
+            persist: If False, only the in-memory tier is used.
+        """
+        if db_path is None and persist:
+            cache_dir = os.getenv("PATHFINDER_CACHE_DIR", DEFAULT_CACHE_DIR)
+            db_path = os.path.join(cache_dir, "responses.db")
+        self.db_path = db_path if persist else None
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        if self.db_path:
+            self._ensure_db_exists()
+
+    def _ensure_db_exists(self):
+        """Ensure the database and its schema exist."""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                entry TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            ''')
+            conn.commit()
+
+    @staticmethod
+    def make_key(provider: str, base_url: str, params: Dict[str, Any]) -> str:
+        """Build the cache key of a chat completion request.
+
+        Args:
+            provider: Provider name (e.g., 'openai').
+            base_url: Effective base URL of the provider.
+            params: Keyword arguments for chat.completions.create.
+
+        Returns:
+            str: Hex digest identifying the request.
+        """
+        relevant = {name: params[name] for name in KEY_PARAMS if name in params}
+        payload = json.dumps([provider, base_url, relevant], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached response.
+
+        Args:
+            key: Key from make_key().
+
+        Returns:
+            dict: The cached entry with 'chunks', 'tool_calls' and 'usage', or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                expires_at, entry = cached
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry
+                del self._entries[key]
+
+        entry = None
+        if self.db_path:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute(
+                    "SELECT entry, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+            if row:
+                entry = json.loads(row[0])
+                self._remember(key, entry, row[1])
+
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._disk_hits += 1
+        return entry
+
+    def set(self, key: str, model: str, entry: Dict[str, Any]):
+        """Store a response.
+
+        Args:
+            key: Key from make_key().
+            model: Model that produced the response.
+            entry: Dict with 'chunks', 'tool_calls' and 'usage'.
+        """
+        expires_at = time.time() + self.ttl
+        self._remember(key, entry, expires_at)
+        if not self.db_path:
+            return
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, entry, expires_at) VALUES (?, ?, ?, ?)",
+                (key, model, json.dumps(entry), expires_at)
+            )
+            with self._lock:
+                self._writes += 1
+                prune = self._writes % PRUNE_EVERY == 0
+            if prune:
+                conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            conn.commit()
+
+    def _remember(self, key: str, entry: Dict[str, Any], expires_at: float):
+        with self._lock:
+            self._entries[key] = (expires_at, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> int:
+        """Remove every cached response from both tiers.
+
+        Returns:
+            int: Number of entries removed from the SQLite tier, or from memory if not persisted.
+        """
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        if self.db_path:
+            with sqlite3.connect(self.db_path) as conn:
+                removed = conn.execute("DELETE FROM responses").rowcount
+                conn.commit()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit and miss counters.
+
+        Returns:
+            dict: hits, disk_hits, misses, entries in memory and hit_rate.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "entries": len(self._entries),
+                "hit_rate": self._hits / lookups if lookups else 0.0
+            }
+
+    # Recording and replay
+
+    @staticmethod
+    def _entry(chunks: List[str], tool_calls: Dict[int, Dict[str, Any]], usage: Any) -> Dict[str, Any]:
+        return {
+            "chunks": chunks,
+            "tool_calls": [tool_calls[index] for index in sorted(tool_calls)],
+            "usage": {
+                "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                "completion_tokens": getattr(usage, "completion_tokens", None)
+            } if usage is not None else None
+        }
+
+    @staticmethod
+    def _record_chunk(chunk: Any, chunks: List[str], tool_calls: Dict[int, Dict[str, Any]]) -> Any:
+        """Add a streamed chunk to a recording. Returns the chunk's usage, if any."""
+        if chunk.choices:
+            delta = chunk.choices[0].delta
+            if delta.content:
+                chunks.append(delta.content)
+            for call in delta.tool_calls or []:
+                entry = tool_calls.setdefault(call.index, {"id": None, "name": "", "arguments": ""})
+                if call.id:
+                    entry["id"] = call.id
+                if call.function.name:
+                    entry["name"] = call.function.name
+                if call.function.arguments:
+                    entry["arguments"] += call.function.arguments
+        return getattr(chunk, "usage", None)
+
+    def record(self, key: str, model: str, stream: Iterator[Any]) -> ClosableStream:
+        """Pass a streamed response through while recording it.
+
+        The response is stored only if the stream is consumed to the end.
+
+        Args:
+            key: Key from make_key().
+            model: Model that produced the response.
+            stream: The provider's chunk iterator.
+
+        Returns:
+            ClosableStream: The provider's chunks, unchanged; close() closes the provider stream.
+        """
+        def recording():
+            chunks: List[str] = []
+            tool_calls: Dict[int, Dict[str, Any]] = {}
+            usage = None
+            for chunk in stream:
+                usage = self._record_chunk(chunk, chunks, tool_calls) or usage
+                yield chunk
+            self.set(key, model, self._entry(chunks, tool_calls, usage))
+
+        return ClosableStream(recording(), stream)
+
+    async def arecord(self, key: str, model: str, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """Pass an async streamed response through while recording it.
+
+        Args:
+            key: Key from make_key().
+            model: Model that produced the response.
+            stream: The provider's async chunk iterator.
+
+        Yields:
+            The provider's chunks, unchanged.
+        """
+        chunks: List[str] = []
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        usage = None
+        async for chunk in stream:
+            usage = self._record_chunk(chunk, chunks, tool_calls) or usage
+            yield chunk
+        self.set(key, model, self._entry(chunks, tool_calls, usage))
+
+    def store_message(self, key: str, model: str, response: Any):
+        """Store a non-streamed response.
+
+        Args:
+            key: Key from make_key().
+            model: Model that produced the response.
+            response: The provider's chat completion response.
+        """
+        message = response.choices[0].message
+        tool_calls = {
+            index: {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+            for index, call in enumerate(message.tool_calls or [])
+        }
+        chunks = [message.content] if message.content else []
+        self.set(key, model, self._entry(chunks, tool_calls, getattr(response, "usage", None)))
+
+    @staticmethod
+    def _usage(entry: Dict[str, Any]) -> Any:
+        return SimpleNamespace(**entry["usage"]) if entry.get("usage") else None
+
+    @classmethod
+    def replay(cls, entry: Dict[str, Any]) -> Iterator[Any]:
+        """Replay a cached response as a stream of chunks.
+
+        Args:
+            entry: The cached entry.
+
+        Yields:
+            Chunk objects shaped like the provider's streamed chunks.
+        """
+        for text in entry["chunks"]:
+            yield cls._chunk(content=text)
+        if entry["tool_calls"]:
+            yield cls._chunk(tool_calls=[
+                SimpleNamespace(
+                    index=index,
+                    id=call["id"],
+                    function=SimpleNamespace(name=call["name"], arguments=call["arguments"])
+                )
+                for index, call in enumerate(entry["tool_calls"])
+            ])
+        usage = cls._usage(entry)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+    @classmethod
+    async def areplay(cls, entry: Dict[str, Any]) -> AsyncIterator[Any]:
+        """Replay a cached response as an async stream of chunks.
+
+        Args:
+            entry: The cached entry.
+
+        Yields:
+            Chunk objects shaped like the provider's streamed chunks.
+        """
+        for chunk in cls.replay(entry):
+            yield chunk
+
+    @classmethod
+    def message(cls, entry: Dict[str, Any]) -> Any:
+        """Rebuild a non-streamed response from a cached entry.
+
+        Args:
+            entry: The cached entry.
+
+        Returns:
+            An object shaped like the provider's chat completion response.
+        """
+        tool_calls = [
+            SimpleNamespace(
+                id=call["id"],
+                type="function",
+                function=SimpleNamespace(name=call["name"], arguments=call["arguments"])
+            )
+            for call in entry["tool_calls"]
+        ] or None
+        message = SimpleNamespace(role="assistant", content="".join(entry["chunks"]) or None, tool_calls=tool_calls)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=cls._usage(entry))
+
+    @staticmethod
+    def _chunk(content: Optional[str] = None, tool_calls: Optional[list] = None) -> Any:
+        delta = SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: result_shaping.py
+# Author: Wadih Khairallah
+# Description: Token-budgeted shaping of tool results before they
+#              enter the conversation history
+# Created: 2025-04-20 13:18:36
+# Modified: 2025-04-20 13:18:36
+
+import json
+import math
+import re
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Strings shorter than this are left alone; only long text fields are shaped.
+MIN_SHAPED_CHARS = 200
+
+# Tokens reserved for the truncation notice and JSON punctuation.
+NOTICE_TOKENS = 60
+
+STRATEGIES = ("auto", "head_tail", "ranked")
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _terms(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if len(word) > 2]
+
+
+def bm25_scores(documents: List[List[str]], query_terms: List[str], k1: float = 1.2, b: float = 0.75) -> List[float]:
+    """Score tokenized documents against query terms with BM25.
+
+    Args:
+        documents: The terms of each document.
+        query_terms: The query terms. Repeats are ignored.
+        k1: Term frequency saturation.
+        b: Document length normalization.
+
+    Returns:
+        list: One score per document, 0.0 for documents sharing no term with the query.
+    """
+    if not query_terms or not documents:
+        return [0.0] * len(documents)
+    counts = [Counter(document) for document in documents]
+    lengths = [len(document) for document in documents]
+    average = (sum(lengths) / len(lengths)) or 1
+    terms = set(query_terms)
+    frequency = {term: sum(1 for counter in counts if term in counter) for term in terms}
+
+    scores = []
+    for counter, length in zip(counts, lengths):
+        score = 0.0
+        for term in terms:
+            tf = counter.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (len(documents) - frequency[term] + 0.5) / (frequency[term] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average))
+        scores.append(score)
+    return scores
+
+
+class ResultShaper:
+    """Fits tool results into a per-tool token budget.
+
+    Results within budget pass through unchanged. Larger results have their long
+    text fields cut down, either to the head and tail of the text or to the chunks
+    that best match the user's question (BM25 over sentence-aligned chunks). The
+    full result is kept in memory under a reference handle, and the shaped result
+    tells the model how to read more through the read_tool_result tool. With a
+    store, full results are also written there, so a ref stays readable in every
+    process sharing the store.
+    """
+
+    def __init__(
+        self,
+        default_budget: Optional[int] = 4000,
+        budgets: Optional[Dict[str, Optional[int]]] = None,
+        strategies: Optional[Dict[str, str]] = None,
+        chunk_tokens: int = 200,
+        max_stored: int = 128,
+        store: Optional[Any] = None
+    ):
+        """Initialize the shaper.
+
+        Args:
+            default_budget: Token budget for tools without their own entry. None disables shaping for them.
+            budgets: Per-tool token budgets keyed by tool name. None exempts a tool.
+            strategies: Per-tool strategy keyed by tool name: 'head_tail', 'ranked' or 'auto'.
+                'auto' ranks chunks when there is a question to rank against and uses head/tail otherwise.
+            chunk_tokens: Approximate size of the chunks used for relevance ranking.
+            max_stored: Maximum number of full results kept in memory for read_tool_result.
+            store: Optional store shared between processes, with save_tool_result() and
+                load_tool_result(), such as the SessionStore.
+
+        Raises:
+            ValueError: If a strategy is unknown.
+        """
+        self.default_budget = default_budget
+        self.budgets = dict(budgets or {})
+        self.strategies = dict(strategies or {})
+        for strategy in self.strategies.values():
+            if strategy not in STRATEGIES:
+                raise ValueError(f"Unknown strategy: {strategy}. Supported strategies: {list(STRATEGIES)}")
+        self.chunk_tokens = chunk_tokens
+        self.max_stored = max_stored
+        self.store = store
+        self._stored: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def budget_for(self, name: str) -> Optional[int]:
+        """Get the token budget of a tool.
+
+        Args:
+            name: Tool name.
+
+        Returns:
+            int: The budget, or None if the tool's results are never shaped.
+        """
+        if name == "read_tool_result":
+            return None
+        return self.budgets.get(name, self.default_budget)
+
+    def shape(
+        self,
+        name: str,
+        result: Any,
+        query: str,
+        count: Callable[[str], int]
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """Shape a tool result to its token budget.
+
+        Args:
+            name: Tool name.
+            result: The tool's return value.
+            query: Text the result should be relevant to, usually the user's question and the tool arguments.
+            count: Callable returning the token count of a string.
+
+        Returns:
+            tuple: (shaped result, shaping record). The record holds the strategy,
+            budget, original and final token counts and, when truncated, the reference handle.
+        """
+        budget = self.budget_for(name)
+        original_tokens = count(json.dumps(result, default=str))
+        record = {"strategy": "none", "budget": budget, "original_tokens": original_tokens, "tokens": original_tokens}
+        if budget is None or original_tokens <= budget:
+            return result, record
+
+        shaped = json.loads(json.dumps(result if isinstance(result, dict) else {"result": result}, default=str))
+        leaves = [(path, text) for path, text in self._string_leaves(shaped) if len(text) >= MIN_SHAPED_CHARS]
+        if not leaves:
+            # Nothing long enough to cut inside the structure: shape its serialized form instead.
+            text = json.dumps(result, default=str)
+            shaped = {"result": text}
+            leaves = [(("result",), text)]
+
+        sizes = [max(1, count(text)) for _, text in leaves]
+        for path, _ in leaves:
+            self._set(shaped, path, "")
+        overhead = count(json.dumps(shaped, default=str)) + NOTICE_TOKENS
+        available = max(budget - overhead, budget // 4)
+
+        strategy = self.strategies.get(name, "auto")
+        if strategy == "auto":
+            strategy = "ranked" if _terms(query) else "head_tail"
+
+        kept_chunks = total_chunks = 0
+        for (path, text), size in zip(leaves, sizes):
+            leaf_budget = max(1, available * size // sum(sizes))
+            chars_per_token = len(text) / size
+            if strategy == "ranked":
+                text, kept, total = self._ranked(text, leaf_budget, query, chars_per_token)
+                kept_chunks += kept
+                total_chunks += total
+            else:
+                text = self._head_tail(text, leaf_budget, chars_per_token)
+            self._set(shaped, path, text)
+
+        ref = self._store(name, leaves, budget, sum(len(text) for _, text in leaves) / sum(sizes))
+        shaped_tokens = count(json.dumps(shaped, default=str))
+        shaped["truncated"] = {
+            "ref": ref,
+            "note": (
+                f"Showing about {shaped_tokens} of {original_tokens} tokens. Call read_tool_result "
+                "with this ref and a query or page number to read more."
+            )
+        }
+
+        record.update({"strategy": strategy, "tokens": count(json.dumps(shaped, default=str)), "ref": ref})
+        if strategy == "ranked":
+            record["chunks"] = f"{kept_chunks}/{total_chunks}"
+        return shaped, record
+
+    def read_tool_result(self, ref: str, query: str = "", page: int = 0) -> Dict[str, Any]:
+        """Read more of a truncated tool result by its ref, either the chunks matching a query or a page.
+
+        Args:
+            ref: The ref handle from the truncated result.
+            query: Optional text to find the most relevant parts of the full result.
+            page: Page number to read when no query is given, starting at 0.
+
+        Returns:
+            dict: The requested text with the page count, or an error if the ref is unknown.
+        """
+        with self._lock:
+            entry = self._stored.get(ref)
+            if entry is not None:
+                self._stored.move_to_end(ref)
+        if entry is None and self.store is not None:
+            # Stored by another process serving the same session.
+            entry = self.store.load_tool_result(ref)
+            if entry is not None:
+                self._remember(ref, entry)
+        if entry is None:
+            return {"status": "error", "error": f"Unknown or expired ref: {ref}"}
+
+        text = entry["text"]
+        page_chars = max(1, int(entry["budget"] * entry["chars_per_token"]))
+        pages = max(1, math.ceil(len(text) / page_chars))
+
+        if query and _terms(query):
+            text, kept, total = self._ranked(text, entry["budget"], query, entry["chars_per_token"])
+            return {"status": "success", "ref": ref, "query": query, "chunks": f"{kept}/{total}", "text": text}
+
+        page = min(max(0, int(page)), pages - 1)
+        return {
+            "status": "success",
+            "ref": ref,
+            "page": page,
+            "pages": pages,
+            "text": text[page * page_chars:(page + 1) * page_chars]
+        }
+
+    def _store(self, name: str, leaves: List[Tuple[tuple, str]], budget: int, chars_per_token: float) -> str:
+        """Keep the full text of a shaped result and return its ref handle."""
+        if len(leaves) == 1:
+            text = leaves[0][1]
+        else:
+            text = "\n\n".join(f"[{'.'.join(map(str, path))}]\n{value}" for path, value in leaves)
+
+        ref = f"{name}-{uuid.uuid4().hex[:12]}"
+        entry = {"text": text, "budget": budget, "chars_per_token": chars_per_token}
+        if self.store is not None:
+            self.store.save_tool_result(ref, entry)
+        self._remember(ref, entry)
+        return ref
+
+    def _remember(self, ref: str, entry: Dict[str, Any]):
+        """Keep a full result in memory, dropping the least recently read ones beyond max_stored."""
+        with self._lock:
+            self._stored[ref] = entry
+            self._stored.move_to_end(ref)
+            while len(self._stored) > self.max_stored:
+                self._stored.popitem(last=False)
+
+    @staticmethod
+    def _head_tail(text: str, budget: int, chars_per_token: float) -> str:
+        """Keep the start and end of a text, two thirds head and one third tail."""
+        chars = int(budget * chars_per_token)
+        if len(text) <= chars:
+            return text
+        head = chars * 2 // 3
+        tail = chars - head
+        omitted = int((len(text) - chars) / chars_per_token)
+        return f"{text[:head]} [... about {omitted} tokens omitted ...] {text[len(text) - tail:] if tail else ''}"
+
+    def _ranked(self, text: str, budget: int, query: str, chars_per_token: float) -> Tuple[str, int, int]:
+        """Keep the chunks that best match the query, in their original order.
+
+        Returns:
+            tuple: (selected text, chunks kept, total chunks)
+        """
+        chunks = self._chunks(text, int(self.chunk_tokens * chars_per_token))
+        limit = int(budget * chars_per_token)
+        if len(chunks) <= 1:
+            return self._head_tail(text, budget, chars_per_token), 1, 1
+
+        scores = self._bm25(chunks, _terms(query))
+        # The first chunk usually carries the title or lead, so it breaks ties.
+        order = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+
+        selected = []
+        used = 0
+        for index in order:
+            size = len(chunks[index]) + 7
+            if used + size > limit:
+                continue
+            selected.append(index)
+            used += size
+        if not selected:
+            return self._head_tail(chunks[order[0]], budget, chars_per_token), 1, len(chunks)
+
+        selected.sort()
+        parts = []
+        for position, index in enumerate(selected):
+            if position == 0 and index > 0 or position > 0 and index != selected[position - 1] + 1:
+                parts.append("[...]")
+            parts.append(chunks[index])
+        if selected[-1] != len(chunks) - 1:
+            parts.append("[...]")
+        return " ".join(parts), len(selected), len(chunks)
+
+    @staticmethod
+    def _chunks(text: str, chunk_chars: int) -> List[str]:
+        """Split text into chunks of roughly chunk_chars, breaking at sentence ends."""
+        chunk_chars = max(1, chunk_chars)
+        chunks = []
+        current = ""
+        for sentence in _SENTENCE_BREAK.split(text):
+            sentence = sentence.strip()
+            while len(sentence) > chunk_chars:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(sentence[:chunk_chars])
+                sentence = sentence[chunk_chars:]
+            if not sentence:
+                continue
+            if current and len(current) + len(sentence) + 1 > chunk_chars:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        if current:
+            chunks.append(current)
+        return chunks
+
+    @staticmethod
+    def _bm25(chunks: List[str], query_terms: List[str]) -> List[float]:
+        """Score chunks against query terms with BM25."""
+        return bm25_scores([_terms(chunk) for chunk in chunks], query_terms)
+
+    @classmethod
+    def _string_leaves(cls, value: Any, path: tuple = ()):
+        """Yield (path, string) for every string inside nested dicts and lists."""
+        if isinstance(value, str):
+            yield path, value
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                yield from cls._string_leaves(item, path + (key,))
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                yield from cls._string_leaves(item, path + (index,))
+
+    @staticmethod
+    def _set(container: Any, path: tuple, value: str):
+        for key in path[:-1]:
+            container = container[key]
+        container[path[-1]] = value
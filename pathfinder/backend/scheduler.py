@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: scheduler.py
+# Author: Wadih Khairallah
+# Description: Bounded worker pools, threaded and asyncio, for generation
+#              requests with fair per-client and per-session queuing
+#              and load shedding
+# Created: 2025-04-24 10:26:43
+# Modified: 2025-04-24 10:26:43
+
+import asyncio
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from rich.console import Console
+
+console = Console()
+log = console.log
+
+
+class SchedulerFull(Exception):
+    """Raised when a job is rejected because a queue limit was reached."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    """A unit of generation work queued on the GenerationScheduler."""
+
+    def __init__(self, fn: Callable[[], Any], client: str, session: str):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.client = client
+        self.session = session
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.cancelled = False
+        self._started = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def started(self) -> bool:
+        """Whether a worker picked the job up."""
+        return self._started.is_set()
+
+    @property
+    def done(self) -> bool:
+        """Whether the job finished, failed or was cancelled."""
+        return self._done.is_set()
+
+    def wait_started(self, timeout: Optional[float] = None) -> bool:
+        """Wait until a worker picks the job up or it is cancelled.
+
+        Args:
+            timeout: Maximum seconds to wait.
+
+        Returns:
+            bool: True if the job started or was cancelled, False on timeout.
+        """
+        return self._started.wait(timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """Wait for the job to finish and return its result.
+
+        Args:
+            timeout: Maximum seconds to wait.
+
+        Returns:
+            The return value of the job's function.
+
+        Raises:
+            TimeoutError: If the job did not finish in time.
+            Exception: The error raised by the job's function.
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Job {self.id} did not finish within {timeout} seconds")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _mark_started(self):
+        self.started_at = time.monotonic()
+        self._started.set()
+
+    def _mark_done(self):
+        self.finished_at = time.monotonic()
+        self._done.set()
+
+    def _mark_cancelled(self):
+        self.cancelled = True
+        self._started.set()
+        self._done.set()
+
+
+class AsyncJob(Job):
+    """A unit of generation work queued on the AsyncGenerationScheduler.
+
+    Same as Job, but wait_started() and wait() are coroutines.
+    """
+
+    def __init__(self, fn: Callable[[], Any], client: str, session: str):
+        super().__init__(fn, client, session)
+        self._started = asyncio.Event()
+        self._done = asyncio.Event()
+
+    async def wait_started(self, timeout: Optional[float] = None) -> bool:
+        """Wait until a worker picks the job up or it is cancelled.
+
+        Args:
+            timeout: Maximum seconds to wait.
+
+        Returns:
+            bool: True if the job started or was cancelled, False on timeout.
+        """
+        try:
+            await asyncio.wait_for(self._started.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def wait(self, timeout: Optional[float] = None) -> Any:
+        """Wait for the job to finish and return its result.
+
+        Args:
+            timeout: Maximum seconds to wait.
+
+        Returns:
+            The return value of the job's coroutine function.
+
+        Raises:
+            TimeoutError: If the job did not finish in time.
+            Exception: The error raised by the job's coroutine function.
+        """
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Job {self.id} did not finish within {timeout} seconds") from None
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _FairQueue:
+    """Queue bookkeeping shared by the threaded and asyncio schedulers.
+
+    Waiting jobs are queued per client and, within a client, per session. Workers
+    serve clients in round-robin order, and a client's sessions in round-robin
+    order, so one busy client or conversation cannot starve the others. A session
+    never runs two jobs at once; its next job waits until the previous one ends,
+    instead of tying up a second worker on the session lock.
+
+    Submissions beyond the total or per-client queue limits are rejected with
+    SchedulerFull, carrying a Retry-After estimate from the recent job durations.
+    """
+
+    job_class = Job
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        max_queue: int = 64,
+        max_queue_per_client: int = 8,
+        initial_duration: float = 10.0
+    ):
+        """Initialize the queues.
+
+        Args:
+            max_workers: Number of jobs running at once.
+            max_queue: Maximum number of jobs waiting across all clients.
+            max_queue_per_client: Maximum number of jobs waiting for one client.
+            initial_duration: Assumed job duration in seconds until real durations are measured.
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self._queues: "OrderedDict[str, OrderedDict[str, deque]]" = OrderedDict()
+        self._queued = 0
+        self._running: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._avg_duration = initial_duration
+        self._avg_wait = 0.0
+        self._counts = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "cancelled": 0}
+
+    def _enqueue(self, fn: Callable[[], Any], client: str, session: str) -> Job:
+        """Queue a job unless a limit is reached. Call with the lock held."""
+        if self._closed:
+            raise RuntimeError("Scheduler is closed")
+        client_queued = sum(len(jobs) for jobs in self._queues.get(client, {}).values())
+        if self._queued >= self.max_queue:
+            self._counts["rejected"] += 1
+            raise SchedulerFull("Server is at capacity", self._retry_after(self._queued))
+        if client_queued >= self.max_queue_per_client:
+            self._counts["rejected"] += 1
+            raise SchedulerFull("Too many queued requests from this client", self._retry_after(client_queued))
+
+        job = self.job_class(fn, client, session)
+        self._queues.setdefault(client, OrderedDict()).setdefault(session, deque()).append(job)
+        self._queued += 1
+        self._counts["submitted"] += 1
+        return job
+
+    def cancel(self, job: Job) -> bool:
+        """Remove a job that has not started yet.
+
+        Args:
+            job: The job to cancel.
+
+        Returns:
+            bool: True if the job was still waiting and is now cancelled.
+        """
+        with self._lock:
+            jobs = self._queues.get(job.client, {}).get(job.session)
+            if not jobs or job not in jobs:
+                return False
+            jobs.remove(job)
+            self._queued -= 1
+            self._prune(job.client, job.session)
+            self._counts["cancelled"] += 1
+        job._mark_cancelled()
+        return True
+
+    def position(self, job: Job) -> int:
+        """Get how many jobs will start before this one, plus one.
+
+        Args:
+            job: A queued job.
+
+        Returns:
+            int: 1 for the next job to start, or 0 if the job is no longer waiting.
+        """
+        with self._lock:
+            for index, queued in enumerate(self._dispatch_order()):
+                if queued is job:
+                    return index + 1
+        return 0
+
+    def _dispatch_order(self) -> List[Job]:
+        """Order in which the waiting jobs would start, if no session were busy. Call with the lock held."""
+        queues = [[list(jobs) for jobs in sessions.values()] for sessions in self._queues.values()]
+        order = []
+        while queues:
+            for sessions in list(queues):
+                jobs = sessions.pop(0)
+                order.append(jobs.pop(0))
+                if jobs:
+                    sessions.append(jobs)
+                if not sessions:
+                    queues.remove(sessions)
+        return order
+
+    def _next_job(self) -> Optional[Job]:
+        """Take the next job in round-robin order whose session is idle. Call with the lock held."""
+        for client, sessions in list(self._queues.items()):
+            for session, jobs in list(sessions.items()):
+                if self._running.get(session):
+                    continue
+                job = jobs.popleft()
+                self._queued -= 1
+                # Rotate the served session and client to the back of the line.
+                sessions.move_to_end(session)
+                self._queues.move_to_end(client)
+                self._prune(client, session)
+                self._running[session] = self._running.get(session, 0) + 1
+                return job
+        return None
+
+    def _prune(self, client: str, session: str):
+        sessions = self._queues.get(client)
+        if sessions is None:
+            return
+        if session in sessions and not sessions[session]:
+            del sessions[session]
+        if not sessions:
+            del self._queues[client]
+
+    def _finished(self, job: Job):
+        """Record a finished job and free its session. Call with the lock held."""
+        self._running[job.session] -= 1
+        if not self._running[job.session]:
+            del self._running[job.session]
+        self._counts["failed" if job.error else "completed"] += 1
+        self._avg_duration += 0.2 * ((job.finished_at - job.started_at) - self._avg_duration)
+        self._avg_wait += 0.2 * ((job.started_at - job.submitted_at) - self._avg_wait)
+
+    def _retry_after(self, waiting: int) -> int:
+        """Estimate the seconds until the waiting jobs have drained, between 1 and 300."""
+        return max(1, min(300, math.ceil(self._avg_duration * (waiting + 1) / self.max_workers)))
+
+    def stats(self) -> Dict[str, Any]:
+        """Get scheduler statistics.
+
+        Returns:
+            dict: Worker count, running and queued jobs, queued jobs per client,
+            counters, and the average job duration and queue wait in seconds.
+        """
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "running": sum(self._running.values()),
+                "queued": self._queued,
+                "max_queue": self.max_queue,
+                "max_queue_per_client": self.max_queue_per_client,
+                "queued_by_client": {
+                    client: sum(len(jobs) for jobs in sessions.values())
+                    for client, sessions in self._queues.items()
+                },
+                "avg_duration": self._avg_duration,
+                "avg_wait": self._avg_wait,
+                **self._counts
+            }
+
+
+class GenerationScheduler(_FairQueue):
+    """Runs generation jobs, plain callables, on a fixed number of worker threads."""
+
+    def __init__(self, *args, **kwargs):
+        """Start the worker threads. Accepts the same arguments as the queue limits of _FairQueue."""
+        super().__init__(*args, **kwargs)
+        self._cond = threading.Condition(self._lock)
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True, name=f"generation-{index}")
+            for index in range(self.max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fn: Callable[[], Any], client: str, session: str) -> Job:
+        """Queue a job.
+
+        Args:
+            fn: Callable run on a worker thread.
+            client: Client the job belongs to, such as the remote address.
+            session: Session the job belongs to.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            SchedulerFull: If the queue or the client's share of it is full.
+        """
+        with self._cond:
+            job = self._enqueue(fn, client, session)
+            self._cond.notify()
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+
+            job._mark_started()
+            try:
+                job.result = job.fn()
+            except BaseException as e:
+                job.error = e
+                log(f"[yellow]Generation job {job.id} failed:[/yellow] {e}")
+            job.finished_at = time.monotonic()
+
+            with self._cond:
+                self._finished(job)
+                # The finished session may have more jobs that another worker can take now.
+                self._cond.notify_all()
+            job._mark_done()
+
+    def close(self):
+        """Stop accepting jobs and let the workers exit once the queue is empty."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class AsyncGenerationScheduler(_FairQueue):
+    """Runs generation jobs, coroutine functions, on a fixed number of asyncio worker tasks.
+
+    The workers start on the running event loop at the first submit(), and every
+    method must be called from that loop.
+    """
+
+    job_class = AsyncJob
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the scheduler. Accepts the same arguments as the queue limits of _FairQueue."""
+        super().__init__(*args, **kwargs)
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def submit(self, fn: Callable[[], Any], client: str, session: str) -> AsyncJob:
+        """Queue a job.
+
+        Args:
+            fn: Coroutine function run by a worker task.
+            client: Client the job belongs to, such as the remote address.
+            session: Session the job belongs to.
+
+        Returns:
+            AsyncJob: The queued job.
+
+        Raises:
+            SchedulerFull: If the queue or the client's share of it is full.
+        """
+        if not self._tasks:
+            self._wake = asyncio.Event()
+            self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.max_workers)]
+        with self._lock:
+            job = self._enqueue(fn, client, session)
+        self._wake.set()
+        return job
+
+    async def _work(self):
+        while True:
+            # Clear before looking, so a job submitted after the check still wakes this worker.
+            self._wake.clear()
+            with self._lock:
+                job = self._next_job()
+            if job is None:
+                if self._closed:
+                    return
+                await self._wake.wait()
+                continue
+
+            job._mark_started()
+            try:
+                job.result = await job.fn()
+            except Exception as e:
+                job.error = e
+                log(f"[yellow]Generation job {job.id} failed:[/yellow] {e}")
+            except asyncio.CancelledError as e:
+                job.error = e
+                raise
+            finally:
+                job.finished_at = time.monotonic()
+                with self._lock:
+                    self._finished(job)
+                job._mark_done()
+                # The finished session may have more jobs that another worker can take now.
+                self._wake.set()
+
+    async def aclose(self):
+        """Stop accepting jobs and wait for the workers to drain the queue."""
+        self._closed = True
+        if self._wake is not None:
+            self._wake.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: session_store.py
+# Author: Wadih Khairallah
+# Description: SQLite store of session snapshots and truncated tool
+#              results shared by the worker processes of one server,
+#              with cross-process session locks
+# Created: 2025-04-28 11:02:18
+# Modified: 2025-04-28 11:02:18
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from . import snapshot
+except ImportError:
+    import snapshot
+
+DEFAULT_DB_PATH = os.path.join("data", "sessions.db")
+
+# Lock files sessions are hashed onto. Two sessions on the same file only
+# wait for each other, so a few hundred keep that rare without one file per session.
+LOCK_SLOTS = 1024
+
+# Seconds a full tool result stays readable through read_tool_result, and how
+# many writes pass between deletions of the expired ones.
+TOOL_RESULT_TTL = 24 * 60 * 60
+PRUNE_EVERY = 100
+
+
+class SessionLock:
+    """Exclusive lock on one session across every process using the same store.
+
+    Backed by flock() on a lock file next to the database, so a worker that dies
+    releases its locks with it. Used like threading.Lock; every acquirer, including
+    every thread, needs its own SessionLock. Without fcntl (Windows) it only
+    excludes other threads of the same process.
+    """
+
+    _local_locks: Dict[str, threading.Lock] = {}
+    _local_guard = threading.Lock()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._local: Optional[threading.Lock] = None
+
+    def acquire(self):
+        """Wait for the lock and take it."""
+        if fcntl is None:
+            with self._local_guard:
+                self._local = self._local_locks.setdefault(self.path, threading.Lock())
+            self._local.acquire()
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self):
+        """Release the lock."""
+        if self._local is not None:
+            self._local.release()
+            self._local = None
+            return
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SessionStore:
+    """Keeps the latest snapshot of every session where all worker processes can read it.
+
+    Each save gives the session a new revision, so a process can check cheaply
+    whether the copy it holds in memory is still current. Snapshots use the
+    binary format of snapshot.py. The database runs in WAL mode, so readers never
+    wait for a writer, and each thread keeps its own connection.
+
+    Provides the store interface SessionManager expects, and the tool result
+    store ResultShaper uses so a ref handed out by one worker can be read in
+    another. Transcripts used to seed new sessions are read from the transcript
+    manager passed in.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        transcripts: Optional[Any] = None,
+        compress_level: int = 0
+    ):
+        """Initialize the store.
+
+        Args:
+            db_path: Path to the SQLite database file. Defaults to
+                $PATHFINDER_SESSION_DB, or data/sessions.db if unset.
+            transcripts: Object with get_transcript(), usually the TranscriptManager.
+            compress_level: zlib level for snapshots, 0 to store them uncompressed.
+        """
+        self.db_path = db_path or os.getenv("PATHFINDER_SESSION_DB", DEFAULT_DB_PATH)
+        self.lock_dir = self.db_path + ".locks"
+        self.transcripts = transcripts
+        self.compress_level = compress_level
+        self._local = threading.local()
+        self._writes = 0
+        self._ensure_db_exists()
+
+    def _ensure_db_exists(self):
+        """Ensure the database, its schema and the lock directory exist."""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS session_snapshots (
+                id TEXT PRIMARY KEY,
+                revision TEXT NOT NULL,
+                snapshot BLOB NOT NULL,
+                last_modified REAL NOT NULL
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS tool_results (
+                ref TEXT PRIMARY KEY,
+                entry BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use.
+
+        Connections are never shared across a fork; a child opens its own.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def lock(self, session_id: str) -> SessionLock:
+        """Get a lock excluding other processes from a session.
+
+        Args:
+            session_id: ID of the session.
+
+        Returns:
+            SessionLock: A new, unheld lock.
+        """
+        slot = int(hashlib.sha1(session_id.encode("utf-8")).hexdigest(), 16) % LOCK_SLOTS
+        return SessionLock(os.path.join(self.lock_dir, f"{slot:04d}.lock"))
+
+    def revision(self, session_id: str) -> Optional[str]:
+        """Get the current revision of a session's snapshot.
+
+        Args:
+            session_id: ID of the session.
+
+        Returns:
+            str: The revision, or None if the session has no snapshot.
+        """
+        row = self._connect().execute(
+            "SELECT revision FROM session_snapshots WHERE id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save_snapshot(self, session_id: str, state: Dict[str, Any]) -> str:
+        """Store a session's state as its latest snapshot.
+
+        Args:
+            session_id: ID of the session.
+            state: State from Interactor.export_state().
+
+        Returns:
+            str: The new revision.
+        """
+        revision = uuid.uuid4().hex
+        data = snapshot.dumps(state, self.compress_level)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO session_snapshots (id, revision, snapshot, last_modified) VALUES (?, ?, ?, ?)",
+                (session_id, revision, data, time.time())
+            )
+        return revision
+
+    def load_snapshot(self, session_id: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Get a session's latest snapshot with its revision.
+
+        Args:
+            session_id: ID of the session.
+
+        Returns:
+            tuple: (revision, state), or (None, None) if the session has no snapshot.
+        """
+        row = self._connect().execute(
+            "SELECT revision, snapshot FROM session_snapshots WHERE id = ?", (session_id,)
+        ).fetchone()
+        if not row:
+            return None, None
+        return row[0], snapshot.loads(row[1])
+
+    def save_session(self, session_id: str, state: Dict[str, Any]):
+        """Store the state of a session so it can be restored later.
+
+        Args:
+            session_id: ID of the session.
+            state: Session state.
+        """
+        self.save_snapshot(session_id, state)
+
+    def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the stored state of a session.
+
+        Args:
+            session_id: ID of the session.
+
+        Returns:
+            Session state or None if the session was never stored.
+        """
+        return self.load_snapshot(session_id)[1]
+
+    def delete_session(self, session_id: str) -> bool:
+        """Delete the stored state of a session.
+
+        Args:
+            session_id: ID of the session.
+
+        Returns:
+            True if a stored state was deleted.
+        """
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute("DELETE FROM session_snapshots WHERE id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def save_tool_result(self, ref: str, entry: Dict[str, Any]):
+        """Store the full text of a truncated tool result.
+
+        Args:
+            ref: The ref handle given to the model.
+            entry: The stored result from ResultShaper.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tool_results (ref, entry, expires_at) VALUES (?, ?, ?)",
+                (ref, snapshot.dumps(entry, self.compress_level), now + TOOL_RESULT_TTL)
+            )
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM tool_results WHERE expires_at < ?", (now,))
+
+    def load_tool_result(self, ref: str) -> Optional[Dict[str, Any]]:
+        """Get the full text of a truncated tool result.
+
+        Args:
+            ref: The ref handle given to the model.
+
+        Returns:
+            dict: The stored result, or None if the ref is unknown or expired.
+        """
+        row = self._connect().execute(
+            "SELECT entry FROM tool_results WHERE ref = ? AND expires_at >= ?", (ref, time.time())
+        ).fetchone()
+        return snapshot.loads(row[0]) if row else None
+
+    def get_transcript(self, transcript_id: str) -> Optional[Dict[str, Any]]:
+        """Get a transcript to seed a new session with.
+
+        Args:
+            transcript_id: ID of the transcript.
+
+        Returns:
+            Transcript object or None if not found or no transcript manager is set.
+        """
+        if self.transcripts is None:
+            return None
+        return self.transcripts.get_transcript(transcript_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get store statistics.
+
+        Returns:
+            dict: Number of stored sessions, total snapshot bytes and number of stored tool results.
+        """
+        conn = self._connect()
+        count, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(snapshot)), 0) FROM session_snapshots"
+        ).fetchone()
+        results = conn.execute("SELECT COUNT(*) FROM tool_results").fetchone()[0]
+        return {"sessions": count, "bytes": size, "tool_results": results, "db_path": self.db_path}
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: sessions.py
+# Author: Wadih Khairallah
+# Description: Session-scoped Interactor pool with an LRU cap, idle
+#              timeout, spill/rehydrate through the transcript DB and
+#              a shared mode for multi-process servers
+# Created: 2025-04-23 14:05:52
+# Modified: 2025-04-23 14:05:52
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from rich.console import Console
+
+console = Console()
+log = console.log
+
+# Session used by requests that name neither a session nor a transcript.
+DEFAULT_SESSION = "default"
+
+# Revision of a shared session that was never compared with the store
+_UNSYNCED = object()
+
+
+def transcript_messages(transcript: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert stored transcript messages to Interactor history messages.
+
+    System messages are skipped, since the Interactor keeps its own system prompt,
+    and UI-only fields such as timestamps and tool_data are dropped.
+
+    Args:
+        transcript: The transcript from TranscriptManager.get_transcript().
+
+    Returns:
+        list: Messages ready for Interactor.messages_append().
+    """
+    messages = []
+    for message in transcript.get("messages", []):
+        if message["role"] == "system":
+            continue
+        if message.get("tool_calls"):
+            messages.append({"role": message["role"], "content": message.get("content"), "tool_calls": message["tool_calls"]})
+        elif message.get("tool_call_id"):
+            messages.append({"role": "tool", "content": message["content"], "tool_call_id": message["tool_call_id"]})
+        elif message.get("content"):
+            messages.append({"role": message["role"], "content": message["content"]})
+    return messages
+
+
+class _Session:
+    """An Interactor in the pool with its lock and usage bookkeeping.
+
+    A session enters the pool before its Interactor is built, so building never
+    holds up the pool; ready is set once interactor is in place, or left None if
+    building failed.
+    """
+
+    def __init__(self, interactor: Any = None):
+        self.interactor = interactor
+        self.ready = threading.Event()
+        if interactor is not None:
+            self.ready.set()
+        # A plain Lock, not an RLock: aacquire() takes it on an executor thread and
+        # releases it from the event loop thread.
+        self.lock = threading.Lock()
+        self.busy = 0
+        self.last_used = time.monotonic()
+        # Shared mode: the store revision the interactor matches, and its state at that revision
+        self.revision: Any = _UNSYNCED
+        self.saved: Optional[Dict[str, Any]] = None
+
+
+class SessionManager:
+    """Keeps one Interactor per session so concurrent clients never share a history.
+
+    Interactors are created on demand by a factory, which should hand every
+    session the same tools and caches; tokenizers and HTTP clients are already
+    shared process-wide. At most max_sessions live in memory. Beyond that, and
+    once a session has been idle for idle_timeout seconds, its state is written
+    to the store and the Interactor is released. The next request for the session
+    restores it from the store. A new session tied to a transcript starts from that
+    transcript's messages.
+
+    In shared mode the store is the source of truth for several processes serving
+    the same sessions, such as the workers of a multi-process server. acquire()
+    also takes the store's cross-process lock on the session, reloads the session
+    if another process saved a newer revision, and saves it back on release if it
+    changed. get() only reloads. Sessions are never written on spill, since the
+    store already holds their latest state.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        store: Optional[Any] = None,
+        max_sessions: int = 32,
+        idle_timeout: Optional[float] = 30 * 60,
+        reap_interval: Optional[float] = 60,
+        shared: bool = False
+    ):
+        """Initialize the pool.
+
+        Args:
+            factory: Callable returning a new, configured Interactor.
+            store: Object with save_session, load_session, delete_session and
+                get_transcript, usually the TranscriptManager. If None, sessions
+                evicted from memory are lost.
+            max_sessions: Maximum number of Interactors kept in memory.
+            idle_timeout: Seconds without requests before a session is spilled. None keeps idle sessions.
+            reap_interval: Seconds between background checks for idle sessions. None disables the
+                background thread; call reap() yourself.
+            shared: Keep every session in sync with a store shared by other processes. The
+                store must also provide revision, load_snapshot, save_snapshot and lock, like
+                session_store.SessionStore.
+        """
+        self.factory = factory
+        self.store = store
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout = idle_timeout
+        self.shared = shared and store is not None
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Sessions taken out of the pool whose state is still being written to the store
+        self._spilling: Dict[str, threading.Event] = {}
+        self._counts = {"created": 0, "rehydrated": 0, "spilled": 0, "refreshed": 0, "saved": 0}
+        self._stop = threading.Event()
+        if idle_timeout is not None and reap_interval:
+            threading.Thread(target=self._reap_loop, args=(reap_interval,), daemon=True, name="session-reaper").start()
+
+    def get(self, session_id: Optional[str] = None, transcript_id: Optional[str] = None) -> Any:
+        """Get the Interactor of a session, restoring or creating it if needed.
+
+        Use acquire() instead around anything that changes the history, so two
+        requests of the same session do not interleave.
+
+        Args:
+            session_id: Session key. Defaults to DEFAULT_SESSION.
+            transcript_id: Transcript whose messages seed the session if it has no history yet.
+
+        Returns:
+            Interactor: The session's Interactor.
+        """
+        session_id = session_id or DEFAULT_SESSION
+        session = self._checkout(session_id, transcript_id)
+        # A session held in this process is already current; the holder has the store lock.
+        if self.shared and not session.busy and session.lock.acquire(blocking=False):
+            try:
+                self._sync(session_id, session, transcript_id)
+            finally:
+                session.lock.release()
+        return session.interactor
+
+    @contextmanager
+    def acquire(self, session_id: Optional[str] = None, transcript_id: Optional[str] = None) -> Iterator[Any]:
+        """Hold a session's Interactor exclusively.
+
+        The session is never spilled while held, and other acquire() calls for the
+        same session wait until it is released.
+
+        Args:
+            session_id: Session key. Defaults to DEFAULT_SESSION.
+            transcript_id: Transcript whose messages seed the session if it has no history yet.
+
+        Yields:
+            Interactor: The session's Interactor.
+        """
+        session_id = session_id or DEFAULT_SESSION
+        session = self._checkout(session_id, transcript_id, hold=True)
+        try:
+            with session.lock:
+                if not self.shared:
+                    yield session.interactor
+                    return
+                with self.store.lock(session_id):
+                    self._sync(session_id, session, transcript_id)
+                    try:
+                        yield session.interactor
+                    finally:
+                        self._save(session_id, session)
+        finally:
+            with self._lock:
+                session.busy -= 1
+                session.last_used = time.monotonic()
+
+    @asynccontextmanager
+    async def aacquire(self, session_id: Optional[str] = None, transcript_id: Optional[str] = None) -> AsyncIterator[Any]:
+        """Hold a session's Interactor exclusively from a coroutine.
+
+        Same as acquire(), but restoring the session and waiting for its lock run in
+        the event loop's default executor, so the loop is never blocked.
+
+        Args:
+            session_id: Session key. Defaults to DEFAULT_SESSION.
+            transcript_id: Transcript whose messages seed the session if it has no history yet.
+
+        Yields:
+            Interactor: The session's Interactor.
+        """
+        loop = asyncio.get_running_loop()
+        session_id = session_id or DEFAULT_SESSION
+        session = await loop.run_in_executor(None, self._checkout, session_id, transcript_id, True)
+        try:
+            # Try without a thread hop first; the lock is usually free.
+            if not session.lock.acquire(blocking=False):
+                acquiring = loop.run_in_executor(None, session.lock.acquire)
+                try:
+                    await asyncio.shield(acquiring)
+                except asyncio.CancelledError:
+                    # The executor thread still takes the lock; hand it back once it does.
+                    acquiring.add_done_callback(lambda _: session.lock.release())
+                    raise
+            if not self.shared:
+                try:
+                    yield session.interactor
+                finally:
+                    session.lock.release()
+                return
+            store_lock = self.store.lock(session_id)
+            entering = loop.run_in_executor(None, self._enter_shared, session_id, session, transcript_id, store_lock)
+            try:
+                await asyncio.shield(entering)
+            except asyncio.CancelledError:
+                # The executor thread may still take the store lock; release both once it is done.
+                entering.add_done_callback(lambda future: self._abandon_shared(future, session, store_lock))
+                raise
+            except BaseException:
+                session.lock.release()
+                raise
+            try:
+                yield session.interactor
+            finally:
+                # Saving finishes before the session is unlocked, even if this task is cancelled.
+                await asyncio.shield(loop.run_in_executor(None, self._exit_shared, session_id, session, store_lock))
+        finally:
+            with self._lock:
+                session.busy -= 1
+                session.last_used = time.monotonic()
+
+    def _checkout(self, session_id: str, transcript_id: Optional[str], hold: bool = False) -> _Session:
+        """Get a session from the pool, restoring or creating it if needed.
+
+        The pool lock only guards the bookkeeping. Building the Interactor, which may
+        probe the provider, and reading or writing the store happen outside it, so a
+        cold session never holds up requests for the others.
+        """
+        while True:
+            with self._lock:
+                session = self._sessions.get(session_id)
+                created = session is None
+                if created:
+                    session = self._sessions[session_id] = _Session()
+                    spilling = self._spilling.get(session_id)
+                # Sessions being built are busy, so an idle one is always ready.
+                seed = bool(transcript_id) and not created and not session.busy
+                self._sessions.move_to_end(session_id)
+                session.last_used = time.monotonic()
+                # Pinned until checked out, so it is not spilled meanwhile
+                session.busy += 1
+                evicted = self._evict_over_capacity()
+            for key, old in evicted:
+                self._spill(key, old)
+            if created:
+                self._build(session_id, session, transcript_id, spilling)
+            else:
+                session.ready.wait()
+            if session.interactor is not None:
+                break
+            # Building failed for the request that started it; try again.
+            with self._lock:
+                session.busy -= 1
+        if seed and session.lock.acquire(blocking=False):
+            try:
+                if len(session.interactor.history) <= 1:
+                    self._seed(session.interactor, transcript_id)
+            finally:
+                session.lock.release()
+        if not hold:
+            with self._lock:
+                session.busy -= 1
+        return session
+
+    def _build(self, session_id: str, session: _Session, transcript_id: Optional[str], spilling: Optional[threading.Event]):
+        """Give a new pool entry its Interactor, or drop it from the pool if that fails."""
+        try:
+            if spilling is not None:
+                # Restore what the previous spill of this session writes, not what preceded it.
+                spilling.wait()
+            session.interactor = self._restore(session_id, transcript_id)
+        except BaseException:
+            with self._lock:
+                session.busy -= 1
+                if self._sessions.get(session_id) is session:
+                    del self._sessions[session_id]
+            raise
+        finally:
+            session.ready.set()
+
+    def _restore(self, session_id: str, transcript_id: Optional[str]) -> Any:
+        """Create a session's Interactor from its stored state or its transcript. Call without the lock."""
+        interactor = self.factory()
+        if self.shared:
+            # Loaded by _sync() once the session is locked.
+            return interactor
+        state = None
+        if self.store is not None:
+            try:
+                state = self.store.load_session(session_id)
+            except Exception as e:
+                log(f"[yellow]Could not load session {session_id}:[/yellow] {e}")
+        if state:
+            interactor.load_state(state)
+        elif transcript_id:
+            self._seed(interactor, transcript_id)
+        with self._lock:
+            self._counts["rehydrated" if state else "created"] += 1
+        return interactor
+
+    def _sync(self, session_id: str, session: _Session, transcript_id: Optional[str] = None):
+        """Bring a shared session up to the store's latest revision. Call with the session locked.
+
+        A session another process discarded starts over from a new Interactor.
+        """
+        revision = self.store.revision(session_id)
+        if revision is not None and revision == session.revision:
+            return
+        if revision is None:
+            if session.revision is _UNSYNCED:
+                with self._lock:
+                    self._counts["created"] += 1
+            elif session.revision is not None:
+                old, session.interactor = session.interactor, self.factory()
+                old.close()
+            if transcript_id and len(session.interactor.history) <= 1:
+                self._seed(session.interactor, transcript_id)
+            session.revision, session.saved = None, None
+            return
+        revision, state = self.store.load_snapshot(session_id)
+        if state is None:
+            return self._sync(session_id, session, transcript_id)
+        session.interactor.load_state(state)
+        with self._lock:
+            self._counts["rehydrated" if session.revision is _UNSYNCED else "refreshed"] += 1
+        session.revision, session.saved = revision, session.interactor.export_state()
+
+    def _save(self, session_id: str, session: _Session):
+        """Write a shared session to the store if it changed since it was synced. Call with the session locked."""
+        try:
+            state = session.interactor.export_state()
+            if state == session.saved:
+                return
+            session.revision = self.store.save_snapshot(session_id, state)
+            session.saved = state
+            with self._lock:
+                self._counts["saved"] += 1
+        except Exception as e:
+            # The next sync from the store replaces what could not be saved.
+            session.revision = _UNSYNCED
+            log(f"[yellow]Could not store session {session_id}:[/yellow] {e}")
+
+    def _enter_shared(self, session_id: str, session: _Session, transcript_id: Optional[str], store_lock: Any):
+        """Take a shared session's store lock and sync it. Runs on an executor thread for aacquire()."""
+        store_lock.acquire()
+        try:
+            self._sync(session_id, session, transcript_id)
+        except BaseException:
+            store_lock.release()
+            raise
+
+    def _exit_shared(self, session_id: str, session: _Session, store_lock: Any):
+        """Save a shared session and release its locks. Runs on an executor thread for aacquire()."""
+        try:
+            self._save(session_id, session)
+        finally:
+            store_lock.release()
+            session.lock.release()
+
+    @staticmethod
+    def _abandon_shared(entering: Any, session: _Session, store_lock: Any):
+        """Release the locks of an aacquire() cancelled while _enter_shared() ran."""
+        if not entering.cancelled() and entering.exception() is None:
+            store_lock.release()
+        session.lock.release()
+
+    def _seed(self, interactor: Any, transcript_id: str):
+        """Load a transcript's messages into an empty Interactor."""
+        if self.store is None:
+            return
+        try:
+            transcript = self.store.get_transcript(transcript_id)
+        except Exception as e:
+            log(f"[yellow]Could not load transcript {transcript_id}:[/yellow] {e}")
+            return
+        if transcript:
+            interactor.messages_flush()
+            for message in transcript_messages(transcript):
+                interactor.messages_append(message)
+
+    def _evict_over_capacity(self) -> List[Any]:
+        """Take the least recently used idle sessions beyond max_sessions out of the pool. Call with the lock held.
+
+        Returns:
+            list: (session_id, session) pairs to pass to _spill() once the lock is released.
+        """
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return []
+        return self._detach([key for key, session in self._sessions.items() if not session.busy][:excess])
+
+    def _detach(self, session_ids: List[str]) -> List[Any]:
+        """Take sessions out of the pool to spill them. Call with the lock held."""
+        detached = []
+        for session_id in session_ids:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._spilling[session_id] = threading.Event()
+                detached.append((session_id, session))
+        return detached
+
+    def _spill(self, session_id: str, session: _Session):
+        """Write a detached session to the store and release its Interactor. Call without the lock."""
+        try:
+            if self.store is not None and not self.shared:
+                try:
+                    self.store.save_session(session_id, session.interactor.export_state())
+                except Exception as e:
+                    log(f"[yellow]Could not store session {session_id}, its history is lost:[/yellow] {e}")
+            session.interactor.close()
+        finally:
+            with self._lock:
+                self._counts["spilled"] += 1
+                self._spilling.pop(session_id).set()
+
+    def spill(self, session_id: str) -> bool:
+        """Write a session to the store and release its Interactor now.
+
+        Args:
+            session_id: Session key.
+
+        Returns:
+            bool: False if the session is not in memory or is in use.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.busy:
+                return False
+            detached = self._detach([session_id])
+        for key, session in detached:
+            self._spill(key, session)
+        return True
+
+    def discard(self, session_id: Optional[str] = None):
+        """Forget a session entirely, in memory and in the store.
+
+        Args:
+            session_id: Session key. Defaults to DEFAULT_SESSION.
+        """
+        session_id = session_id or DEFAULT_SESSION
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.ready.wait()
+            if session.interactor is not None:
+                session.interactor.close()
+        if self.store is not None:
+            self.store.delete_session(session_id)
+
+    def reap(self) -> int:
+        """Spill every session idle for longer than idle_timeout.
+
+        Returns:
+            int: Number of sessions spilled.
+        """
+        if self.idle_timeout is None:
+            return 0
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            detached = self._detach([key for key, session in self._sessions.items() if not session.busy and session.last_used < cutoff])
+        for session_id, session in detached:
+            self._spill(session_id, session)
+        return len(detached)
+
+    def _reap_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.reap()
+            except Exception as e:
+                log(f"[yellow]Session reaper failed:[/yellow] {e}")
+
+    def close(self):
+        """Stop the reaper and spill every idle session to the store."""
+        self._stop.set()
+        with self._lock:
+            detached = self._detach([key for key, session in self._sessions.items() if not session.busy])
+        for session_id, session in detached:
+            self._spill(session_id, session)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool statistics.
+
+        Returns:
+            dict: Sessions in memory and busy, limits, whether the store is shared, and
+            created, rehydrated, spilled, refreshed and saved counts. Refreshed counts
+            reloads of sessions another process changed; saved counts shared writes.
+        """
+        with self._lock:
+            return {
+                "active": len(self._sessions),
+                "busy": sum(1 for session in self._sessions.values() if session.busy),
+                "max_sessions": self.max_sessions,
+                "idle_timeout": self.idle_timeout,
+                "shared": self.shared,
+                **self._counts
+            }
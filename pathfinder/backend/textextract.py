@@ -13,29 +13,133 @@ import re
 import os
 import subprocess
 import string
-import magic
 import hashlib
-import pytesseract
-import requests 
-import pandas as pd
-import speech_recognition as sr
-import fitz
 
-from bs4 import BeautifulSoup
 from collections import Counter
-from docx import Document
 from datetime import datetime
-from mss import mss
 from urllib.parse import urlparse
 from io import StringIO
-from PIL import Image
-from pydub import AudioSegment
+from typing import Callable, Dict
 from rich.console import Console
 
+# Format backends (magic, pandas, pytesseract, speech_recognition, fitz, docx,
+# mss, PIL, pydub, requests, bs4) are imported inside the functions that use
+# them, so importing this module stays cheap and a process only pays for the
+# formats it actually extracts.
+
 console = Console()
 print = console.print
 log = console.log
 
+TEXT_MIME_TYPES = {
+    # ─── Programming Languages ───
+    "application/x-python-code",
+    "application/x-java-source",
+    "application/x-c",
+    "application/x-c++",
+    "application/x-rust",
+    "application/x-go",
+    "application/x-haskell",
+    "application/x-kotlin",
+    "application/x-scala",
+    "application/x-lua",
+    "application/x-swift",
+
+    # ─── Web and Scripting ───
+    "application/javascript",
+    "application/x-javascript",
+    "application/x-httpd-php",
+    "application/x-perl",
+    "application/x-ruby",
+    "application/x-sh",
+    "application/x-shellscript",
+
+    # ─── Config/Markup/Data ───
+    "application/json",
+    "application/xml",
+    "application/x-yaml",
+    "application/x-toml",
+    "application/x-properties",
+    "application/x-ini",
+    "application/x-config",
+    "application/x-env",
+
+    # ─── SQL and Structured Data ───
+    "application/sql",
+    "application/x-sql",
+    "application/x-csv",
+    "application/x-turtle",
+    "application/sparql-query",
+
+    # ─── Lightweight Markup ───
+    "application/x-latex",
+    "application/x-tex",
+    "application/x-markdown",
+    "application/x-restructuredtext",
+
+    # ─── Certs and Keys ───
+    "application/x-pem-file",
+    "application/pem-certificate-chain",
+    "application/x-pkcs7-certificates",
+
+    # ─── Miscellaneous ───
+    "application/x-subrip",
+    "application/x-readme",
+    "application/x-crontab",
+}
+
+# Format handler registry: exact MIME types and MIME type prefixes mapped to
+# the function that extracts their text.
+FORMAT_HANDLERS: Dict[str, Callable[[str], str]] = {}
+PREFIX_HANDLERS: Dict[str, Callable[[str], str]] = {}
+
+def register_format(*mime_types, prefix=False):
+    """
+    Register a text extraction handler for one or more MIME types.
+
+    Args:
+        *mime_types (str): Exact MIME types, or MIME type prefixes such as 'image/' if prefix is True.
+        prefix (bool): Match the MIME types as prefixes.
+
+    Returns:
+        Callable: Decorator registering the handler and returning it unchanged.
+    """
+    def decorator(handler):
+        registry = PREFIX_HANDLERS if prefix else FORMAT_HANDLERS
+        for mime_type in mime_types:
+            registry[mime_type] = handler
+        return handler
+    return decorator
+
+def get_format_handler(mime_type):
+    """
+    Find the handler for a MIME type.
+
+    Exact registrations win over prefixes, and longer prefixes over shorter
+    ones. Unknown types go to text_from_other.
+
+    Args:
+        mime_type (str): The file's MIME type.
+
+    Returns:
+        Callable: Function taking a file path and returning the extracted text.
+    """
+    handler = FORMAT_HANDLERS.get(mime_type)
+    if handler:
+        return handler
+    for prefix in sorted(PREFIX_HANDLERS, key=len, reverse=True):
+        if mime_type.startswith(prefix):
+            return PREFIX_HANDLERS[prefix]
+    return text_from_other
+
+def mime_type_of(file_path):
+    """
+    Detect the MIME type of a file with libmagic.
+    """
+    import magic
+
+    return magic.from_file(file_path, mime=True)
+
 def clean_path(path):
     path = os.path.expanduser(path)
     path = os.path.abspath(path)
@@ -48,6 +152,9 @@ def clean_path(path):
 def get_screenshot():
     ''' Take screenshot and return text object for all text found in the image '''
     # Screenshot storage path
+    from mss import mss
+    from PIL import Image
+
     path = r'/tmp/sym_screenshot.png'
 
     with mss() as sct:
@@ -93,6 +200,9 @@ def text_from_url(url):
     Returns:
         str: Extracted plain text from the web page.
     """
+    import requests
+    from bs4 import BeautifulSoup
+
     try:
         response = requests.get(url, timeout=10)
         response.raise_for_status()
@@ -145,65 +255,10 @@ def extract_text(file_path):
         '# Page 1\\nContent here...'
         >>> extract_text("invalid_file.txt")
         None  # Logs "Error reading invalid_file.txt: [error]"
-    """
-    TEXT_MIME_TYPES = {
-        # ─── Programming Languages ───
-        "application/x-python-code",
-        "application/x-java-source",
-        "application/x-c",
-        "application/x-c++",
-        "application/x-rust",
-        "application/x-go",
-        "application/x-haskell",
-        "application/x-kotlin",
-        "application/x-scala",
-        "application/x-lua",
-        "application/x-swift",
-
-        # ─── Web and Scripting ───
-        "application/javascript",
-        "application/x-javascript",
-        "application/x-httpd-php",
-        "application/x-perl",
-        "application/x-ruby",
-        "application/x-sh",
-        "application/x-shellscript",
-
-        # ─── Config/Markup/Data ───
-        "application/json",
-        "application/xml",
-        "application/x-yaml",
-        "application/x-toml",
-        "application/x-properties",
-        "application/x-ini",
-        "application/x-config",
-        "application/x-env",
-
-        # ─── SQL and Structured Data ───
-        "application/sql",
-        "application/x-sql",
-        "application/x-csv",
-        "application/x-turtle",
-        "application/sparql-query",
-
-        # ─── Lightweight Markup ───
-        "application/x-latex",
-        "application/x-tex",
-        "application/x-markdown",
-        "application/x-restructuredtext",
-
-        # ─── Certs and Keys ───
-        "application/x-pem-file",
-        "application/pem-certificate-chain",
-        "application/x-pkcs7-certificates",
-
-        # ─── Miscellaneous ───
-        "application/x-subrip",
-        "application/x-readme",
-        "application/x-crontab",
-    }
-
 
+    Handlers are looked up in the format registry (see register_format), and
+    each handler imports its backend library on first use.
+    """
     file_path = clean_path(file_path)
     if not file_path: 
         print(f"No such file: {file_path}")
@@ -212,33 +267,9 @@ def extract_text(file_path):
     print(f"[cyan]Extracting text from:[/cyan] {file_path}")
 
     file_path = clean_path(file_path)
-    mime_type = magic.from_file(file_path, mime=True)
+    mime_type = mime_type_of(file_path)
     try:
-        content = "" 
-        if mime_type.startswith('text/') or mime_type in TEXT_MIME_TYPES:
-            with open(file_path, 'r') as f:
-                content = f.read()
-
-        elif mime_type in ['application/vnd.ms-excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']:
-            content = text_from_excel(file_path)
-
-        elif mime_type == 'application/pdf':
-            content = text_from_pdf(file_path)
-
-        elif mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-            content = text_from_docx(file_path)
-
-        elif mime_type == 'application/msword':
-            content = text_from_doc(file_path)
-
-        elif mime_type.startswith('image/'):
-            content = text_from_image(file_path)
-
-        elif mime_type.startswith('audio/'):
-            content = text_from_audio(file_path)
-        
-        else:
-            content = text_from_other(file_path)
+        content = get_format_handler(mime_type)(file_path)
 
         if content is not None and len(content) > 0:
             content = content.encode('utf-8').decode('utf-8', errors='ignore')
@@ -252,7 +283,20 @@ def extract_text(file_path):
         print(f"Error reading {file_path}: {e}")
         return None
 
+@register_format(*TEXT_MIME_TYPES)
+@register_format('text/', prefix=True)
+def text_from_file(file_path):
+    """
+    Reads a plain text file.
+    """
+    with open(file_path, 'r') as f:
+        return f.read()
+
+@register_format('audio/', prefix=True)
 def text_from_audio(audio_file):
+    import speech_recognition as sr
+    from pydub import AudioSegment
+
     text = ""
 
     def audio_to_wav(file_path):
@@ -287,6 +331,8 @@ def text_from_audio(audio_file):
     return text
 
 def downloadImage(url):
+    import requests
+
     if is_image(url):
         filename = os.path.basename(urlparse(url).path)
         save_path = os.path.join('/tmp/', filename)
@@ -305,17 +351,20 @@ def downloadImage(url):
 
 def is_image(file_path_or_url):
     try:
-        mime = magic.from_file(file_path_or_url, mime=True)
+        mime = mime_type_of(file_path_or_url)
         if mime.startswith("image/"):
             return True
     except Exception as e:
         return False
 
+@register_format('application/pdf')
 def text_from_pdf(pdf_path):
     """
     Extracts plain text from a PDF using PyMuPDF (fitz),
     including metadata and OCR for images.
     """
+    import fitz
+
     plain_text = ""
 
     try:
@@ -364,6 +413,7 @@ def text_from_pdf(pdf_path):
 
     return plain_text
 
+@register_format('application/msword')
 def text_from_doc(filepath, min_length=4):
     def extract_printable_strings(binary_data):
         pattern = re.compile(b'[' + re.escape(bytes(string.printable, 'ascii')) + b']{%d,}' % min_length)
@@ -444,10 +494,13 @@ def text_from_doc(filepath, min_length=4):
     return "\n".join(output)
 
 
+@register_format('application/vnd.openxmlformats-officedocument.wordprocessingml.document')
 def text_from_docx(file_path):
     """
     Extracts plain text from a Word (.docx) file, including text, tables, and images with OCR.
     """
+    from docx import Document
+
     file_path = clean_path(file_path)
     doc = Document(file_path)
     plain_text = ""
@@ -494,10 +547,13 @@ def text_from_docx(file_path):
 
     return plain_text
 
+@register_format('application/vnd.ms-excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 def text_from_excel(file_path):
     """
     Converts an Excel file to CSV format.
     """
+    import pandas as pd
+
     file_path = clean_path(file_path)
     csv_content = ""
     try:
@@ -510,10 +566,14 @@ def text_from_excel(file_path):
 
     return csv_content
 
+@register_format('image/', prefix=True)
 def text_from_image(file_path):
     """
     Extracts plain text from an image using OCR.
     """
+    import pytesseract
+    from PIL import Image
+
     file_path = clean_path(file_path)
     try:
         with Image.open(file_path) as img:
@@ -540,7 +600,7 @@ def text_from_other(file_path):
         "Creation Time": str(creation_time),
         "Modification Time": str(modified_time),
         "Permissions": oct(file_stats.st_mode & 0o777),
-        "MIME Type": str(magic.from_file(file_path, mime=True)),
+        "MIME Type": str(mime_type_of(file_path)),
         "Hashes": {},
         "Readable Strings": [],
         "Magic Numbers": None,
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: token_registry.py
+# Author: Wadih Khairallah
+# Description: Process-wide registry of tiktoken encodings shared
+#              across Interactor instances, with background preload
+# Created: 2025-04-18 13:05:52
+# Modified: 2025-04-18 13:05:52
+
+import threading
+import tiktoken
+from typing import Dict, Iterable, Optional, Tuple
+
+FALLBACK_ENCODING = "cl100k_base"
+
+_encodings: Dict[str, "tiktoken.Encoding"] = {}
+_model_encodings: Dict[Tuple[str, str], str] = {}
+_lock = threading.Lock()
+_load_locks: Dict[str, threading.Lock] = {}
+
+
+def _encoding_name(provider: str, model: str) -> str:
+    """Resolve the encoding name used for a provider and model.
+
+    Args:
+        provider: Provider name (e.g., 'openai').
+        model: Model name without the provider prefix.
+
+    Returns:
+        str: The tiktoken encoding name.
+    """
+    key = (provider, model)
+    name = _model_encodings.get(key)
+    if name is None:
+        name = FALLBACK_ENCODING
+        if provider == "openai":
+            try:
+                name = tiktoken.model.encoding_name_for_model(model)
+            except Exception:
+                pass
+        _model_encodings[key] = name
+    return name
+
+
+def _load(name: str) -> "tiktoken.Encoding":
+    """Load an encoding by name exactly once per process.
+
+    Args:
+        name: The tiktoken encoding name.
+
+    Returns:
+        tiktoken.Encoding: The shared encoding instance.
+    """
+    encoding = _encodings.get(name)
+    if encoding is not None:
+        return encoding
+
+    with _lock:
+        load_lock = _load_locks.setdefault(name, threading.Lock())
+
+    # Loading the BPE ranks is slow; hold a per-name lock so concurrent callers
+    # wait for the first load instead of repeating it.
+    with load_lock:
+        encoding = _encodings.get(name)
+        if encoding is None:
+            try:
+                encoding = tiktoken.get_encoding(name)
+            except Exception:
+                if name == FALLBACK_ENCODING:
+                    raise
+                encoding = _load(FALLBACK_ENCODING)
+            _encodings[name] = encoding
+        return encoding
+
+
+def get_encoding(provider: str, model: str) -> "tiktoken.Encoding":
+    """Get the shared encoding for a provider and model.
+
+    OpenAI models use their model-specific encoding; every other provider, and any
+    OpenAI model tiktoken does not know, falls back to cl100k_base.
+
+    Args:
+        provider: Provider name (e.g., 'openai').
+        model: Model name without the provider prefix.
+
+    Returns:
+        tiktoken.Encoding: The shared encoding instance.
+    """
+    return _load(_encoding_name(provider, model))
+
+
+def preload(
+    models: Optional[Iterable[str]] = None,
+    background: bool = True
+) -> Optional[threading.Thread]:
+    """Load encodings ahead of the first request.
+
+    Args:
+        models: Model identifiers in "provider:model_name" format. The fallback
+            encoding is always loaded.
+        background: If True, loads on a daemon thread and returns it immediately.
+
+    Returns:
+        threading.Thread: The preload thread when background is True, otherwise None.
+    """
+    def run():
+        _load(FALLBACK_ENCODING)
+        for model in models or []:
+            provider, _, model_name = model.partition(":")
+            try:
+                get_encoding(provider, model_name)
+            except Exception:
+                pass
+
+    if not background:
+        run()
+        return None
+
+    thread = threading.Thread(target=run, name="tokenizer-preload", daemon=True)
+    thread.start()
+    return thread
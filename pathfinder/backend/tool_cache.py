@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: tool_cache.py
+# Author: Wadih Khairallah
+# Description: TTL/LRU cache for tool call results with
+#              coalescing of identical in-flight calls
+# Created: 2025-04-18 17:48:30
+# Modified: 2025-04-18 17:48:30
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Optional
+
+try:
+    from .cancellation import current_token
+except ImportError:
+    from cancellation import current_token
+
+# Tools with side effects are never cached or coalesced unless re-enabled explicitly.
+DEFAULT_EXCLUDED_TOOLS = ("run_bash_command", "run_python_code", "create_qr_code")
+
+# Handed to coalesced waiters when the call they waited on was cancelled by its
+# own interaction; each waiter then looks the key up again and may run it itself.
+_RESTART = object()
+
+
+def is_cacheable_result(result: Any) -> bool:
+    """Decide whether a tool result may be cached.
+
+    Tools in this project report failures in their return value rather than by
+    raising, so results shaped like {"status": "error"} or {"success": False}
+    are treated as transient and not cached.
+
+    Args:
+        result: The value returned by the tool.
+
+    Returns:
+        bool: True if the result can be stored.
+    """
+    if isinstance(result, dict):
+        if result.get("status") in ("error", "cancelled"):
+            return False
+        if result.get("success") is False:
+            return False
+    return True
+
+
+class ToolResultCache:
+    """Shared cache for tool results keyed on tool name and canonical JSON arguments.
+
+    A single instance can be handed to any number of Interactors, so the same
+    search_google(query) from two conversations runs once. Entries expire after
+    a per-tool TTL and the least recently used entry is dropped once max_entries
+    is reached. While a call is running, identical calls wait for its result
+    instead of starting a duplicate.
+
+    A call whose interaction is cancelled while it runs belongs to that
+    interaction alone: its outcome is neither stored nor handed to waiters from
+    other conversations, which start the call again instead.
+    """
+
+    def __init__(
+        self,
+        default_ttl: float = 300,
+        max_entries: int = 512,
+        ttls: Optional[Dict[str, float]] = None,
+        exclude: Iterable[str] = DEFAULT_EXCLUDED_TOOLS,
+        cacheable: Callable[[Any], bool] = is_cacheable_result
+    ):
+        """Initialize the cache.
+
+        Args:
+            default_ttl: Seconds a result stays valid for tools without their own TTL.
+            max_entries: Maximum number of results kept before LRU eviction.
+            ttls: Optional per-tool TTLs in seconds, keyed by tool name.
+            exclude: Tool names that always run directly, e.g. side-effecting tools.
+            cacheable: Predicate deciding whether a result may be stored.
+        """
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.ttls = dict(ttls or {})
+        self.excluded = set(exclude)
+        self.cacheable = cacheable
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "evictions": 0, "restarted": 0}
+
+    def configure(self, name: str, ttl: Optional[float] = None, enabled: bool = True):
+        """Set the TTL of a tool or opt it in or out of caching.
+
+        Args:
+            name: Tool name.
+            ttl: Seconds a result of this tool stays valid. None keeps the current setting.
+            enabled: If False, calls to this tool always run directly.
+        """
+        with self._lock:
+            if ttl is not None:
+                self.ttls[name] = ttl
+            if enabled:
+                self.excluded.discard(name)
+            else:
+                self.excluded.add(name)
+                for key in [k for k in self._entries if k.startswith(f"{name}:")]:
+                    del self._entries[key]
+
+    @staticmethod
+    def make_key(name: str, arguments: Dict[str, Any]) -> str:
+        """Build the cache key for a tool call.
+
+        Args:
+            name: Tool name.
+            arguments: Decoded tool arguments.
+
+        Returns:
+            str: The tool name followed by the arguments as sorted, compact JSON.
+        """
+        return f"{name}:{json.dumps(arguments, sort_keys=True, separators=(',', ':'), default=str)}"
+
+    def _lookup(self, key: str) -> tuple:
+        """Find a fresh entry or an in-flight call, or register a new one.
+
+        Must be called with the lock held.
+
+        Returns:
+            tuple: ("hit", result), ("wait", future) or ("run", future).
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, result = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return "hit", result
+            del self._entries[key]
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self._stats["coalesced"] += 1
+            return "wait", future
+
+        self._stats["misses"] += 1
+        future = Future()
+        self._inflight[key] = future
+        return "run", future
+
+    def _finish(self, name: str, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        """Publish the outcome of a call to waiters and store cacheable results.
+
+        Must be called from the context that ran the call, so a cancellation of
+        the owner's interaction is seen through current_token().
+        """
+        token = current_token()
+        if token is not None and token.cancelled:
+            # Partial or cancelled output of one interaction; let the waiters rerun it.
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._stats["restarted"] += 1
+            future.set_result(_RESTART)
+            return
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is None and self.cacheable(result):
+                ttl = self.ttls.get(name, self.default_ttl)
+                if ttl > 0:
+                    self._entries[key] = (time.monotonic() + ttl, result)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self._stats["evictions"] += 1
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def call(self, name: str, arguments: Dict[str, Any], func: Callable[..., Any]) -> Any:
+        """Run a tool through the cache.
+
+        Args:
+            name: Tool name.
+            arguments: Decoded tool arguments.
+            func: The tool callable, invoked as func(**arguments) on a miss.
+
+        Returns:
+            The cached, shared or freshly computed result.
+        """
+        if name in self.excluded:
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return func(**arguments)
+
+        key = self.make_key(name, arguments)
+        while True:
+            with self._lock:
+                action, value = self._lookup(key)
+            if action == "hit":
+                return value
+            if action == "run":
+                break
+            result = value.result()
+            if result is not _RESTART:
+                return result
+
+        try:
+            result = func(**arguments)
+        except BaseException as e:
+            self._finish(name, key, value, error=e)
+            raise
+        self._finish(name, key, value, result)
+        return result
+
+    async def acall(self, name: str, arguments: Dict[str, Any], func: Callable[..., Any]) -> Any:
+        """Run a coroutine tool through the cache.
+
+        Shares entries and in-flight calls with call(), so sync and async callers
+        coalesce with each other.
+
+        Args:
+            name: Tool name.
+            arguments: Decoded tool arguments.
+            func: The coroutine function, awaited as func(**arguments) on a miss.
+
+        Returns:
+            The cached, shared or freshly computed result.
+        """
+        if name in self.excluded:
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return await func(**arguments)
+
+        key = self.make_key(name, arguments)
+        while True:
+            with self._lock:
+                action, value = self._lookup(key)
+            if action == "hit":
+                return value
+            if action == "run":
+                break
+            result = await asyncio.wrap_future(value)
+            if result is not _RESTART:
+                return result
+
+        try:
+            result = await func(**arguments)
+        except BaseException as e:
+            self._finish(name, key, value, error=e)
+            raise
+        self._finish(name, key, value, result)
+        return result
+
+    def invalidate(self, name: Optional[str] = None) -> int:
+        """Drop cached results.
+
+        Args:
+            name: Only drop results of this tool. If None, drops everything.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        with self._lock:
+            if name is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            keys = [k for k in self._entries if k.startswith(f"{name}:")]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit, miss and coalescing counters.
+
+        Returns:
+            dict: Counters plus the current entry and in-flight counts and the hit rate.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["inflight"] = len(self._inflight)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: tool_selection.py
+# Author: Wadih Khairallah
+# Description: Lexical relevance ranking of registered tool schemas
+#              so each request only carries the tools it may need
+# Created: 2025-04-23 09:41:18
+# Modified: 2025-04-23 09:41:18
+
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    from .result_shaping import bm25_scores
+except ImportError:
+    from result_shaping import bm25_scores
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("ing", "ers", "ies", "ed", "er", "es", "s")
+
+# Words that appear in every generated schema and say nothing about the tool.
+_SCHEMA_WORDS = {"parameter", "the", "and", "for", "with", "from", "this", "that", "returns", "return"}
+
+
+def _stem(word: str) -> str:
+    """Strip a common English suffix so 'searching' and 'search' match."""
+    for suffix in _SUFFIXES:
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def _terms(text: str) -> List[str]:
+    return [_stem(word) for word in _WORD.findall(text.lower().replace("_", " ")) if len(word) > 2]
+
+
+class ToolSelector:
+    """Picks the registered tools worth sending with a request.
+
+    Each tool schema is scored with BM25 against the user's message, plus the
+    recent conversation at half weight. The top_k best matches are sent, along
+    with every tool already used in the conversation and the tools listed in
+    always. If no tool matches at all there is nothing to rank on, and every
+    tool is sent. Scoring is local and needs no network.
+    """
+
+    def __init__(
+        self,
+        top_k: int = 4,
+        history_messages: int = 4,
+        always: Optional[Iterable[str]] = None,
+        context_weight: float = 0.5
+    ):
+        """Initialize the selector.
+
+        Args:
+            top_k: Number of best-matching tools sent per request.
+            history_messages: Number of recent user and assistant messages scored with the user's message.
+            always: Names of tools that are sent with every request.
+            context_weight: Weight of the recent conversation relative to the user's message.
+        """
+        self.top_k = max(1, top_k)
+        self.history_messages = history_messages
+        self.always = set(always or ())
+        self.context_weight = context_weight
+        self._documents: Dict[str, List[str]] = {}
+
+    def _document(self, tool: Dict[str, Any]) -> List[str]:
+        """Get the terms describing a tool: its name twice, description and parameter names."""
+        function = tool["function"]
+        key = repr(function)
+        document = self._documents.get(key)
+        if document is None:
+            name = _terms(function["name"])
+            properties = function.get("parameters", {}).get("properties", {})
+            parameters = []
+            for parameter, spec in properties.items():
+                parameters += _terms(parameter)
+                description = spec.get("description", "")
+                if description != f"{parameter} parameter":
+                    parameters += _terms(description)
+            document = [
+                term for term in name * 2 + _terms(function.get("description", "")) + parameters
+                if term not in _SCHEMA_WORDS
+            ]
+            self._documents[key] = document
+        return document
+
+    def scores(self, tools: List[Dict[str, Any]], query: str, context: Iterable[str] = ()) -> Dict[str, float]:
+        """Score tools against a query and its conversation context.
+
+        Args:
+            tools: Tool schemas in the chat completions format.
+            query: The user's message.
+            context: Recent message texts.
+
+        Returns:
+            dict: Score keyed by tool name.
+        """
+        documents = [self._document(tool) for tool in tools]
+        query_scores = bm25_scores(documents, _terms(query))
+        context_scores = bm25_scores(documents, _terms(" ".join(context)))
+        return {
+            tool["function"]["name"]: score + self.context_weight * context_score
+            for tool, score, context_score in zip(tools, query_scores, context_scores)
+        }
+
+    def select(
+        self,
+        tools: List[Dict[str, Any]],
+        query: str,
+        context: Iterable[str] = (),
+        used: Iterable[str] = ()
+    ) -> List[Dict[str, Any]]:
+        """Select the tools to send with a request.
+
+        Args:
+            tools: Registered tool schemas in the chat completions format.
+            query: The user's message.
+            context: Recent message texts.
+            used: Names of tools already called in the conversation.
+
+        Returns:
+            list: The selected schemas in registration order, so the tool list of
+            consecutive requests stays stable for provider prompt caching.
+        """
+        if len(tools) <= self.top_k:
+            return list(tools)
+
+        scores = self.scores(tools, query, context)
+        if not any(scores.values()):
+            return list(tools)
+
+        ranked = sorted((name for name, score in scores.items() if score > 0), key=lambda name: -scores[name])
+        keep = set(ranked[:self.top_k]) | self.always | set(used)
+        return [tool for tool in tools if tool["function"]["name"] in keep]
@@ -3,30 +3,229 @@
 #
 # File: __init__.py
 # Author: Wadih Khairallah
-# Description: 
+# Description: Lazy tool registry backed by a manifest of tool
+#              names, descriptions and parameter schemas
 # Created: 2025-04-08 13:17:46
-# Modified: 2025-04-08 13:23:54
+# Modified: 2025-04-22 09:12:40
 
-import os
+import ast
+import hashlib
 import importlib
+import json
 import pathlib
+import threading
 
 # Directory containing this __init__.py
 current_dir = pathlib.Path(__file__).parent
 
-# Loop over each .py file (except __init__.py)
-for path in current_dir.glob("*.py"):
+# Precomputed tool metadata. Entries whose source hash no longer matches are
+# rebuilt from the module's syntax tree, without importing it.
+MANIFEST_PATH = current_dir / "manifest.json"
+
+_lock = threading.Lock()
+_manifest = None
+_tools = {}
+
+
+def _annotation_type(annotation) -> str:
+    """Map a parameter annotation to a JSON schema type the same way Interactor.add_function does."""
+    if annotation is None:
+        return "string"
+    name = ast.unparse(annotation)
+    return (
+        "number" if name in ("float", "int") else
+        "string" if name == "str" else
+        "boolean" if name == "bool" else
+        "array" if name == "list" else
+        "object"
+    )
+
+
+def _describe(path: pathlib.Path, source: bytes):
+    """Build the manifest entry of a tool module from its source.
+
+    A module is a tool if it defines a top-level function named like the module
+    (search_google.py -> search_google()).
+
+    Returns:
+        dict: The manifest entry, or None if the module defines no such function.
+    """
     module_name = path.stem
-    if module_name == "__init__":
-        continue
+    tree = ast.parse(source, filename=str(path))
+    node = next(
+        (
+            item for item in tree.body
+            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name == module_name
+        ),
+        None
+    )
+    if node is None:
+        return None
+
+    args = node.args.posonlyargs + node.args.args + node.args.kwonlyargs
+    positional = node.args.posonlyargs + node.args.args
+    defaults = len(node.args.defaults)
+    required = [arg.arg for arg in positional[:len(positional) - defaults]]
+    required += [
+        arg.arg for arg, default in zip(node.args.kwonlyargs, node.args.kw_defaults)
+        if default is None
+    ]
+
+    return {
+        "module": module_name,
+        "sha256": hashlib.sha256(source).hexdigest(),
+        "coroutine": isinstance(node, ast.AsyncFunctionDef),
+        "description": (ast.get_docstring(node) or "No description provided.").split("\n")[0],
+        "parameters": {
+            "type": "object",
+            "properties": {
+                arg.arg: {"type": _annotation_type(arg.annotation), "description": f"{arg.arg} parameter"}
+                for arg in args
+            },
+            "required": required
+        }
+    }
+
+
+def _load_manifest() -> dict:
+    """Read the manifest and refresh entries for new or changed tool modules.
+
+    Must be called with the lock held.
+    """
+    global _manifest
+    if _manifest is not None:
+        return _manifest
+
+    try:
+        stored = json.loads(MANIFEST_PATH.read_text())
+    except (OSError, ValueError):
+        stored = {}
+
+    manifest = {}
+    for path in sorted(current_dir.glob("*.py")):
+        if path.stem.startswith("_"):
+            continue
+        source = path.read_bytes()
+        entry = stored.get(path.stem)
+        if not entry or entry.get("sha256") != hashlib.sha256(source).hexdigest():
+            entry = _describe(path, source)
+        if entry:
+            manifest[path.stem] = entry
+
+    _manifest = manifest
+    return _manifest
+
+
+def build_manifest(path=None) -> dict:
+    """Rebuild the manifest from the tool sources and write it to disk.
+
+    Run after adding or changing a tool:
+        python -c "from pathfinder.backend.tools import build_manifest; build_manifest()"
+
+    Args:
+        path: Where to write the manifest. Defaults to MANIFEST_PATH.
+
+    Returns:
+        dict: The manifest, keyed by tool name.
+    """
+    global _manifest
+    with _lock:
+        _manifest = None
+        manifest = _load_manifest()
+    pathlib.Path(path or MANIFEST_PATH).write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    return manifest
+
+
+class LazyTool:
+    """Callable stand-in for a tool that imports its module on the first call.
+
+    Carries the tool's name, description and parameter schema from the manifest
+    in tool_schema, which Interactor.add_function uses instead of inspecting the
+    function, so registering a tool never imports it.
+    """
+
+    def __init__(self, name: str, entry: dict):
+        self.__name__ = name
+        self.__doc__ = entry["description"]
+        self.module = entry["module"]
+        self.coroutine = entry["coroutine"]
+        self.tool_schema = {"name": name, "description": entry["description"], "parameters": entry["parameters"]}
+        self._func = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the tool's module has been imported."""
+        return self._func is not None
+
+    def load(self):
+        """Import the tool's module and return the real function.
+
+        Returns:
+            Callable: The tool function.
+        """
+        if self._func is None:
+            with self._lock:
+                if self._func is None:
+                    module = importlib.import_module(f".{self.module}", package=__name__)
+                    self._func = getattr(module, self.__name__)
+                    # The import binds the submodule to the package under the tool's
+                    # name, shadowing __getattr__; put the callable tool back.
+                    globals()[self.__name__] = self
+        return self._func
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyTool {self.__name__} ({state})>"
+
+
+def available_tools() -> dict:
+    """Get the metadata of every tool without importing any of them.
+
+    Returns:
+        dict: Name, description and parameter schema keyed by tool name.
+    """
+    with _lock:
+        manifest = _load_manifest()
+    return {name: LazyTool(name, entry).tool_schema for name, entry in manifest.items()}
+
+
+def get_tool(name: str) -> LazyTool:
+    """Get the lazy callable for a tool.
+
+    Args:
+        name: Tool name, the same as its module name.
+
+    Returns:
+        LazyTool: The tool, imported on its first call.
+
+    Raises:
+        KeyError: If no such tool exists.
+    """
+    with _lock:
+        tool = _tools.get(name)
+        if tool is None:
+            entry = _load_manifest().get(name)
+            if entry is None:
+                raise KeyError(f"Unknown tool: {name}")
+            tool = _tools[name] = LazyTool(name, entry)
+        return tool
 
-    # Import the module (like tools.search_google)
-    module = importlib.import_module(f".{module_name}", package=__name__)
 
-    # Get the function with the same name as the module (search_google.py -> search_google())
-    func = getattr(module, module_name, None)
+def __getattr__(name: str):
+    # Keeps 'from .tools import search_google' working without importing the module.
+    if name.startswith("_"):
+        raise AttributeError(name)
+    try:
+        return get_tool(name)
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
 
-    if callable(func):
-        # Inject it into the tools namespace as just search_google
-        globals()[module_name] = func
 
+def __dir__():
+    with _lock:
+        names = list(_load_manifest())
+    return sorted(set(globals()) | set(names))
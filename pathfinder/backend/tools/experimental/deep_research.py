@@ -13,7 +13,8 @@ import json
 import re
 from rich.console import Console
 from rich.rule import Rule
-from interactor import Interactor
+from async_interactor import AsyncInteractor
+from response_cache import ResponseCache
 from functions import google_search
 
 console = Console()
@@ -23,7 +24,8 @@ cache = {}
 
 async def async_interact(llm, prompt, cache_key=None, **kwargs):
     """
-    Asynchronous wrapper for llm.interact() using asyncio.to_thread.
+    Asynchronous wrapper for llm.interact(). AsyncInteractor calls are awaited
+    directly; a plain Interactor falls back to asyncio.to_thread.
     Returns a cached result if available.
     """
     key = cache_key if cache_key is not None else prompt
@@ -31,7 +33,10 @@ async def async_interact(llm, prompt, cache_key=None, **kwargs):
         console.print(f"[blue]Using cached result for prompt:[/blue] {key}")
         return cache[key]
     try:
-        result = await asyncio.to_thread(llm.interact, prompt, **kwargs)
+        if isinstance(llm, AsyncInteractor):
+            result = await llm.interact(prompt, **kwargs)
+        else:
+            result = await asyncio.to_thread(llm.interact, prompt, **kwargs)
         cache[key] = result
         return result
     except Exception as e:
@@ -113,7 +118,7 @@ async def deep_research(query):
     # Instantiate our LLM interactor. (Change model as needed.)
     #llm = Interactor(model="ollama:mistral-nemo")
     #llm = Interactor(model="openai:gpt-4o-mini", tools=True)
-    llm = Interactor(model="openai:gpt-4o-mini-search-preview", tools=False)
+    llm = AsyncInteractor(model="openai:gpt-4o-mini-search-preview", tools=False, response_cache=ResponseCache())
     #llm.add_function(google_search)
     
     console.print("[bold]Starting Deep Research...[/bold]")
@@ -20,6 +20,16 @@ from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from rich.console import Console
 
+try:
+    from ..cancellation import cancelled, on_cancel
+except ImportError:
+    # Run as a script, outside an interaction; there is nothing to cancel.
+    def on_cancel(callback):
+        return lambda: None
+
+    def cancelled():
+        return False
+
 console = Console()
 print = console.print
 
@@ -77,15 +87,21 @@ def get_website(url: str) -> Dict[str, str]:
             options=chrome_options
         )
 
-        driver.get(url)
+        # Quitting the browser when the interaction is cancelled makes the page load fail fast
+        release = on_cancel(driver.quit)
 
-        # Wait until body is present or timeout at 10 seconds
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.TAG_NAME, "body"))
-        )
+        try:
+            driver.get(url)
+
+            # Wait until body is present or timeout at 10 seconds
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.TAG_NAME, "body"))
+            )
 
-        html = driver.page_source
-        driver.quit()
+            html = driver.page_source
+        finally:
+            release()
+            driver.quit()
 
         soup = BeautifulSoup(html, 'html.parser')
         for element in soup(['script', 'style', 'nav', 'footer', 'header']):
@@ -101,6 +117,8 @@ def get_website(url: str) -> Dict[str, str]:
         }
 
     except Exception as e:
+        if cancelled():
+            return {"status": "cancelled", "url": url, "message": "Fetch cancelled"}
         return {
             "status": "error",
             "url": url,
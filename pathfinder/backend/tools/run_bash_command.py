@@ -14,6 +14,16 @@ from rich.prompt import Confirm
 from rich.syntax import Syntax
 from rich.rule import Rule
 
+try:
+    from ..cancellation import cancelled, on_cancel
+except ImportError:
+    # Run as a script, outside an interaction; there is nothing to cancel.
+    def on_cancel(callback):
+        return lambda: None
+
+    def cancelled():
+        return False
+
 console = Console()
 print = console.print
 log = console.log
@@ -69,6 +79,8 @@ def run_bash_command(command: str) -> dict:
             text=True,
             bufsize=1
         )
+        # Kill the command if the interaction is cancelled
+        release = on_cancel(process.kill)
 
         full_output = ""
         console.print(Rule())
@@ -88,8 +100,16 @@ def run_bash_command(command: str) -> dict:
                 break
 
         return_code = process.wait()
+        release()
         console.print(Rule())
 
+        if cancelled():
+            return {
+                "status": "cancelled",
+                "output": full_output.rstrip(),
+                "message": "Command killed because the interaction was cancelled."
+            }
+
         if return_code == 0:
             return {
                 "status": "success",
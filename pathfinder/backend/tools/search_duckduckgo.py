@@ -24,6 +24,16 @@ from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from rich.console import Console
 
+try:
+    from ..cancellation import cancelled, on_cancel
+except ImportError:
+    # Run as a script, outside an interaction; there is nothing to cancel.
+    def on_cancel(callback):
+        return lambda: None
+
+    def cancelled():
+        return False
+
 console = Console()
 print = console.print
 
@@ -86,12 +96,15 @@ def search_duckduckgo(
 
     console.print(f"[cyan]Searching DuckDuckGo:[/cyan] {query}")
     driver = None
+    release = lambda: None
 
     try:
         driver = webdriver.Chrome(
             service=Service(ChromeDriverManager().install()),
             options=chrome_options
         )
+        # Quitting the browser when the interaction is cancelled makes page loads fail fast
+        release = on_cancel(driver.quit)
 
         search_url = f"https://duckduckgo.com/?q={urlparse.quote_plus(query)}&ia=web"
         driver.get(search_url)
@@ -112,11 +125,16 @@ def search_duckduckgo(
 
         extracted_texts = []
         for url in urls:
+            if cancelled():
+                return {"status": "cancelled", "message": "Search cancelled", "urls": urls}
             console.print(f"  → [blue]{url}[/blue]")
             text = extract_text_from_url(url)
             extracted_texts.append(text)
             time.sleep(sleep_time)
 
+        if cancelled():
+            return {"status": "cancelled", "message": "Search cancelled", "urls": urls}
+
         return {
             "status": "success",
             "text": " ".join(extracted_texts),
@@ -125,6 +143,8 @@ def search_duckduckgo(
         }
 
     except Exception as e:
+        if cancelled():
+            return {"status": "cancelled", "message": "Search cancelled", "query": query}
         return {
             "status": "error",
             "error": f"Selenium DuckDuckGo search failed: {str(e)}",
@@ -132,6 +152,7 @@ def search_duckduckgo(
         }
 
     finally:
+        release()
         if driver:
             driver.quit()
 
@@ -26,6 +26,16 @@ from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 import asyncio
 
+try:
+    from ..cancellation import cancelled, on_cancel
+except ImportError:
+    # Run as a script, outside an interaction; there is nothing to cancel.
+    def on_cancel(callback):
+        return lambda: None
+
+    def cancelled():
+        return False
+
 console = Console()
 print = console.print
 
@@ -72,6 +82,7 @@ def search_google(query: str, num_results: int = 5) -> Dict[str, str]:
             return f"[PDF Error] {url}: {str(e)}"
 
     def extract_text_with_selenium_new_driver(url: str) -> str:
+        release = lambda: None
         try:
             chrome_options = Options()
             chrome_options.add_argument("--headless=new")
@@ -85,6 +96,8 @@ def search_google(query: str, num_results: int = 5) -> Dict[str, str]:
             )
 
             driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+            # Quitting the browser when the interaction is cancelled makes the page load fail fast
+            release = on_cancel(driver.quit)
             driver.get(url)
             WebDriverWait(driver, 10).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
@@ -98,6 +111,7 @@ def search_google(query: str, num_results: int = 5) -> Dict[str, str]:
             return f"[Selenium Error] {url}: {str(e)}"
         finally:
             try:
+                release()
                 driver.quit()
             except:
                 pass
@@ -146,6 +160,9 @@ def search_google(query: str, num_results: int = 5) -> Dict[str, str]:
             return results
 
         texts = asyncio.run(run_all_tasks())
+        if cancelled():
+            # The browsers were quit mid-load; their error strings are not search results.
+            return {"status": "cancelled", "message": "Search cancelled", "urls": urls}
 
         return {
             "status": "success",
@@ -28,6 +28,9 @@ class TranscriptManager:
     
     def _ensure_db_exists(self):
         """Ensure the database exists and has the correct schema"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
         db_exists = os.path.exists(self.db_path)
         
         with sqlite3.connect(self.db_path) as conn:
@@ -39,6 +42,7 @@ class TranscriptManager:
                 cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='transcripts'")
                 if not cursor.fetchone():
                     self._create_schema(conn)
+            self._create_session_table(conn)
     
     def _create_schema(self, conn: sqlite3.Connection):
         """Create the database schema
@@ -71,6 +75,21 @@ class TranscriptManager:
         
         conn.commit()
     
+    def _create_session_table(self, conn: sqlite3.Connection):
+        """Create the table holding the state of idle API sessions
+        
+        Args:
+            conn: SQLite database connection
+        """
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            last_modified TEXT NOT NULL
+        )
+        ''')
+        conn.commit()
+    
     def get_all_transcripts(self) -> List[Dict[str, Any]]:
         """Get all transcripts from the database
         
@@ -320,3 +339,44 @@ class TranscriptManager:
             conn.commit()
         
         return transcript 
+    
+    def save_session(self, session_id: str, state: Dict[str, Any]):
+        """Store the state of an idle API session so it can be restored later
+        
+        Args:
+            session_id: ID of the session
+            state: Session state from Interactor.export_state()
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, state, last_modified) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state), datetime.now().isoformat())
+            )
+            conn.commit()
+    
+    def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the stored state of an API session
+        
+        Args:
+            session_id: ID of the session
+            
+        Returns:
+            Session state or None if the session was never stored
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def delete_session(self, session_id: str) -> bool:
+        """Delete the stored state of an API session
+        
+        Args:
+            session_id: ID of the session
+            
+        Returns:
+            True if a stored state was deleted
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.commit()
+            return cursor.rowcount > 0
@@ -490,6 +490,7 @@ class ChatInterface {
                 message: userInput,
                 attachments: attachmentTexts,
                 stream: true,
+                format: 'ndjson',
                 tools: true
             };
             
@@ -510,6 +511,11 @@ class ChatInterface {
                 body: JSON.stringify(requestBody)
             });
             
+            if (response.status === 503) {
+                const retryAfter = response.headers.get('Retry-After');
+                throw new Error(`The server is busy. Please try again${retryAfter ? ` in ${retryAfter} seconds` : ' shortly'}.`);
+            }
+            
             if (!response.ok) {
                 throw new Error(`Server returned ${response.status}: ${response.statusText}`);
             }
@@ -517,6 +523,181 @@ class ChatInterface {
             const reader = response.body.getReader();
             const decoder = new TextDecoder();
             
+            // The response is NDJSON: one typed, sequence-numbered event per line
+            let buffer = '';
+            let lastSeq = -1;
+            const toolResults = [];
+            
+            const showLoadingText = (text) => {
+                if (wrapperDiv.contains(loadingDiv)) {
+                    loadingDiv.innerHTML = `
+                        <div class="loading-text">${text}</div>
+                        <div class="loading-dots">
+                            <span></span>
+                            <span></span>
+                            <span></span>
+                        </div>
+                    `;
+                }
+            };
+            
+            // Tool results are shown after the response, in the same text form the transcripts store
+            const formatToolResults = () => {
+                if (toolResults.length === 0) return '';
+                let text = '\n\n';
+                toolResults.forEach(result => {
+                    text += `Tool Results from ${result.tool_name}:\n`;
+                    text += result.truncated
+                        ? `${result.result}\n[truncated, ${result.size} bytes]`
+                        : JSON.stringify(result.result, null, 2);
+                    text += '\n\n';
+                });
+                return text;
+            };
+            
+            const appendText = (text) => {
+                accumulatedText += text;
+                
+                // If this is the first content chunk, remove the loading indicator
+                if (!hasStartedStreaming) {
+                    hasStartedStreaming = true;
+                    if (wrapperDiv.contains(loadingDiv)) {
+                        wrapperDiv.removeChild(loadingDiv);
+                    }
+                    wrapperDiv.appendChild(contentDiv);
+                    
+                    // Make sure timestamp is visible after removing loading indicator
+                    const existingTimestamp = wrapperDiv.querySelector('.message-timestamp');
+                    if (existingTimestamp) {
+                        // Move the timestamp to the end if it exists
+                        wrapperDiv.appendChild(existingTimestamp);
+                    }
+                }
+                
+                // Process the content to handle tool results
+                const parts = accumulatedText.split(/(Tool Results from [^:]+:)/);
+                let mainContent = '';
+                let toolResults = [];
+                
+                for (let i = 0; i < parts.length; i++) {
+                    if (i % 2 === 0) {
+                        mainContent += parts[i];
+                    } else {
+                        toolResults.push({
+                            header: parts[i],
+                            content: parts[i + 1] || ''
+                        });
+                        i++; // Skip the content part as we've already processed it
+                    }
+                }
+                
+                // Initialize markdown-it
+                const md = window.markdownit({
+                    html: false,
+                    linkify: true,
+                    typographer: true,
+                    highlight: function (str, lang) {
+                        if (lang && window.hljs && window.hljs.getLanguage(lang)) {
+                            try {
+                                return window.hljs.highlight(str, { language: lang }).value;
+                            } catch (__) {}
+                        }
+                        return ''; // Use external default escaping
+                    }
+                });
+                
+                // Add plugins if available
+                if (window.markdownitEmoji) md.use(window.markdownitEmoji);
+                if (window.markdownitTaskLists) md.use(window.markdownitTaskLists);
+                
+                // Update the main content in real-time
+                mainContentDiv.innerHTML = md.render(mainContent);
+                
+                // Handle tool results if any
+                if (toolResults.length > 0) {
+                    // Remove existing tool results if any
+                    const existingToggle = contentDiv.querySelector('.tool-results-toggle');
+                    const existingResults = contentDiv.querySelector('.tool-results-container');
+                    if (existingToggle) contentDiv.removeChild(existingToggle);
+                    if (existingResults) contentDiv.removeChild(existingResults);
+                    
+                    // Add new tool results
+                    const toggleLink = document.createElement('a');
+                    toggleLink.className = 'tool-results-toggle';
+                    toggleLink.textContent = `Tool Results (${toolResults.length})`;
+                    toggleLink.onclick = function(e) {
+                        e.preventDefault();
+                        const container = this.nextElementSibling;
+                        container.classList.toggle('expanded');
+                        this.classList.toggle('expanded');
+                    };
+                    contentDiv.appendChild(toggleLink);
+                    
+                    const resultsContainer = document.createElement('div');
+                    resultsContainer.className = 'tool-results-container';
+                    
+                    toolResults.forEach(result => {
+                        const resultDiv = document.createElement('div');
+                        resultDiv.className = 'tool-result';
+                        
+                        const content = document.createElement('textarea');
+                        content.className = 'tool-result-content';
+                        content.value = result.content;
+                        content.readOnly = true;
+                        content.rows = 8; // Initial height
+                        
+                        resultDiv.appendChild(content);
+                        resultsContainer.appendChild(resultDiv);
+                    });
+                    
+                    contentDiv.appendChild(resultsContainer);
+                }
+                
+                // Scroll to bottom after each update
+                this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
+            };
+            
+            const handleEvent = (event) => {
+                if (event.seq !== lastSeq + 1) {
+                    console.warn(`Stream event ${event.seq} arrived after ${lastSeq}`);
+                }
+                lastSeq = event.seq;
+                
+                switch (event.type) {
+                    case 'queue':
+                        // Show the queue position while the request waits for a worker
+                        showLoadingText(event.position > 0 ? `Queued (position ${event.position})` : 'Thinking');
+                        break;
+                    case 'token':
+                        appendText(event.text);
+                        break;
+                    case 'tool_started':
+                        toolCallInProgress = true;
+                        currentToolName = event.tool_name;
+                        showLoadingText(`Running ${currentToolName}`);
+                        break;
+                    case 'tool_progress':
+                        showLoadingText(`Running ${event.tool_name} (${Math.round(event.elapsed)}s)`);
+                        break;
+                    case 'tool_result':
+                        toolCallInProgress = false;
+                        currentToolName = '';
+                        toolResults.push(event);
+                        showLoadingText('Thinking');
+                        break;
+                    case 'error':
+                        throw new Error(event.message);
+                    case 'done':
+                        if (toolResults.length > 0) {
+                            appendText(formatToolResults());
+                        }
+                        break;
+                    default:
+                        // usage and any event types added later need no display
+                        break;
+                }
+            };
+            
             while (true) {
                 const { done, value } = await reader.read();
                 
@@ -583,154 +764,15 @@ class ChatInterface {
                     break;
                 }
                 
-                // Decode and accumulate the text
-                const chunk = decoder.decode(value, { stream: true });
-                
-                // Check for tool call notifications
-                let isJSONHandled = false;
-                try {
-                    const notification = JSON.parse(chunk);
-                    if (notification && typeof notification === 'object' && notification.type === 'tool_call') {
-                        isJSONHandled = true;
-                        if (notification.status === 'started') {
-                            toolCallInProgress = true;
-                            currentToolName = notification.tool_name;
-                            // Update loading text to show tool execution
-                            if (wrapperDiv.contains(loadingDiv)) {
-                                loadingDiv.innerHTML = `
-                                    <div class="loading-text">Running ${currentToolName}</div>
-                                    <div class="loading-dots">
-                                        <span></span>
-                                        <span></span>
-                                        <span></span>
-                                    </div>
-                                `;
-                            }
-                            continue;
-                        } else if (notification.status === 'completed') {
-                            toolCallInProgress = false;
-                            currentToolName = '';
-                            // Update loading text back to thinking
-                            if (wrapperDiv.contains(loadingDiv)) {
-                                loadingDiv.innerHTML = `
-                                    <div class="loading-text">Thinking</div>
-                                    <div class="loading-dots">
-                                        <span></span>
-                                        <span></span>
-                                        <span></span>
-                                    </div>
-                                `;
-                            }
-                            continue;
-                        }
-                    }
-                } catch (e) {
-                    // Not a JSON notification, treat as normal text
-                    isJSONHandled = false;
-                }
-                
-                // If JSON wasn't handled as a tool call notification (or was a primitive like a number),
-                // treat it as regular text
-                if (!isJSONHandled) {
-                    accumulatedText += chunk;
-                    
-                    // If this is the first content chunk, remove the loading indicator
-                    if (!hasStartedStreaming) {
-                        hasStartedStreaming = true;
-                        if (wrapperDiv.contains(loadingDiv)) {
-                            wrapperDiv.removeChild(loadingDiv);
-                        }
-                        wrapperDiv.appendChild(contentDiv);
-                        
-                        // Make sure timestamp is visible after removing loading indicator
-                        const existingTimestamp = wrapperDiv.querySelector('.message-timestamp');
-                        if (existingTimestamp) {
-                            // Move the timestamp to the end if it exists
-                            wrapperDiv.appendChild(existingTimestamp);
-                        }
-                    }
-                    
-                    // Process the content to handle tool results
-                    const parts = accumulatedText.split(/(Tool Results from [^:]+:)/);
-                    let mainContent = '';
-                    let toolResults = [];
-                    
-                    for (let i = 0; i < parts.length; i++) {
-                        if (i % 2 === 0) {
-                            mainContent += parts[i];
-                        } else {
-                            toolResults.push({
-                                header: parts[i],
-                                content: parts[i + 1] || ''
-                            });
-                            i++; // Skip the content part as we've already processed it
-                        }
-                    }
-                    
-                    // Initialize markdown-it
-                    const md = window.markdownit({
-                        html: false,
-                        linkify: true,
-                        typographer: true,
-                        highlight: function (str, lang) {
-                            if (lang && window.hljs && window.hljs.getLanguage(lang)) {
-                                try {
-                                    return window.hljs.highlight(str, { language: lang }).value;
-                                } catch (__) {}
-                            }
-                            return ''; // Use external default escaping
-                        }
-                    });
-                    
-                    // Add plugins if available
-                    if (window.markdownitEmoji) md.use(window.markdownitEmoji);
-                    if (window.markdownitTaskLists) md.use(window.markdownitTaskLists);
-                    
-                    // Update the main content in real-time
-                    mainContentDiv.innerHTML = md.render(mainContent);
-                    
-                    // Handle tool results if any
-                    if (toolResults.length > 0) {
-                        // Remove existing tool results if any
-                        const existingToggle = contentDiv.querySelector('.tool-results-toggle');
-                        const existingResults = contentDiv.querySelector('.tool-results-container');
-                        if (existingToggle) contentDiv.removeChild(existingToggle);
-                        if (existingResults) contentDiv.removeChild(existingResults);
-                        
-                        // Add new tool results
-                        const toggleLink = document.createElement('a');
-                        toggleLink.className = 'tool-results-toggle';
-                        toggleLink.textContent = `Tool Results (${toolResults.length})`;
-                        toggleLink.onclick = function(e) {
-                            e.preventDefault();
-                            const container = this.nextElementSibling;
-                            container.classList.toggle('expanded');
-                            this.classList.toggle('expanded');
-                        };
-                        contentDiv.appendChild(toggleLink);
-                        
-                        const resultsContainer = document.createElement('div');
-                        resultsContainer.className = 'tool-results-container';
-                        
-                        toolResults.forEach(result => {
-                            const resultDiv = document.createElement('div');
-                            resultDiv.className = 'tool-result';
-                            
-                            const content = document.createElement('textarea');
-                            content.className = 'tool-result-content';
-                            content.value = result.content;
-                            content.readOnly = true;
-                            content.rows = 8; // Initial height
-                            
-                            resultDiv.appendChild(content);
-                            resultsContainer.appendChild(resultDiv);
-                        });
-                        
-                        contentDiv.appendChild(resultsContainer);
+                // Decode and handle every complete event line
+                buffer += decoder.decode(value, { stream: true });
+                let newline;
+                while ((newline = buffer.indexOf('\n')) !== -1) {
+                    const line = buffer.slice(0, newline).trim();
+                    buffer = buffer.slice(newline + 1);
+                    if (line) {
+                        handleEvent(JSON.parse(line));
                     }
-                    
-                    // Scroll to bottom after each update
-                    this.messagesContainer.scrollTop = this.messagesContainer.scrollHeight;
                 }
             }
         } catch (error) {
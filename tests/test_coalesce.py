@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_coalesce.py
+# Author: Wadih Khairallah
+# Description: Tests for deadline flushes of coalesced token callbacks
+# Created: 2025-04-29 18:03:15
+# Modified: 2025-04-29 18:03:15
+
+import asyncio
+import time
+
+from pathfinder.backend.coalesce import AsyncCoalescingCallback, CoalescingCallback
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_buffered_text_is_sent_when_stream_stalls():
+    sent = []
+    output = CoalescingCallback(sent.append, window=0.05, max_bytes=512)
+
+    output("Hel")
+    output("lo")
+    output(" there")
+    assert sent == ["Hel"]
+    # No further token arrives; the window alone releases the rest.
+    assert _wait_for(lambda: len(sent) == 2)
+    assert sent == ["Hel", "lo there"]
+
+    output("!")
+    output.flush()
+    assert "".join(sent) == "Hello there!"
+
+
+def test_closed_callback_drops_buffered_text():
+    sent = []
+    output = CoalescingCallback(sent.append, window=0.05, max_bytes=512)
+    output("a")
+    output("b")
+    output.close()
+    time.sleep(0.15)
+    assert sent == ["a"]
+
+
+def test_flush_error_surfaces_on_next_call():
+    def callback(batch):
+        if batch != "a":
+            raise RuntimeError("client gone")
+
+    output = CoalescingCallback(callback, window=0.02, max_bytes=512)
+    output("a")
+    output("b")
+    time.sleep(0.1)
+    try:
+        output("c")
+    except RuntimeError as e:
+        assert str(e) == "client gone"
+    else:
+        raise AssertionError("the flusher's error was not raised")
+
+
+def test_async_buffered_text_is_sent_when_stream_stalls():
+    async def run():
+        sent = []
+
+        async def callback(batch):
+            sent.append(batch)
+
+        output = AsyncCoalescingCallback(callback, window=0.05, max_bytes=512)
+        await output("Hel")
+        await output("lo")
+        assert sent == ["Hel"]
+        await asyncio.sleep(0.15)
+        assert sent == ["Hel", "lo"]
+
+        await output("!")
+        await output.flush()
+        output.close()
+        return sent
+
+    assert "".join(asyncio.run(run())) == "Hello!"
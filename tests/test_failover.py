@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_failover.py
+# Author: Wadih Khairallah
+# Description: Failover and hedging against local OpenAI-compatible
+#              stub endpoints
+# Created: 2025-04-29 10:02:47
+# Modified: 2025-04-29 10:02:47
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("rich")
+pytest.importorskip("tiktoken")
+
+from pathfinder.backend.cancellation import CancelToken
+from pathfinder.backend.failover import FailoverPolicy
+from pathfinder.backend.interactor import Interactor
+from pathfinder.backend.response_cache import ResponseCache
+
+
+class StubEndpoint:
+    """OpenAI-compatible /v1/chat/completions served from a local thread.
+
+    mode is "fail" (400 error) or "ok" (streams reply word by word). delay is
+    seconds to wait before the first chunk, stall seconds to wait after it.
+    """
+
+    def __init__(self, mode: str, reply: str = "", delay: float = 0.0, stall: float = 0.0):
+        self.mode = mode
+        self.reply = reply
+        self.delay = delay
+        self.stall = stall
+        self.streams = 0
+        self.closed = threading.Event()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                # Tool-support probes are not streamed; count only the conversation's requests.
+                stub.streams += int(bool(body.get("stream")))
+                if stub.mode == "fail":
+                    return self._send(400, {"error": {"message": "stub failure", "type": "invalid_request_error"}})
+                if not body.get("stream"):
+                    return self._send(200, stub.completion(body["model"]))
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    self._wait(stub.delay)
+                    for index, word in enumerate(stub.reply.split(" ")):
+                        self._event(stub.chunk(body["model"], {"content": word + " "}))
+                        if index == 0:
+                            self._wait(stub.stall)
+                    self._event(stub.chunk(body["model"], {}, "stop"))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    stub.closed.set()
+                self.close_connection = True
+
+            def _wait(self, seconds):
+                deadline = time.monotonic() + seconds
+                while time.monotonic() < deadline:
+                    # Keep-alive comments expose a closed connection quickly.
+                    self.wfile.write(b": waiting\n\n")
+                    self.wfile.flush()
+                    time.sleep(0.05)
+
+            def _event(self, payload):
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+                self.wfile.flush()
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def chunk(model, delta, finish_reason=None):
+        return {
+            "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+
+    def completion(self, model):
+        return {
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply}, "finish_reason": "stop"}]
+        }
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def endpoints():
+    created = []
+
+    def create(*args, **kwargs):
+        endpoint = StubEndpoint(*args, **kwargs)
+        created.append(endpoint)
+        return endpoint
+
+    yield create
+    for endpoint in created:
+        endpoint.stop()
+
+
+def _interactor(primary, backup, response_cache=None, **policy):
+    failover = FailoverPolicy([{"model": "ollama:backup", "base_url": backup.base_url}], **policy)
+    return Interactor(
+        model="ollama:primary",
+        base_url=primary.base_url,
+        api_key="stub",
+        tools=False,
+        stream=True,
+        failover=failover,
+        response_cache=response_cache
+    )
+
+
+def test_failover_to_healthy_endpoint(endpoints):
+    primary = endpoints("fail")
+    backup = endpoints("ok", reply="hello from backup")
+    ai = _interactor(primary, backup)
+
+    response, stats = ai.interact("hi", quiet=True, return_stats=True)
+
+    assert response.strip() == "hello from backup"
+    assert primary.streams == 1 and backup.streams == 1
+    assert ai.last_target == "ollama:backup"
+    request = stats.requests[-1]
+    assert request.target == "ollama:backup"
+    assert request.error is None and stats.error is None
+    assert ai.failover.stats()["ollama:backup"]["samples"] == 1
+    assert "ollama:primary" not in ai.failover.stats()
+
+
+def test_hedge_races_slow_endpoint(endpoints):
+    primary = endpoints("ok", reply="too late", delay=3.0)
+    backup = endpoints("ok", reply="hedged answer")
+    ai = _interactor(primary, backup, hedge_after=0.2)
+
+    started = time.monotonic()
+    response, stats = ai.interact("hi", quiet=True, return_stats=True)
+
+    assert time.monotonic() - started < 2.0
+    assert response.strip() == "hedged answer"
+    assert primary.streams == 1 and backup.streams == 1
+    assert stats.requests[-1].target == "ollama:backup"
+    assert ai.failover.hedge_delay("ollama:primary") == 0.2
+    # The losing attempt's connection is closed once the winner is known.
+    assert primary.closed.wait(5)
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["direct", "response-cache"])
+def test_cancel_closes_failover_stream(endpoints, cached):
+    primary = endpoints("fail")
+    backup = endpoints("ok", reply="first word never finished", stall=3.0)
+    ai = _interactor(primary, backup, ResponseCache(persist=False) if cached else None)
+    cancel = CancelToken()
+    threading.Timer(0.3, cancel.cancel, args=("stop",)).start()
+
+    # The replayed stream must be closed from the cancelling thread while a read
+    # is blocked in it, not left running until the provider finishes.
+    started = time.monotonic()
+    response, stats = ai.interact("hi", quiet=True, return_stats=True, cancel=cancel)
+
+    assert time.monotonic() - started < 2.0
+    assert stats.error == "stop"
+    assert backup.closed.wait(5)
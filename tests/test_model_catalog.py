@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_model_catalog.py
+# Author: Wadih Khairallah
+# Description: Tests for stale-while-revalidate model listing
+# Created: 2025-04-29 17:20:44
+# Modified: 2025-04-29 17:20:44
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+from pathfinder.backend import clients
+from pathfinder.backend.model_catalog import ModelCatalog
+
+PROVIDERS = {"ollama": {"base_url": "http://127.0.0.1:1/v1", "api_key": "ollama"}}
+
+
+class FakeClient:
+    """Stands in for an OpenAI client; reply is a list of model ids or an exception."""
+
+    reply = ["llama3"]
+
+    def with_options(self, **kwargs):
+        return self
+
+    @property
+    def models(self):
+        return self
+
+    def list(self):
+        if isinstance(FakeClient.reply, Exception):
+            raise FakeClient.reply
+        return [SimpleNamespace(id=model) for model in FakeClient.reply]
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    FakeClient.reply = ["llama3"]
+    monkeypatch.setattr(clients, "get_client", lambda *args: FakeClient())
+    catalog = ModelCatalog(ttl=0, failure_ttl=60)
+    yield catalog
+    catalog._executor.shutdown(wait=True)
+
+
+def _drain(catalog):
+    for future in list(catalog._refreshing.values()):
+        future.result()
+
+
+def test_failed_revalidation_keeps_stale_list(catalog):
+    assert catalog.models(PROVIDERS) == {"ollama": ["llama3"]}
+
+    FakeClient.reply = ConnectionError("endpoint down")
+    # Stale: served at once while a background refresh runs and fails.
+    assert catalog.models(PROVIDERS) == {"ollama": ["llama3"]}
+    _drain(catalog)
+    assert catalog.models(PROVIDERS) == {"ollama": ["llama3"]}
+    _drain(catalog)
+
+    FakeClient.reply = ["llama3", "qwen"]
+    catalog.models(PROVIDERS)
+    _drain(catalog)
+    assert catalog.models(PROVIDERS) == {"ollama": ["llama3", "qwen"]}
+
+
+def test_failure_without_previous_list_is_remembered(catalog):
+    FakeClient.reply = ConnectionError("endpoint down")
+    assert catalog.models(PROVIDERS) == {"ollama": []}
+
+    FakeClient.reply = ["llama3"]
+    # Still within failure_ttl, so the provider is not queried again.
+    assert catalog.models(PROVIDERS) == {"ollama": []}
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_result_shaping.py
+# Author: Wadih Khairallah
+# Description: Tests for tool result refs shared between worker processes
+# Created: 2025-04-29 11:20:16
+# Modified: 2025-04-29 11:20:16
+
+import multiprocessing
+
+from pathfinder.backend.result_shaping import ResultShaper
+from pathfinder.backend.session_store import SessionStore
+
+LONG_TEXT = " ".join(f"Sentence {i} about the harbor tides and the weather." for i in range(400))
+
+
+def _count(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _read_in_worker(db_path: str, ref: str, results):
+    # A fresh shaper in another process, like a second server worker.
+    shaper = ResultShaper(default_budget=200, store=SessionStore(db_path))
+    results.put(shaper.read_tool_result(ref, page=1))
+
+
+def test_ref_readable_in_another_process(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    shaper = ResultShaper(default_budget=200, store=SessionStore(db_path))
+    shaped, record = shaper.shape("get_website", {"text": LONG_TEXT}, "", _count)
+    assert shaped["truncated"]["ref"] == record["ref"]
+
+    results = multiprocessing.get_context("spawn").Queue()
+    worker = multiprocessing.get_context("spawn").Process(
+        target=_read_in_worker, args=(db_path, record["ref"], results)
+    )
+    worker.start()
+    page = results.get(timeout=30)
+    worker.join(30)
+
+    assert page["status"] == "success"
+    assert page["page"] == 1 and page["pages"] > 1
+    assert page["text"] == shaper.read_tool_result(record["ref"], page=1)["text"]
+
+
+def test_unknown_ref_without_store():
+    shaper = ResultShaper(default_budget=200)
+    _, record = shaper.shape("get_website", {"text": LONG_TEXT}, "", _count)
+    assert shaper.read_tool_result(record["ref"])["status"] == "success"
+    assert ResultShaper().read_tool_result(record["ref"])["status"] == "error"
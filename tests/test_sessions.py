@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_sessions.py
+# Author: Wadih Khairallah
+# Description: Tests for building, restoring and spilling pooled sessions
+# Created: 2025-04-29 16:12:08
+# Modified: 2025-04-29 16:12:08
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("rich")
+
+from pathfinder.backend.sessions import SessionManager
+
+
+class FakeInteractor:
+    def __init__(self):
+        self.history = [{"role": "system", "content": "sys"}]
+        self.closed = False
+
+    def export_state(self):
+        return {"history": list(self.history)}
+
+    def load_state(self, state):
+        self.history = list(state["history"])
+
+    def close(self):
+        self.closed = True
+
+
+class SlowStore:
+    """In-memory session store whose writes take a while."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sessions = {}
+
+    def save_session(self, session_id, state):
+        time.sleep(self.delay)
+        self.sessions[session_id] = state
+
+    def load_session(self, session_id):
+        return self.sessions.get(session_id)
+
+    def delete_session(self, session_id):
+        self.sessions.pop(session_id, None)
+
+    def get_transcript(self, transcript_id):
+        return None
+
+
+def test_slow_factory_does_not_block_other_sessions():
+    release = threading.Event()
+
+    def factory():
+        if threading.current_thread().name == "cold":
+            release.wait(5)
+        return FakeInteractor()
+
+    pool = SessionManager(factory, reap_interval=None)
+    pool.get("warm")
+    cold = threading.Thread(target=pool.get, args=("cold",), name="cold")
+    cold.start()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    pool.get("warm")
+    pool.get("other")
+    assert time.monotonic() - started < 1.0
+
+    # A second request for the session being built waits for that build.
+    waiter = {}
+    second = threading.Thread(target=lambda: waiter.update(interactor=pool.get("cold")))
+    second.start()
+    release.set()
+    cold.join(5)
+    second.join(5)
+    assert waiter["interactor"] is pool.get("cold")
+    assert pool.stats()["created"] == 3
+
+
+def test_failed_build_leaves_session_retryable():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("probe failed")
+        return FakeInteractor()
+
+    pool = SessionManager(factory, reap_interval=None)
+    with pytest.raises(RuntimeError):
+        pool.get("s")
+    assert pool.stats()["active"] == 0
+    assert pool.get("s") is not None
+    assert pool.stats()["busy"] == 0
+
+
+def test_restore_waits_for_pending_spill():
+    store = SlowStore(delay=0.5)
+    pool = SessionManager(FakeInteractor, store=store, max_sessions=1, reap_interval=None)
+    with pool.acquire("a") as interactor:
+        interactor.history.append({"role": "user", "content": "remember me"})
+
+    # Checking out "b" spills "a"; restoring "a" meanwhile must see what the spill writes.
+    spiller = threading.Thread(target=pool.get, args=("b",))
+    spiller.start()
+    time.sleep(0.1)
+    restored = pool.get("a")
+    spiller.join(5)
+    assert restored.history[-1]["content"] == "remember me"
+    assert pool.stats()["rehydrated"] == 1
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_textextract.py
+# Author: Wadih Khairallah
+# Description: Import-time budget test for textextract
+# Created: 2025-04-29 09:31:05
+# Modified: 2025-04-29 09:31:05
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("rich")
+
+# Seconds importing textextract may take on top of the interpreter and rich.
+IMPORT_BUDGET = 0.25
+
+# Format backends that must only be imported by the function that uses them.
+HEAVY_MODULES = (
+    "magic", "pandas", "fitz", "PIL", "docx",
+    "pytesseract", "speech_recognition", "mss", "pydub", "bs4", "requests"
+)
+
+PROBE = f"""
+import json, sys, time
+import rich.console
+start = time.perf_counter()
+import pathfinder.backend.textextract
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "elapsed": elapsed,
+    "loaded": [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+}}))
+"""
+
+
+def _probe():
+    # A fresh interpreter, so modules imported by other tests do not count.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], capture_output=True, text=True, env=env, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_skips_format_backends():
+    assert _probe()["loaded"] == []
+
+
+def test_import_stays_under_budget():
+    # Best of three, so one slow start on a busy machine does not fail the run.
+    elapsed = min(_probe()["elapsed"] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET, f"textextract import took {elapsed:.3f}s"
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_tool_cache.py
+# Author: Wadih Khairallah
+# Description: Tests for cancellation inside the shared tool result cache
+# Created: 2025-04-29 14:05:51
+# Modified: 2025-04-29 14:05:51
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("rich")
+
+from pathfinder.backend.cancellation import Cancelled, CancelToken, cancel_scope, cancelled
+from pathfinder.backend.tool_cache import ToolResultCache
+
+
+def _run(cache, token, func, results, name):
+    with cancel_scope(token):
+        try:
+            results[name] = cache.call("search", {"q": "tides"}, func)
+        except Cancelled as e:
+            results[name] = e
+
+
+def test_cancelled_owner_result_is_not_shared():
+    cache = ToolResultCache()
+    owner_token = CancelToken()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def search(q):
+        calls.append(q)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+            return {"status": "cancelled"} if cancelled() else {"status": "success", "text": "partial"}
+        return {"status": "success", "text": "fresh"}
+
+    results = {}
+    owner = threading.Thread(target=_run, args=(cache, owner_token, search, results, "owner"))
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=_run, args=(cache, CancelToken(), search, results, "waiter"))
+    waiter.start()
+    while cache.stats()["coalesced"] == 0:
+        time.sleep(0.001)
+
+    owner_token.cancel("Client disconnected")
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+
+    assert results["owner"] == {"status": "cancelled"}
+    # The waiter from another conversation ran the call again instead of taking the owner's result.
+    assert results["waiter"] == {"status": "success", "text": "fresh"}
+    assert len(calls) == 2
+    assert cache.stats()["restarted"] == 1
+    assert cache.call("search", {"q": "tides"}, search) == {"status": "success", "text": "fresh"}
+
+
+def test_owner_cancelled_error_restarts_waiters():
+    cache = ToolResultCache()
+    owner_token = CancelToken()
+    started = threading.Event()
+    calls = []
+
+    def search(q):
+        calls.append(q)
+        if len(calls) == 1:
+            started.set()
+            owner_token.wait(5)
+            raise Cancelled(owner_token.reason)
+        return {"status": "success", "text": "fresh"}
+
+    results = {}
+    owner = threading.Thread(target=_run, args=(cache, owner_token, search, results, "owner"))
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=_run, args=(cache, CancelToken(), search, results, "waiter"))
+    waiter.start()
+    while cache.stats()["coalesced"] == 0:
+        time.sleep(0.001)
+
+    owner_token.cancel("Client disconnected")
+    owner.join(5)
+    waiter.join(5)
+
+    assert isinstance(results["owner"], Cancelled)
+    assert results["waiter"] == {"status": "success", "text": "fresh"}
+
+
+def test_uncancelled_result_is_shared():
+    cache = ToolResultCache()
+    calls = []
+
+    def search(q):
+        calls.append(q)
+        return {"status": "success", "text": "shared"}
+
+    with cancel_scope(CancelToken()):
+        assert cache.call("search", {"q": "tides"}, search)["text"] == "shared"
+        assert cache.call("search", {"q": "tides"}, search)["text"] == "shared"
+    assert len(calls) == 1
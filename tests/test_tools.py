@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_tools.py
+# Author: Wadih Khairallah
+# Description: Tests for the lazy tool registry
+# Created: 2025-04-29 09:14:32
+# Modified: 2025-04-29 09:14:32
+
+import sys
+
+from pathfinder.backend import tools
+
+TOOL_SOURCE = '''
+def echo_tool(text: str) -> dict:
+    """Return the text it was given."""
+    return {"text": text}
+'''
+
+
+def _lazy_tool(tmp_path, monkeypatch):
+    (tmp_path / "echo_tool.py").write_text(TOOL_SOURCE)
+    monkeypatch.setattr(tools, "__path__", list(tools.__path__) + [str(tmp_path)])
+    monkeypatch.delitem(sys.modules, f"{tools.__name__}.echo_tool", raising=False)
+    entry = tools._describe(tmp_path / "echo_tool.py", TOOL_SOURCE.encode())
+    return tools.LazyTool("echo_tool", entry)
+
+
+def test_describe_reads_schema_without_import(tmp_path, monkeypatch):
+    tool = _lazy_tool(tmp_path, monkeypatch)
+    assert not tool.loaded
+    assert tool.tool_schema["description"] == "Return the text it was given."
+    assert tool.tool_schema["parameters"]["required"] == ["text"]
+    assert f"{tools.__name__}.echo_tool" not in sys.modules
+
+
+def test_package_attribute_stays_callable_after_load(tmp_path, monkeypatch):
+    tool = _lazy_tool(tmp_path, monkeypatch)
+    monkeypatch.setattr(tools, "echo_tool", tool, raising=False)
+
+    assert tool("hi") == {"text": "hi"}
+    assert tool.loaded
+    # Importing the submodule must not leave the module bound in place of the tool.
+    assert callable(tools.echo_tool)
+    assert tools.echo_tool is tool
+    assert tools.echo_tool("again") == {"text": "again"}